@@ -4,7 +4,9 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import asyncio
+import json
 from bson import ObjectId
+from pymongo.errors import BulkWriteError
 import numbers
 import numpy as np
 from datetime import datetime, date
@@ -54,7 +56,7 @@ def serialize_bson(obj):
 # --------------------------
 # FastAPI & imports
 # --------------------------
-from fastapi import FastAPI, Body, HTTPException, Request
+from fastapi import FastAPI, Body, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
@@ -62,18 +64,36 @@ from pydantic import BaseModel
 
 # Correct imports (no backend.)
 from backend.services.mongo_client import symptom_col, water_col, prediction_col, raw_col
-from backend.services.predictor import predict_disease, _model as _ml_model
+from backend.services.model_registry import model_registry
+from backend.services.batcher import batcher, predict_disease_async
+from backend.services.prediction_cache import prediction_cache
+from backend.services.inference_executor import InferenceSaturated, inference_executor
+from backend.services.auth_crypto import AuthCryptoBusy, auth_crypto
 from backend.services.merger import merge_and_predict_and_store
+from backend.services.scoring_pipeline import ScoringPipeline
+from backend.services.water_index import water_index
+from backend.services.geo import point_from_payload
+from backend.services.locations import backfill_location_ids, location_registry
+from backend.services.recipient_index import ensure_built as ensure_recipient_index
+from backend.services.indexes import ENSURE_INDEXES_ON_STARTUP, ensure_indexes
+from backend.services.hotspot_engine import hotspot_engine
+from backend.services.outbreak_detector import OUTBREAK_MIN_CASES, outbreak_detector
+from backend.services.alert_dispatch import alert_dispatcher
+from backend.services.outbound_queue import OUTBOUND_CONSUMER_IN_API, OutboundConsumer
+from backend.services.outbound_queue import queue_stats as outbound_queue_stats, requeue_dead as requeue_dead_outbound
+from backend.services.prediction_schema import PREDICTION_MIGRATE_ON_STARTUP, migrate_legacy
+from backend.services.prediction_store import after_insert, build_prediction_doc, rehydrate
+from backend.services.rollups import migrate_buckets as migrate_rollup_buckets
+from backend.services.work_queue import claim_symptom, fail_symptom, queue_stats, release_symptom, requeue_dead_letters
+from backend.services.work_queue import SCORING_WATER_WAIT_SECONDS, wake_waiting
 
 from backend.auth.routes import router as auth_router
+from backend.auth.deps import get_current_user, principal_cache
 from backend.auth.otp_routes import router as otp_router
 from backend.auth.alert_routes import router as alert_router
 from backend.routes.hotspots import router as hotspots_router
 from backend.routes.district_stats import router as district_router
 
-# CONFIG
-POLL_INTERVAL_SECONDS = int(os.getenv("POLL_INTERVAL_SECONDS", "5"))
-
 # FastAPI init
 app = FastAPI(title="Nirogya ML Backend (modular)")
 
@@ -88,6 +108,23 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         content={"detail": exc.errors(), "body": str(exc.body)[:500]}
     )
 
+# Inference backpressure: tell clients when to come back instead of queueing forever
+@app.exception_handler(InferenceSaturated)
+async def inference_saturated_handler(request: Request, exc: InferenceSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Prediction service busy, retry later"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.exception_handler(AuthCryptoBusy)
+async def auth_crypto_busy_handler(request: Request, exc: AuthCryptoBusy):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 # CORS - allow dev origins; change to explicit origins in production
 origins = [
     "http://localhost:3000",
@@ -110,9 +147,6 @@ app.include_router(alert_router)
 app.include_router(hotspots_router)
 app.include_router(district_router)
 
-# ML availability flag
-ML_READY = _ml_model is not None
-
 # --------------------------
 # Pydantic model for /predict
 # --------------------------
@@ -137,14 +171,14 @@ class Report(BaseModel):
 ############################################################
 # /report endpoint
 ############################################################
-@app.post("/report")
-async def save_report(payload: Dict[str, Any] = Body(...)):
-    now = datetime.utcnow()
-    result = {"symptoms_saved": False, "water_saved": False, "raw_saved": False}
-
+def normalize_report_payload(payload: Dict[str, Any]):
+    """
+    Map one /report payload (nested patient/water or the flat form fields)
+    to (patient, water, meta). Shared by /report and /report/bulk.
+    """
     patient = payload.get("patient")
     water = payload.get("water")
-    meta = payload.get("meta", {})
+    meta = payload.get("meta") or {}
 
     if not patient and not water:
         if any(k in payload for k in ["symptoms", "patientName", "contact_number", "reporter_name"]):
@@ -178,6 +212,27 @@ async def save_report(payload: Dict[str, Any] = Body(...)):
                 "unusual_flags": payload.get("unusual_water_flags") or []
             }
 
+    # canonical location ids, coordinates (reported, else gazetteer) + geohash cell on each report
+    payload_geo = point_from_payload(payload)
+    for doc in (patient, water):
+        if not doc:
+            continue
+        if not doc.get("location_id"):
+            doc.update(location_registry.fields(doc.get("location") or payload.get("village"),
+                                                doc.get("district") or payload.get("district")))
+        if not doc.get("geo_cell"):
+            geo = point_from_payload(doc) or payload_geo
+            if geo:
+                doc.update(geo)
+
+    return patient, water, meta
+
+@app.post("/report")
+async def save_report(payload: Dict[str, Any] = Body(...)):
+    now = datetime.utcnow()
+    result = {"symptoms_saved": False, "water_saved": False, "raw_saved": False}
+
+    patient, water, meta = normalize_report_payload(payload)
     meta.setdefault("received_at", now.isoformat())
 
     symptom_id = None
@@ -188,17 +243,19 @@ async def save_report(payload: Dict[str, Any] = Body(...)):
         symptom_id = str(res.inserted_id)
         result["symptoms_saved"] = True
 
-        # schedule immediate processing (async task)
-        asyncio.create_task(schedule_immediate_processing(symptom_id))
+        # schedule immediate processing (async task) unless a change stream will see the insert
+        if not scoring_pipeline.streams_new_reports:
+            asyncio.create_task(schedule_immediate_processing(symptom_id))
 
     if water:
         doc2 = {**water, "meta": meta, "created_at": now}
         res2 = await water_col.insert_one(doc2)
         wid = str(res2.inserted_id)
         result["water_saved"] = True
+        water_index.observe(doc2)
 
-        loc = doc2.get("location")
-        if loc:
+        loc = doc2.get("location_id")
+        if loc and not scoring_pipeline.streams_new_reports:
             asyncio.create_task(schedule_processing_by_location(loc))
 
     await raw_col.insert_one({"payload": payload, "meta": {"received_at": now.isoformat()}, "created_at": now})
@@ -207,6 +264,125 @@ async def save_report(payload: Dict[str, Any] = Body(...)):
     return {"status": "ok", **result}
 
 
+############################################################
+# /report/bulk endpoint (offline sync)
+############################################################
+REPORT_BULK_MAX_ITEMS = int(os.getenv("REPORT_BULK_MAX_ITEMS", "500"))
+
+def _parse_bulk_body(body: bytes, content_type: str):
+    """
+    Returns a list of (payload, error) for a JSON array body or an NDJSON stream.
+    """
+    text = body.decode("utf-8")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append((json.loads(line), None))
+            except ValueError as e:
+                items.append((None, f"invalid JSON: {e}"))
+        return items
+
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("reports", [])
+    if not isinstance(data, list):
+        raise ValueError("expected a JSON array of reports")
+    return [(item, None) for item in data]
+
+async def _insert_many_tracked(col, docs: List[Dict[str, Any]]) -> Dict[int, str]:
+    """
+    insert_many(ordered=False) returning {doc index: error message} for the failures.
+    """
+    if not docs:
+        return {}
+    try:
+        await col.insert_many(docs, ordered=False)
+        return {}
+    except BulkWriteError as e:
+        return {err["index"]: err.get("errmsg", "write error") for err in e.details.get("writeErrors", [])}
+
+@app.post("/report/bulk")
+async def save_reports_bulk(request: Request):
+    """
+    Bulk ingest for ASHA devices syncing offline reports. Accepts a JSON array
+    (or {"reports": [...]}) or an NDJSON stream (Content-Type: application/x-ndjson).
+    Each item is normalized exactly like /report; writes are one unordered
+    insert_many per collection and scoring is queued once for the whole batch.
+    """
+    now = datetime.utcnow()
+    try:
+        items = _parse_bulk_body(await request.body(), request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if len(items) > REPORT_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {REPORT_BULK_MAX_ITEMS} reports per request")
+
+    statuses: List[Dict[str, Any]] = []
+    sym_docs, sym_idx = [], []
+    water_docs, water_idx = [], []
+    raw_docs = []
+
+    for i, (payload, error) in enumerate(items):
+        status = {"index": i, "status": "ok", "symptoms_saved": False, "water_saved": False}
+        statuses.append(status)
+        if error or not isinstance(payload, dict):
+            status.update(status="invalid", error=error or "report must be a JSON object")
+            continue
+
+        patient, water, meta = normalize_report_payload(payload)
+        meta.setdefault("received_at", now.isoformat())
+        if not patient and not water:
+            status.update(status="invalid", error="no symptom or water fields found")
+            continue
+
+        if patient:
+            sym_docs.append({**patient, "meta": meta, "created_at": now, "processed_by_model": False})
+            sym_idx.append(i)
+        if water:
+            water_docs.append({**water, "meta": meta, "created_at": now})
+            water_idx.append(i)
+        raw_docs.append({"payload": payload, "meta": {"received_at": now.isoformat(), "bulk": True}, "created_at": now})
+
+    # insert_many assigns _id client-side, so every doc carries its id afterwards
+    sym_errors, water_errors, _ = await asyncio.gather(
+        _insert_many_tracked(symptom_col, sym_docs),
+        _insert_many_tracked(water_col, water_docs),
+        _insert_many_tracked(raw_col, raw_docs),
+    )
+
+    symptom_ids = []
+    for j, i in enumerate(sym_idx):
+        if j in sym_errors:
+            statuses[i].update(status="error", error=sym_errors[j])
+            continue
+        sid = str(sym_docs[j]["_id"])
+        statuses[i].update(symptoms_saved=True, symptom_id=sid)
+        symptom_ids.append(sid)
+
+    water_locations = set()
+    for j, i in enumerate(water_idx):
+        if j in water_errors:
+            statuses[i].update(status="error", error=water_errors[j])
+            continue
+        statuses[i].update(water_saved=True, water_id=str(water_docs[j]["_id"]))
+        water_index.observe(water_docs[j])
+        if water_docs[j].get("location_id"):
+            water_locations.add(water_docs[j]["location_id"])
+
+    if (symptom_ids or water_locations) and not scoring_pipeline.streams_new_reports:
+        asyncio.create_task(schedule_bulk_processing(symptom_ids, sorted(water_locations)))
+
+    counts = {"ok": 0, "error": 0, "invalid": 0}
+    for st in statuses:
+        counts[st["status"]] += 1
+
+    return {"status": "ok", "received": len(items), **counts, "items": statuses}
+
+
 ############################################################
 # /predict endpoint
 ############################################################
@@ -216,7 +392,7 @@ async def predict_endpoint(payload: Report):
     raw_doc.setdefault("timestamp", datetime.utcnow().isoformat())
     await raw_col.insert_one(raw_doc)
 
-    if not ML_READY:
+    if not model_registry.ready:
         raise HTTPException(status_code=503, detail="Model not loaded")
 
     water_doc = {
@@ -238,17 +414,12 @@ async def predict_endpoint(payload: Report):
         "location": payload.location
     }
 
-    # run predict_disease in threadpool (predict_disease is CPU-bound / sync)
-    loop = asyncio.get_running_loop()
-    result = await loop.run_in_executor(None, predict_disease, water_doc, sym_doc)
+    # micro-batched on the inference executor; raises InferenceSaturated (-> 503) when full
+    result = await predict_disease_async(water_doc, sym_doc)
 
-    pred_doc = {
-        "location": payload.location,
-        "timestamp": datetime.utcnow(),
-        "input": payload.dict(),
-        "prediction": result
-    }
+    pred_doc = build_prediction_doc(result, location=payload.location, input_doc=payload.dict())
     await prediction_col.insert_one(pred_doc)
+    await after_insert(pred_doc)
 
     return {"prediction": result}
 
@@ -264,10 +435,12 @@ async def schedule_immediate_processing(symptom_id: str):
     except Exception as e:
         print("schedule_immediate_processing error:", e)
 
-async def schedule_processing_by_location(location: str):
+async def schedule_processing_by_location(location_id: str):
     try:
+        # docs released as waiting_water are backing off; a new sample makes them due
+        await wake_waiting(location_id)
         cursor = symptom_col.find(
-            {"location": location, "processed_by_model": {"$ne": True}}
+            {"location_id": location_id, "processed_by_model": {"$ne": True}}
         ).sort("created_at", -1).limit(20)
 
         async for sym in cursor:
@@ -275,70 +448,184 @@ async def schedule_processing_by_location(location: str):
     except Exception as e:
         print("schedule_processing_by_location error:", e)
 
+async def schedule_bulk_processing(symptom_ids: List[str], water_locations: List[str]):
+    """
+    One scoring job per bulk upload: match and score the new symptom docs
+    concurrently (they share micro-batches), then pick up older unprocessed
+    symptoms at locations that just received water data.
+    """
+    try:
+        if symptom_ids:
+            cursor = symptom_col.find({"_id": {"$in": [ObjectId(s) for s in symptom_ids]}})
+            syms = await cursor.to_list(length=len(symptom_ids))
+            await asyncio.gather(*(try_match_and_predict(sym) for sym in syms))
+        for loc in water_locations:
+            await schedule_processing_by_location(loc)
+    except Exception as e:
+        print("schedule_bulk_processing error:", e)
+
 async def try_match_and_predict(sym_doc: Dict[str, Any]):
-    loc = sym_doc.get("location")
+    # docs stored before the location registry are resolved on the fly
+    loc = sym_doc.get("location_id") or location_registry.fields(sym_doc.get("location")).get("location_id")
     if not loc:
         return None
 
-    water_doc = await water_col.find_one(
-        {"location": loc},
-        sort=[("meta.submitted_at", -1), ("created_at", -1), ("_id", -1)]
-    )
-
-    if not water_doc:
-        water_doc = await water_col.find_one({"village": loc}, sort=[("created_at", -1)])
-
-    if not water_doc:
+    # lease the doc first; None means it is done, dead-lettered, backing off or owned elsewhere
+    sym_doc = await claim_symptom(sym_doc.get("_id"))
+    if not sym_doc:
         return None
 
     try:
+        # O(1) in-memory lookup; falls back to Mongo on a miss or stale entry
+        water_doc = await water_index.latest_for(loc)
+
+        if not water_doc:
+            await release_symptom(sym_doc, "waiting_water", SCORING_WATER_WAIT_SECONDS)
+            return None
+
         return await merge_and_predict_and_store(sym_doc, water_doc)
     except Exception as e:
         print("try_match_and_predict error:", e)
+        await fail_symptom(sym_doc, str(e))
         return None
 
-async def poller_loop():
-    seen_temp = set()
-    while True:
-        try:
-            cursor = symptom_col.find(
-                {"processed_by_model": {"$ne": True}}
-            ).sort("created_at", -1).limit(200)
-
-            async for sym in cursor:
-                sid = str(sym.get("_id"))
-                if sid in seen_temp:
-                    continue
-                await try_match_and_predict(sym)
-                seen_temp.add(sid)
-
-            if len(seen_temp) > 10000:
-                seen_temp.clear()
+scoring_pipeline = ScoringPipeline(
+    process_symptom=try_match_and_predict,
+    process_location=schedule_processing_by_location,
+)
 
+async def bootstrap_prediction_analytics():
+    try:
+        await location_registry.load()
+        await backfill_location_ids()
+        await ensure_recipient_index()
+    except Exception as e:
+        print("Location registry bootstrap error:", e)
+    if PREDICTION_MIGRATE_ON_STARTUP:
+        try:
+            await migrate_legacy()
         except Exception as e:
-            print("Poller error:", e)
-
-        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+            print("Prediction schema migration error:", e)
+    try:
+        await migrate_rollup_buckets()
+    except Exception as e:
+        print("Rollup migration error:", e)
+    # outbreak baselines from the daily rollup, kept in step with other workers
+    asyncio.create_task(outbreak_detector.sync_loop())
+    await hotspot_engine.sync_loop()
 
 @app.on_event("startup")
 async def startup_tasks():
-    # start the background poller
-    asyncio.create_task(poller_loop())
-    print("Background poller started.")
+    # build declared Mongo indexes (idempotent)
+    if ENSURE_INDEXES_ON_STARTUP:
+        asyncio.create_task(ensure_indexes())
+    # seed the latest-water-sample index in the background
+    asyncio.create_task(water_index.seed())
+    # load the location registry and backfill location ids, canonicalize legacy
+    # prediction docs and rollup buckets, then seed the outbreak baselines and
+    # hotspot windows and tail predictions stored by other workers
+    asyncio.create_task(bootstrap_prediction_analytics())
+    # emails are sent by the outbound consumer process
+    # (python -m backend.services.outbound_queue); single-process dev setups
+    # can run it here instead
+    if OUTBOUND_CONSUMER_IN_API:
+        asyncio.create_task(OutboundConsumer().run())
+        asyncio.create_task(alert_dispatcher.resume_loop())
+    # start the scoring pipeline (change stream, or indexed polling on standalone mongod)
+    asyncio.create_task(scoring_pipeline.run())
+    print("Scoring pipeline started.")
+    # watch for new model versions; they are loaded and warmed off the event loop
+    asyncio.create_task(model_registry.watch())
     # optionally print ML readiness
-    print(f"ML_READY = {ML_READY}")
+    print(f"ML_READY = {model_registry.ready}")
+    print(f"Inference executor: mode={inference_executor.mode}, workers={inference_executor.workers}")
+
+@app.on_event("shutdown")
+async def shutdown_tasks():
+    inference_executor.shutdown()
+    auth_crypto.shutdown()
 
 # --------------------------
 # Convenience Endpoints
 # --------------------------
 @app.get("/predictions")
 async def list_predictions(limit: int = 50):
-    cursor = prediction_col.find().sort("predicted_at", -1).limit(limit)
+    cursor = prediction_col.find({}, {"features_bin": 0}).sort("ts", -1).limit(limit)
     out = []
     async for d in cursor:
         out.append(serialize_bson(d))
     return out
 
+@app.get("/predictions/{prediction_id}")
+async def get_prediction(prediction_id: str, sources: bool = True):
+    """
+    One prediction with its feature vector unpacked and, for compact records,
+    the referenced symptom/water reports loaded (sources=false skips them).
+    """
+    try:
+        oid = ObjectId(prediction_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid prediction id")
+    doc = await prediction_col.find_one({"_id": oid})
+    if not doc:
+        raise HTTPException(status_code=404, detail="prediction not found")
+    return serialize_bson(await rehydrate(doc, sources=sources))
+
+@app.get("/predict/cache-stats")
+async def predict_cache_stats():
+    return prediction_cache.stats()
+
+@app.get("/predict/executor-stats")
+async def predict_executor_stats():
+    return {**inference_executor.stats(), "batcher": batcher.stats()}
+
+@app.get("/auth/crypto-stats")
+async def auth_crypto_stats():
+    return auth_crypto.stats()
+
+@app.get("/auth/principal-cache-stats")
+async def auth_principal_cache_stats():
+    return principal_cache.stats()
+
+@app.get("/scoring/queue-stats")
+async def scoring_queue_stats():
+    return await queue_stats()
+
+@app.post("/scoring/dead-letters/requeue")
+async def scoring_requeue_dead_letters(current_user: dict = Depends(get_current_user)):
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can requeue dead letters")
+    return {"requeued": await requeue_dead_letters()}
+
+@app.get("/outbound/queue-stats")
+async def outbound_stats():
+    return await outbound_queue_stats()
+
+@app.post("/outbound/dead/requeue")
+async def outbound_requeue_dead(current_user: dict = Depends(get_current_user)):
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can requeue dead messages")
+    return {"requeued": await requeue_dead_outbound()}
+
+@app.get("/model")
+async def model_info():
+    return serialize_bson(model_registry.info())
+
+@app.post("/model/reload")
+async def model_reload(current_user: dict = Depends(get_current_user)):
+    """
+    Force a load + warm of the deployed model version (admin only).
+    """
+    if current_user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can reload the model")
+    loop = asyncio.get_running_loop()
+    swapped = await loop.run_in_executor(None, model_registry.reload, True)
+    return {"reloaded": swapped, **serialize_bson(model_registry.info())}
+
+@app.get("/water_reports/index-stats")
+async def water_index_stats():
+    return water_index.stats()
+
 @app.get("/water_reports")
 async def get_water_reports(limit: int = 50):
     cursor = water_col.find().sort("created_at", -1).limit(limit)
@@ -351,41 +638,29 @@ async def get_water_reports(limit: int = 50):
 # OUTBREAK DETECTION ENDPOINT
 ############################################################
 
-OUTBREAK_THRESHOLD = 50  # SET THE DETECTION LIMIT
-
 @app.get("/outbreak-status")
-async def outbreak_status():
+async def outbreak_status(alerts_only: bool = False):
     """
-    Declares an outbreak when predicted_disease count >= threshold.
+    Per-disease outbreak status for today from the streaming detector
+    (per-location EWMA/CUSUM baselines + Poisson tail; see
+    backend/services/outbreak_detector.py). Nothing is aggregated per request.
     """
-    pipeline = [
-        {
-            "$group": {
-                "_id": "$prediction.predicted_disease",
-                "count": {"$sum": 1}
-            }
-        }
-    ]
-
-    results = await prediction_col.aggregate(pipeline).to_list(None)
-
-    final_output = []
-    for r in results:
-        disease = r["_id"]
-        count = r["count"]
-
-        if disease is None:
-            continue
+    signals = outbreak_detector.signals()
 
-        final_output.append({
-            "disease": disease,
-            "count": count,
-            "outbreak": count >= OUTBREAK_THRESHOLD
-        })
+    by_disease: Dict[str, Dict[str, Any]] = {}
+    for sig in signals:
+        r = by_disease.setdefault(sig["disease"], {"disease": sig["disease"], "count": 0, "outbreak": False, "locations": []})
+        r["count"] += sig["cases_today"]
+        r["outbreak"] = r["outbreak"] or sig["outbreak"]
+        if sig["outbreak"] or not alerts_only:
+            r["locations"].append(sig)
 
+    results = [r for r in by_disease.values() if r["outbreak"] or not alerts_only]
     return {
-        "threshold": OUTBREAK_THRESHOLD,
-        "results": final_output
+        # fewest cases today for which a location can be flagged by the Poisson test
+        "threshold": OUTBREAK_MIN_CASES,
+        "detector": outbreak_detector.stats(),
+        "results": sorted(results, key=lambda r: r["count"], reverse=True)
     }
 
 ############################################################
@@ -6,11 +6,11 @@ from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
 from pydantic import BaseModel
 from datetime import datetime
 from typing import List, Optional
-import asyncio
 
-from backend.services.mongo_client import users_col, alerts_col
-from backend.services.email_service import send_water_alert_email
-from backend.auth.deps import get_current_user
+from backend.services.mongo_client import alerts_col
+from backend.services.alert_dispatch import alert_dispatcher
+from backend.services.outbound_queue import delivery_summary
+from backend.auth.deps import get_current_user, get_token_principal
 
 router = APIRouter(prefix="/api/alerts", tags=["alerts"])
 
@@ -34,69 +34,13 @@ class AlertResponse(BaseModel):
     status: str
 
 
-async def send_alerts_to_region_users(alert_id: str, alert_data: dict, region: str):
+async def send_alerts_to_region_users(alert_id: str):
     """
-    Background task to send emails to all users in a region.
+    Background task: enqueue one email per user in the alert's region on the
+    outbound queue (see alert_dispatch.py); the outbound consumer process
+    sends them.
     """
-    try:
-        # Find users in the affected region
-        # Match by: location field, district, region, or any field containing the region name
-        users_cursor = users_col.find({
-            "$or": [
-                {"location": {"$regex": region, "$options": "i"}},
-                {"district": {"$regex": region, "$options": "i"}},
-                {"region": {"$regex": region, "$options": "i"}},
-                {"address": {"$regex": region, "$options": "i"}}
-            ]
-        })
-        
-        users = await users_cursor.to_list(length=1000)
-        
-        print(f"[ALERT] Found {len(users)} users in region: {region}")
-        
-        sent_count = 0
-        failed_count = 0
-        
-        for user in users:
-            email = user.get("email")
-            if email:
-                try:
-                    success = send_water_alert_email(email, alert_data)
-                    if success:
-                        sent_count += 1
-                    else:
-                        failed_count += 1
-                except Exception as e:
-                    print(f"[ALERT ERROR] Failed to send to {email}: {e}")
-                    failed_count += 1
-                
-                # Small delay to avoid rate limiting (100ms)
-                await asyncio.sleep(0.1)
-        
-        # Update alert with sent count
-        from bson import ObjectId
-        await alerts_col.update_one(
-            {"_id": ObjectId(alert_id)},
-            {
-                "$set": {
-                    "emails_sent": sent_count,
-                    "emails_failed": failed_count,
-                    "status": "sent",
-                    "completed_at": datetime.utcnow()
-                }
-            }
-        )
-        
-        print(f"[ALERT] Completed: {sent_count} sent, {failed_count} failed")
-        
-    except Exception as e:
-        print(f"[ALERT ERROR] Background task failed: {e}")
-        # Update alert status to failed
-        from bson import ObjectId
-        await alerts_col.update_one(
-            {"_id": ObjectId(alert_id)},
-            {"$set": {"status": "failed", "error": str(e)}}
-        )
+    await alert_dispatcher.dispatch(alert_id)
 
 
 @router.post("/create", response_model=AlertResponse)
@@ -144,6 +88,7 @@ async def create_water_alert(
         "created_by_name": current_user.get("full_name", "Unknown"),
         "created_by_role": user_role,
         "created_at": datetime.utcnow(),
+        "recipients": 0,
         "emails_sent": 0,
         "emails_failed": 0,
         "status": "pending"
@@ -152,22 +97,8 @@ async def create_water_alert(
     result = await alerts_col.insert_one(alert_doc)
     alert_id = str(result.inserted_id)
     
-    # Prepare alert data for emails
-    email_alert_data = {
-        "region": payload.region,
-        "title": payload.title,
-        "description": payload.description,
-        "severity": payload.severity.lower(),
-        "issued_by": current_user.get("full_name", "Health Department")
-    }
-    
     # Send emails in background (non-blocking)
-    background_tasks.add_task(
-        send_alerts_to_region_users, 
-        alert_id, 
-        email_alert_data, 
-        payload.region
-    )
+    background_tasks.add_task(send_alerts_to_region_users, alert_id)
     
     return AlertResponse(
         id=alert_id,
@@ -185,7 +116,7 @@ async def create_water_alert(
 @router.get("/list")
 async def list_alerts(
     limit: int = 20,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_token_principal)
 ):
     """Get recent water alerts."""
     alerts_cursor = alerts_col.find().sort("created_at", -1).limit(limit)
@@ -212,7 +143,7 @@ async def list_alerts(
 @router.get("/{alert_id}")
 async def get_alert(
     alert_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_token_principal)
 ):
     """Get a specific alert by ID."""
     from bson import ObjectId
@@ -235,8 +166,10 @@ async def get_alert(
         "created_by_role": alert.get("created_by_role"),
         "created_at": alert.get("created_at"),
         "completed_at": alert.get("completed_at"),
+        "recipients": alert.get("recipients", 0),
         "emails_sent": alert.get("emails_sent", 0),
         "emails_failed": alert.get("emails_failed", 0),
+        "delivery": await delivery_summary(alert["_id"]),
         "status": alert.get("status", "unknown"),
         "error": alert.get("error")
     }
@@ -1,5 +1,8 @@
 # backend/auth/deps.py
-from typing import Optional
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from .utils import decode_token
@@ -8,12 +11,73 @@ from bson import ObjectId
 
 security = HTTPBearer()
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+# Resolved users are cached per (user id, token iat) for a few seconds, so an
+# authenticated request doesn't always cost a Mongo round trip. Invalidation is
+# per process (update_user does it); other workers and separate scripts such
+# as seed_demo_users see a modified user after at most the TTL.
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "30"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+# read-only endpoints using get_token_principal trust the role/email claims
+# embedded in the token instead of loading the user. Off by default: claims
+# stay as issued until the token expires, even after a role change.
+AUTH_TRUST_TOKEN_CLAIMS = os.getenv("AUTH_TRUST_TOKEN_CLAIMS", "0").lower() in ("1", "true", "yes")
+
+
+class PrincipalCache:
+    def __init__(self, ttl: float = PRINCIPAL_CACHE_TTL_SECONDS, max_users: int = PRINCIPAL_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_users = max_users
+        # user id -> {token iat -> (expires_at, user)}
+        self._users: "OrderedDict[str, Dict[Any, Tuple[float, dict]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str, iat: Any) -> Optional[dict]:
+        entry = self._users.get(user_id, {}).get(iat)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._users.move_to_end(user_id)
+        return dict(entry[1])
+
+    def put(self, user_id: str, iat: Any, user: dict):
+        if self.ttl <= 0:
+            return
+        tokens = self._users.setdefault(user_id, {})
+        now = time.monotonic()
+        for k in [k for k, (exp, _) in tokens.items() if exp < now]:
+            del tokens[k]
+        tokens[iat] = (now + self.ttl, dict(user))
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        """Drop every cached principal of a user (call after modifying it)."""
+        self._users.pop(str(user_id), None)
+
+    def clear(self):
+        self._users.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"users": len(self._users), "ttl_seconds": self.ttl, "hits": self.hits, "misses": self.misses}
+
+
+principal_cache = PrincipalCache()
+
+
+async def update_user(query: dict, update: dict):
     """
-    Verifies Bearer token, decodes it and loads user from DB.
-    Raises 401 if token invalid or user not found.
-    Returns the user document (dict).
+    users_col.update_one that also drops the user's cached principals
+    (query must select by _id).
     """
+    res = await users_col.update_one(query, update)
+    principal_cache.invalidate(str(query["_id"]))
+    return res
+
+
+def _token_payload(credentials: HTTPAuthorizationCredentials) -> dict:
     token = credentials.credentials
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
@@ -23,13 +87,28 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or expired token")
 
-    sub = payload.get("sub")
-    if not sub:
+    if not payload.get("sub"):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
+    return payload
+
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """
+    Verifies Bearer token, decodes it and loads user from DB (or the
+    short-TTL principal cache).
+    Raises 401 if token invalid or user not found.
+    Returns the user document (dict).
+    """
+    payload = _token_payload(credentials)
+    sub = payload["sub"]
+
+    cached = principal_cache.get(sub, payload.get("iat"))
+    if cached is not None:
+        return cached
 
     # Load user from DB
     try:
-        user = await users_col.find_one({"_id": ObjectId(sub)})
+        user = await users_col.find_one({"_id": ObjectId(sub)}, {"password": 0})
     except Exception:
         user = None
 
@@ -39,4 +118,17 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     # convert ObjectId -> str and return
     user["id"] = str(user["_id"])
     user.pop("password", None)
+    principal_cache.put(sub, payload.get("iat"), user)
     return user
+
+
+async def get_token_principal(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """
+    For read-only endpoints: the principal described by the token's own
+    claims (id, email, role) when AUTH_TRUST_TOKEN_CLAIMS is on and the token
+    carries a role; otherwise the same as get_current_user.
+    """
+    payload = _token_payload(credentials)
+    if AUTH_TRUST_TOKEN_CLAIMS and payload.get("role"):
+        return {"id": payload["sub"], "email": payload.get("email"), "role": payload["role"], "from_token": True}
+    return await get_current_user(credentials)
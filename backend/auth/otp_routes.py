@@ -8,7 +8,8 @@ from datetime import datetime, timedelta
 from typing import Optional
 
 from backend.services.mongo_client import users_col, otp_col
-from backend.services.email_service import generate_otp, send_otp_email
+from backend.services.email_service import DEV_MODE, OTP_FROM, generate_otp, render_otp_email
+from backend.services.outbound_queue import enqueue_email
 from backend.auth.utils import create_access_token
 
 router = APIRouter(prefix="/api/auth/otp", tags=["otp-auth"])
@@ -68,7 +69,7 @@ async def request_otp(payload: RequestOTPRequest):
     expires_at = datetime.utcnow() + timedelta(minutes=5)
     
     # Save OTP to database
-    await otp_col.insert_one({
+    res = await otp_col.insert_one({
         "email": email,
         "user_id": str(user["_id"]),
         "otp_code": otp,  # In production, you might want to hash this
@@ -77,15 +78,22 @@ async def request_otp(payload: RequestOTPRequest):
         "created_at": datetime.utcnow()
     })
     
-    # Send OTP email
-    email_sent = send_otp_email(email, otp)
-    
-    if not email_sent:
+    # Queue the OTP email (sent by the outbound consumer, ahead of bulk alerts)
+    subject, html_content = render_otp_email(otp)
+    try:
+        await enqueue_email(email, subject, html_content, OTP_FROM, f"otp:{res.inserted_id}", kind="otp")
+    except Exception as e:
+        print(f"[EMAIL ERROR] Failed to queue OTP: {e}")
         raise HTTPException(
             status_code=500,
             detail="Failed to send OTP email. Please try again."
         )
-    
+
+    if DEV_MODE:
+        # no provider configured: the code is only visible in the API log
+        print(f"[DEV EMAIL - OTP] To: {email}")
+        print(f"[DEV EMAIL - OTP] OTP Code: {otp}")
+
     return OTPResponse(message="OTP sent to your email", expires_in_minutes=5)
 
 
@@ -16,9 +16,12 @@ from backend.auth.models import (
     AdminCreateGovernmentUserRequest,
     AdminCreatedUserResponse,
 )
-from backend.auth.utils import hash_password, verify_password, create_access_token
-from backend.auth.deps import get_current_user
+from backend.auth.utils import create_access_token
+from backend.services.auth_crypto import auth_crypto
+from backend.auth.deps import get_current_user, principal_cache, update_user
 from backend.services.mongo_client import users_col, create_or_update_asha_on_register
+from backend.services.locations import location_registry
+from backend.services.recipient_index import index_user
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
@@ -93,17 +96,11 @@ async def register(payload: RegisterRequest):
 
     email = payload.email.lower().strip()
 
-    # ensure email index exists
-    try:
-        await users_col.create_index("email", unique=True)
-    except Exception:
-        pass
-
     existing = await users_col.find_one({"email": email})
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed = hash_password(payload.password)
+    hashed = await auth_crypto.hash(payload.password, account=email)
 
     # Force public signup role to community user for safety
     role = "community_user"
@@ -115,6 +112,7 @@ async def register(payload: RegisterRequest):
         "password": hashed,
         "organization": payload.organization,
         "location": payload.location,
+        **location_registry.fields(payload.location),
         "phone": payload.phone,
         "created_at": datetime.utcnow(),
     }
@@ -125,6 +123,9 @@ async def register(payload: RegisterRequest):
     if not created:
         raise HTTPException(status_code=500, detail="Failed to create user")
 
+    # alert targeting: region -> recipient index
+    await index_user(created)
+
     return user_helper(created)
 
 
@@ -142,9 +143,13 @@ async def login(payload: UserLogin):
 
     stored_hash = user.get("password", "")
 
-    ok = verify_password(payload.password, stored_hash)
+    # bcrypt runs on the auth crypto pool, not the event loop
+    ok, new_hash = await auth_crypto.verify(email, payload.password, stored_hash)
     if not ok:
         raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        # stored hash used outdated cost parameters
+        await update_user({"_id": user["_id"], "password": stored_hash}, {"$set": {"password": new_hash}})
 
     token, exp = create_access_token(
         str(user["_id"]), extra={"email": user["email"], "role": user.get("role")}
@@ -234,7 +239,7 @@ async def admin_create_asha_worker(
         email = await generate_unique_email(local_part)
 
     temp_password = generate_temp_password()
-    hashed = hash_password(temp_password)
+    hashed = await auth_crypto.hash(temp_password)
 
     doc = {
         "full_name": payload.full_name.strip(),
@@ -243,6 +248,7 @@ async def admin_create_asha_worker(
         "password": hashed,
         "organization": "Nirogya Field ASHA",
         "location": f"{payload.location}, {payload.district}",
+        **location_registry.fields(payload.location, payload.district),
         "phone": payload.phone,
         "created_at": datetime.utcnow(),
     }
@@ -253,8 +259,13 @@ async def admin_create_asha_worker(
     if not created:
         raise HTTPException(status_code=500, detail="Failed to create ASHA worker")
 
+    # alert targeting: region -> recipient index
+    await index_user(created)
+
     # create ASHA worker profile document
     await create_or_update_asha_on_register(created)
+    # profile written: drop any principal resolved for this id meanwhile
+    principal_cache.invalidate(str(created["_id"]))
 
     base_user = user_helper(created)
     return {**base_user, "temp_password": temp_password}
@@ -282,7 +293,7 @@ async def admin_create_government_user(
         raise HTTPException(status_code=400, detail="Email already registered")
 
     temp_password = generate_temp_password()
-    hashed = hash_password(temp_password)
+    hashed = await auth_crypto.hash(temp_password)
 
     doc = {
         "full_name": payload.full_name.strip(),
@@ -291,6 +302,7 @@ async def admin_create_government_user(
         "password": hashed,
         "organization": payload.department or "Government Health Dept",
         "location": "Assam",
+        **location_registry.fields("Assam"),
         "phone": payload.phone,
         "created_at": datetime.utcnow(),
     }
@@ -301,5 +313,8 @@ async def admin_create_government_user(
     if not created:
         raise HTTPException(status_code=500, detail="Failed to create government user")
 
+    # alert targeting: region -> recipient index
+    await index_user(created)
+
     base_user = user_helper(created)
     return {**base_user, "temp_password": temp_password}
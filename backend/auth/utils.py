@@ -6,8 +6,18 @@ from typing import Optional, Tuple, Dict, Any
 from passlib.context import CryptContext
 import jwt  # PyJWT
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing. Hashes with any other bcrypt cost are flagged by
+# verify_and_update and re-hashed on the next successful login.
+# These are blocking (tens to hundreds of ms); async handlers go through
+# backend.services.auth_crypto instead of calling them directly.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -18,6 +28,16 @@ def verify_password(plain: str, hashed: str) -> bool:
     except Exception:
         return False
 
+def verify_and_update_password(plain: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """
+    (ok, new_hash): new_hash is set when the password matched but the stored
+    hash uses outdated parameters.
+    """
+    try:
+        return pwd_context.verify_and_update(plain, hashed)
+    except Exception:
+        return False, None
+
 # JWT configuration (read from env if present)
 JWT_SECRET = os.getenv("JWT_SECRET", "change-me-to-a-long-secret")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
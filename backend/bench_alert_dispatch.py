@@ -0,0 +1,73 @@
+# backend/bench_alert_dispatch.py
+"""
+Offline benchmark of alert email delivery against the mock provider: the old
+loop (one provider request + 100ms sleep per recipient) versus the outbound
+consumer's rate-limited batch requests. No Mongo or Resend.
+Run: python -m backend.bench_alert_dispatch [recipients] [requests_per_second] [workers]
+"""
+import asyncio
+import os
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.services.email_service import ALERT_FROM, render_water_alert
+from backend.services.outbound_queue import OUTBOUND_BATCH_SIZE, MockProvider, OutboundConsumer
+
+ALERT = {
+    "region": "Kamrup Metro",
+    "title": "Water Contamination Detected",
+    "description": "E. coli detected in the Chandmari supply; boil water before use.",
+    "severity": "high",
+    "issued_by": "Health Department",
+}
+
+LATENCY = 0.08  # per provider request
+
+
+async def serial(recipients) -> float:
+    provider = MockProvider(latency=LATENCY)
+    started = time.perf_counter()
+    for to in recipients:
+        subject, html = render_water_alert(ALERT)
+        await provider.send_batch([{"from": ALERT_FROM, "to": to, "subject": subject, "html": html}])
+        await asyncio.sleep(0.1)
+    return time.perf_counter() - started
+
+
+async def batched(recipients, rate: float, workers: int) -> float:
+    consumer = OutboundConsumer(MockProvider(latency=LATENCY), rate=rate, burst=max(1, int(rate)))
+    subject, html = render_water_alert(ALERT)
+    emails = [{"from": ALERT_FROM, "to": to, "subject": subject, "html": html} for to in recipients]
+    batches = [emails[i:i + OUTBOUND_BATCH_SIZE] for i in range(0, len(emails), OUTBOUND_BATCH_SIZE)]
+
+    async def worker():
+        while batches:
+            await consumer.deliver(batches.pop())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return time.perf_counter() - started
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+    recipients = [f"user{i}@example.org" for i in range(n)]
+
+    print("=" * 50)
+    print(f"Alert delivery: {n} recipients, mock provider latency {LATENCY * 1000:.0f}ms/request")
+    print("=" * 50)
+    t_serial = asyncio.run(serial(recipients))
+    print(f"serial + 100ms sleep:         {t_serial:7.2f}s  ({n / t_serial:8.1f}/s)")
+    t_batched = asyncio.run(batched(recipients, rate, workers))
+    print(f"batches of {OUTBOUND_BATCH_SIZE}, {rate:g} req/s, {workers} workers: "
+          f"{t_batched:7.2f}s  ({n / t_batched:8.1f}/s)")
+    print(f"speedup: {t_serial / t_batched:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# backend/bench_auth_crypto.py
+"""
+Benchmark: login throughput vs concurrent prediction traffic.
+
+A burst of logins (bcrypt verify at BCRYPT_ROUNDS) runs alongside a steady
+stream of simulated prediction requests (a little I/O wait plus ~1ms of
+numpy work on the event loop), once with bcrypt inline on the event loop
+(the old behaviour) and once per pool mode of the auth crypto service.
+No Mongo needed.
+Run: python -m backend.bench_auth_crypto [logins] [prediction_rps]
+"""
+import asyncio
+import os
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from backend.auth.utils import BCRYPT_ROUNDS, hash_password
+from backend.services.auth_crypto import AuthCrypto
+
+_W = np.random.rand(64, 64)
+
+
+async def fake_prediction(scheduled: float) -> float:
+    # latency from when the request arrived, so time spent waiting for a
+    # blocked event loop to even start it is counted
+    await asyncio.sleep(0.002)  # Mongo round trip
+    x = np.random.rand(64)
+    for _ in range(20):
+        x = np.tanh(_W @ x)
+    return time.perf_counter() - scheduled
+
+
+async def run(mode: str, n_logins: int, prediction_rps: float, stored_hash: str):
+    crypto = AuthCrypto(mode=mode, max_pending=n_logins, per_account=n_logins)
+    latencies = []
+    done = asyncio.Event()
+
+    async def prediction_traffic():
+        # open loop: request i arrives at start + i / rps whether or not the loop is free
+        tasks, start, i = [], time.perf_counter(), 0
+        while not done.is_set():
+            scheduled = start + i / prediction_rps
+            now = time.perf_counter()
+            if scheduled > now:
+                await asyncio.sleep(scheduled - now)
+            tasks.append(asyncio.create_task(fake_prediction(scheduled)))
+            i += 1
+        latencies.extend(await asyncio.gather(*tasks))
+
+    async def logins():
+        started = time.perf_counter()
+        await asyncio.gather(*(crypto.verify(f"asha{i}@nirogya.gov.in", "demo-password", stored_hash)
+                               for i in range(n_logins)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        return elapsed
+
+    traffic = asyncio.create_task(prediction_traffic())
+    await asyncio.sleep(0.1)  # traffic warm-up
+    elapsed = await logins()
+    await traffic
+    crypto.shutdown()
+
+    lat = np.array(latencies) * 1000
+    print(f"{mode:>8}: {n_logins / elapsed:7.1f} logins/s | predictions: {len(lat):5d} served, "
+          f"p50 {np.percentile(lat, 50):7.1f}ms  p99 {np.percentile(lat, 99):7.1f}ms  max {lat.max():7.1f}ms")
+
+
+def main():
+    n_logins = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    prediction_rps = float(sys.argv[2]) if len(sys.argv) > 2 else 200.0
+    stored_hash = hash_password("demo-password")
+
+    print("=" * 50)
+    print(f"{n_logins} concurrent logins (bcrypt rounds={BCRYPT_ROUNDS}) + {prediction_rps:g} predictions/s")
+    print("=" * 50)
+    for mode in ("inline", "thread", "process"):
+        asyncio.run(run(mode, n_logins, prediction_rps, stored_hash))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,158 @@
 # backend/routes/district_stats.py
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, HTTPException, Query
 from typing import Optional, List
 from datetime import datetime, timedelta
-from backend.services.mongo_client import prediction_col, symptom_col, water_col
+from pymongo.errors import OperationFailure
+from backend.services.locations import location_registry
+from backend.services.mongo_client import daily_counts_col, symptom_col, water_col
+from backend.services.outbreak_detector import outbreak_detector
+from backend.services.rollups import cutoff_day, region_filter
 
 router = APIRouter(prefix="/api/districts", tags=["districts"])
 
+WATER_PARAMS = ["pH", "turbidity", "tds", "chlorine", "fluoride", "nitrate", "coliform", "temperature"]
+WATER_PERCENTILES = [0.1, 0.5, 0.9]
+
+# $percentile needs MongoDB 7.0+; cleared the first time the server rejects it
+_percentiles_supported = True
+
+
+def _water_projection():
+    """
+    Tag water docs for $facet and coerce each parameter to a double
+    (form submissions store some as strings; unparseable values become null).
+    """
+    projection = {"_id": 0, "kind": "water"}
+    for p in WATER_PARAMS:
+        source = {"$ifNull": ["$pH", "$ph"]} if p == "pH" else f"${p}"
+        projection[p] = {"$convert": {"input": source, "to": "double", "onError": None, "onNull": None}}
+    return projection
+
+
+def _water_stats_group(percentiles=True):
+    """
+    mean/min/max (and percentiles) per parameter; nulls are ignored by every accumulator.
+    """
+    group = {"_id": None, "samples": {"$sum": 1}}
+    for p in WATER_PARAMS:
+        group[f"{p}_n"] = {"$sum": {"$cond": [{"$eq": [{"$type": f"${p}"}, "double"]}, 1, 0]}}
+        group[f"{p}_mean"] = {"$avg": f"${p}"}
+        group[f"{p}_min"] = {"$min": f"${p}"}
+        group[f"{p}_max"] = {"$max": f"${p}"}
+        if percentiles:
+            group[f"{p}_pct"] = {"$percentile": {"input": f"${p}", "p": WATER_PERCENTILES, "method": "approximate"}}
+    return group
+
+
+def _water_param_stats(row, p, percentiles=True):
+    def r2(v):
+        return round(v, 2) if v is not None else None
+
+    stats = {
+        "samples": row.get(f"{p}_n", 0),
+        "mean": r2(row.get(f"{p}_mean")),
+        "min": r2(row.get(f"{p}_min")),
+        "max": r2(row.get(f"{p}_max")),
+    }
+    if percentiles:
+        pct = row.get(f"{p}_pct") or [None] * len(WATER_PERCENTILES)
+        stats["percentiles"] = {f"p{int(q * 100)}": r2(v) for q, v in zip(WATER_PERCENTILES, pct)}
+    return stats
+
+
+def _resolve_district(text):
+    """
+    (id, is_district, display name) the rollup reports `text` under: its
+    district, else the place's own (unregistered) id. None if unresolvable.
+    """
+    m = location_registry.resolve(text)
+    if m is None:
+        return None
+    rid = m.district_id or m.id
+    entry = location_registry.get(rid)
+    return rid, m.district_id is not None, entry["name"] if entry else text.strip()
+
+
+def _region_name(rid, fallback):
+    entry = location_registry.get(rid)
+    return entry["name"] if entry else fallback or rid
+
+
+# rollup buckets are reported under their district, else their own location id
+_REGION_ID = {"$cond": [{"$ne": ["$district_id", ""]}, "$district_id", "$location_id"]}
+
+
+def _district_stats_pipeline(rid, is_district, cutoff, percentiles):
+    water_match = {"district_id": rid} if is_district else {"district_id": None, "location_id": rid}
+    return [
+        {
+            "$match": {
+                **region_filter(rid, is_district),
+                "day": {"$gte": cutoff}
+            }
+        },
+        {"$project": {"_id": 0, "kind": "cases", "disease": 1, "day": 1, "count": 1}},
+        {
+            "$unionWith": {
+                "coll": water_col.name,
+                "pipeline": [
+                    {"$match": {**water_match, "created_at": {"$gte": cutoff}}},
+                    {"$project": _water_projection()}
+                ]
+            }
+        },
+        {
+            "$facet": {
+                "disease_breakdown": [
+                    {"$match": {"kind": "cases"}},
+                    {"$group": {"_id": "$disease", "count": {"$sum": "$count"}}},
+                    {"$sort": {"count": -1}}
+                ],
+                "daily_trend": [
+                    {"$match": {"kind": "cases"}},
+                    {
+                        "$group": {
+                            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$day"}},
+                            "count": {"$sum": "$count"}
+                        }
+                    },
+                    {"$sort": {"_id": 1}}
+                ],
+                "water": [
+                    {"$match": {"kind": "water"}},
+                    {"$group": _water_stats_group(percentiles)}
+                ]
+            }
+        }
+    ]
+
 
 @router.get("/")
 async def get_all_districts():
     """
     Get list of all districts with basic stats.
     """
-    # Get unique districts from predictions
+    # Sum the daily rollup buckets per district
     pipeline = [
         {
             "$group": {
-                "_id": "$location",
-                "total_cases": {"$sum": 1},
-                "latest": {"$max": "$timestamp"}
+                "_id": _REGION_ID,
+                "total_cases": {"$sum": "$count"},
+                "latest": {"$max": "$last_at"},
+                "name": {"$last": "$location"}
             }
         },
         {"$sort": {"total_cases": -1}}
     ]
     
-    results = await prediction_col.aggregate(pipeline).to_list(None)
+    results = await daily_counts_col.aggregate(pipeline).to_list(None)
     
     districts = []
     for r in results:
         if r["_id"]:
             districts.append({
-                "district": r["_id"],
+                "district": _region_name(r["_id"], r.get("name")),
+                "district_id": r["_id"],
                 "total_cases": r["total_cases"],
                 "last_report": r["latest"].isoformat() if r["latest"] else None
             })
@@ -45,68 +167,34 @@ async def get_district_stats(
 ):
     """
     Get detailed statistics for a specific district.
+
+    Single round trip: the district's rollup buckets and its water samples
+    from the same period are unioned into one stream and split by $facet.
     """
-    cutoff = datetime.utcnow() - timedelta(days=days)
-    
-    # Disease breakdown
-    disease_pipeline = [
-        {
-            "$match": {
-                "location": district,
-                "timestamp": {"$gte": cutoff}
-            }
-        },
-        {
-            "$group": {
-                "_id": "$prediction.predicted_disease",
-                "count": {"$sum": 1}
-            }
-        },
-        {"$sort": {"count": -1}}
-    ]
-    
-    disease_results = await prediction_col.aggregate(disease_pipeline).to_list(None)
-    
-    # Daily trend
-    daily_pipeline = [
-        {
-            "$match": {
-                "location": district,
-                "timestamp": {"$gte": cutoff}
-            }
-        },
-        {
-            "$group": {
-                "_id": {
-                    "$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}
-                },
-                "count": {"$sum": 1}
-            }
-        },
-        {"$sort": {"_id": 1}}
-    ]
-    
-    daily_results = await prediction_col.aggregate(daily_pipeline).to_list(None)
-    
-    # Water quality summary
-    water_pipeline = [
-        {"$match": {"district": district}},
-        {"$sort": {"created_at": -1}},
-        {"$limit": 10}
-    ]
-    
-    water_results = await water_col.aggregate(water_pipeline).to_list(None)
-    
-    avg_ph = 0
-    avg_turbidity = 0
-    if water_results:
-        ph_values = [w.get("pH") or w.get("ph") for w in water_results if w.get("pH") or w.get("ph")]
-        turb_values = [w.get("turbidity") for w in water_results if w.get("turbidity")]
-        avg_ph = sum(ph_values) / len(ph_values) if ph_values else 0
-        avg_turbidity = sum(turb_values) / len(turb_values) if turb_values else 0
+    global _percentiles_supported
+    cutoff = cutoff_day(days)
+    resolved = _resolve_district(district)
+    if resolved is None:
+        raise HTTPException(status_code=400, detail="Unknown district")
+    rid, is_district, name = resolved
+
+    percentiles = _percentiles_supported
+    try:
+        facets = (await daily_counts_col.aggregate(_district_stats_pipeline(rid, is_district, cutoff, percentiles)).to_list(None))[0]
+    except OperationFailure as e:
+        # "unknown group operator '$percentile'"
+        if not percentiles or "percentile" not in str(e).lower():
+            raise
+        # server older than 7.0: serve the same stats without percentiles from now on
+        _percentiles_supported = percentiles = False
+        facets = (await daily_counts_col.aggregate(_district_stats_pipeline(rid, is_district, cutoff, percentiles)).to_list(None))[0]
+    disease_results = facets["disease_breakdown"]
+    water = facets["water"][0] if facets["water"] else {}
+    parameters = {p: _water_param_stats(water, p, percentiles) for p in WATER_PARAMS}
     
     return {
-        "district": district,
+        "district": name,
+        "district_id": rid,
         "period_days": days,
         "disease_breakdown": [
             {"disease": r["_id"], "count": r["count"]}
@@ -114,12 +202,15 @@ async def get_district_stats(
         ],
         "daily_trend": [
             {"date": r["_id"], "count": r["count"]}
-            for r in daily_results
+            for r in facets["daily_trend"]
         ],
         "water_quality": {
-            "avg_ph": round(avg_ph, 2),
-            "avg_turbidity": round(avg_turbidity, 2),
-            "recent_reports": len(water_results)
+            "avg_ph": parameters["pH"]["mean"] or 0,
+            "avg_turbidity": parameters["turbidity"]["mean"] or 0,
+            "recent_reports": water.get("samples", 0),
+            "parameters": parameters,
+            # False when the server has no $percentile (MongoDB < 7.0)
+            "percentiles_available": percentiles
         },
         "total_cases": sum(r["count"] for r in disease_results)
     }
@@ -133,34 +224,44 @@ async def compare_districts(
     """
     Compare statistics across multiple districts.
     """
-    district_list = [d.strip() for d in districts.split(",")]
-    cutoff = datetime.utcnow() - timedelta(days=days)
+    district_list = [d.strip() for d in districts.split(",") if d.strip()]
+    resolved = {d: _resolve_district(d) for d in district_list}
+    cutoff = cutoff_day(days)
+    
+    # One round trip for all districts
+    region_ids = {r[0]: r[1] for r in resolved.values() if r}
+    pipeline = [
+        {
+            "$match": {
+                "$or": [region_filter(rid, is_district) for rid, is_district in region_ids.items()],
+                "day": {"$gte": cutoff}
+            }
+        },
+        {
+            "$group": {
+                "_id": {"region": _REGION_ID, "disease": "$disease"},
+                "count": {"$sum": "$count"}
+            }
+        }
+    ]
+    
+    results = await daily_counts_col.aggregate(pipeline).to_list(None) if region_ids else []
+    
+    by_region = {rid: [] for rid in region_ids}
+    for r in results:
+        by_region[r["_id"]["region"]].append(r)
     
     comparison = []
     
     for district in district_list:
-        pipeline = [
-            {
-                "$match": {
-                    "location": district,
-                    "timestamp": {"$gte": cutoff}
-                }
-            },
-            {
-                "$group": {
-                    "_id": "$prediction.predicted_disease",
-                    "count": {"$sum": 1}
-                }
-            }
-        ]
-        
-        results = await prediction_col.aggregate(pipeline).to_list(None)
-        
-        total = sum(r["count"] for r in results)
-        top_disease = max(results, key=lambda x: x["count"])["_id"] if results else None
+        rid, _, name = resolved[district] or (None, False, district)
+        rows = by_region.get(rid, [])
+        total = sum(r["count"] for r in rows)
+        top_disease = max(rows, key=lambda x: x["count"])["_id"]["disease"] if rows else None
         
         comparison.append({
-            "district": district,
+            "district": name,
+            "district_id": rid,
             "total_cases": total,
             "top_disease": top_disease
         })
@@ -173,44 +274,28 @@ async def compare_districts(
 
 @router.get("/alerts")
 async def get_district_alerts(
-    threshold: int = Query(5, description="Minimum cases to trigger alert")
+    threshold: int = Query(5, description="Only list districts with at least this many cases today")
 ):
     """
-    Get districts with elevated disease activity.
+    Get districts with statistically elevated disease activity today, from
+    the streaming outbreak detector (per-district baselines; no aggregation).
     """
-    cutoff = datetime.utcnow() - timedelta(days=7)
-    
-    pipeline = [
-        {"$match": {"timestamp": {"$gte": cutoff}}},
-        {
-            "$group": {
-                "_id": {
-                    "location": "$location",
-                    "disease": "$prediction.predicted_disease"
-                },
-                "count": {"$sum": 1}
-            }
-        },
-        {"$match": {"count": {"$gte": threshold}}},
-        {"$sort": {"count": -1}}
-    ]
-    
-    results = await prediction_col.aggregate(pipeline).to_list(None)
-    
     alerts = []
-    for r in results:
-        if r["_id"]["location"] and r["_id"]["disease"]:
-            severity = "critical" if r["count"] >= 15 else "high" if r["count"] >= 10 else "medium"
-            alerts.append({
-                "district": r["_id"]["location"],
-                "disease": r["_id"]["disease"],
-                "cases": r["count"],
-                "severity": severity,
-                "message": f"{r['count']} cases of {r['_id']['disease']} detected in {r['_id']['location']}"
-            })
+    for sig in outbreak_detector.signals(only_alerts=True, min_cases=threshold):
+        alerts.append({
+            "district": sig["location"],
+            "district_id": sig["district_id"] or sig["location_id"],
+            "disease": sig["disease"],
+            "cases": sig["cases_today"],
+            "expected": sig["baseline_mean"],
+            "score": sig["score"],
+            "cusum": sig["cusum"],
+            "severity": sig["severity"],
+            "message": f"{sig['cases_today']} cases of {sig['disease']} detected in {sig['location']} today (expected ~{sig['baseline_mean']})"
+        })
     
     return {
         "alerts": alerts,
         "threshold": threshold,
-        "period": "last_7_days"
+        "period": "today"
     }
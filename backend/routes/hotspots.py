@@ -1,9 +1,10 @@
 # backend/routes/hotspots.py
 from fastapi import APIRouter, Query, HTTPException
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
-from backend.services.mongo_client import db, prediction_col
-from bson import ObjectId
+from typing import Optional
+from backend.services.geo import make_point, parse_bbox
+from backend.services.hotspot_engine import GROUP_BY_CELL, GROUP_BY_LOCATION, hotspot_engine
+from backend.services.mongo_client import prediction_col
 
 router = APIRouter(prefix="/api", tags=["hotspots"])
 
@@ -17,127 +18,104 @@ async def get_hotspots(
     days: int = Query(7, description="Time window in days"),
     threshold: int = Query(10, description="Minimum count to be considered a hotspot"),
     limit: int = Query(100, description="Max buckets to return"),
+    group_by: str = Query(GROUP_BY_LOCATION, description="'location' or 'cell' (geohash grid)"),
+    bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+    lon: Optional[float] = Query(None, description="Center longitude for a radius query"),
+    lat: Optional[float] = Query(None, description="Center latitude for a radius query"),
+    radius_km: Optional[float] = Query(None, description="Radius around lon/lat in km"),
 ):
     """
-    Returns hotspot buckets grouped by (location OR grid) + disease.
-    Works with prediction_reports that have either:
-      - top-level fields: predicted_disease, predicted_at, location
-      - OR nested: prediction.predicted_disease, prediction.features, timestamp / predicted_at
+    Returns hotspot buckets grouped by location (or geohash cell) + disease,
+    served from the in-memory sliding-window engine
+    (backend/services/hotspot_engine.py). Windows are capped at
+    HOTSPOT_MAX_DAYS; disease/district filters are case-insensitive exact
+    matches; bbox and lon/lat/radius_km filter on the bucket's point.
     """
-
-    now = _now_utc()
-    since = now - timedelta(days=days)
-
-    pr = prediction_col
-
-    # Build an aggregation pipeline that:
-    # - normalizes disease and predicted_at fields into "disease" and "predicted_at_norm"
-    # - optionally filters by disease/district/time window
-    # - groups by location string (fallback) and disease
-    # - returns buckets with count and sample list
-    pipeline: List[Dict[str, Any]] = []
-
-    # 1) Add normalized fields: disease and predicted_at
-    pipeline.append({
-        "$addFields": {
-            "disease_norm": {
-                "$ifNull": [
-                    "$predicted_disease",
-                    {"$ifNull": ["$prediction.predicted_disease", None]}
-                ]
-            },
-            "predicted_at_norm": {
-                "$ifNull": [
-                    "$predicted_at",
-                    {"$ifNull": ["$prediction.predicted_at", {"$ifNull": ["$prediction.timestamp", "$timestamp"]} ]}
-                ]
-            },
-            # keep location fallback
-            "location_norm": {
-                "$ifNull": ["$location", {"$ifNull": ["$input.sym_doc.location", "$input.water_doc.location"]}]
-            }
-        }
-    })
-
-    # 2) match by time window and optional disease/district
-    match_stage = {
-        "$match": {
-            "disease_norm": {"$ne": None},
-            # predicted_at_norm must exist and be within time window - relies on stored ISODate or string
-            # We'll attempt to match by date if field is ISODate; if it's string ISO, Mongo will not compare directly -
-            # but in your data predicted_at is a date object; so this should work.
-            "predicted_at_norm": {"$gte": since}
-        }
-    }
-    pipeline.append(match_stage)
-
+    if group_by not in (GROUP_BY_LOCATION, GROUP_BY_CELL):
+        raise HTTPException(status_code=400, detail="group_by must be 'location' or 'cell'")
+    try:
+        box = parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    near = (lon, lat) if lon is not None and lat is not None else None
+
+    buckets = hotspot_engine.hotspots(days=days, threshold=threshold, disease=disease, district=district, limit=limit,
+                                      group_by=group_by, bbox=box, near=near, radius_km=radius_km)
+
+    out = []
+    for doc in buckets:
+        # compute severity based on threshold
+        cnt = doc.get("count", 0)
+        if cnt >= threshold * 1.5:
+            severity = "high"
+        elif cnt >= threshold:
+            severity = "medium"
+        else:
+            severity = "low"
+
+        out.append({**doc, "severity": severity})
+
+    return {"hotspots": out, "threshold": threshold, "window_days": min(days, hotspot_engine.max_days), "group_by": group_by}
+
+
+@router.get("/hotspots/nearby")
+async def get_cases_nearby(
+    lon: float = Query(..., description="Longitude, e.g. of a tube well"),
+    lat: float = Query(..., description="Latitude"),
+    radius_km: float = Query(5, description="Search radius in km"),
+    days: int = Query(30, description="Time window in days"),
+    disease: Optional[str] = Query(None, description="Filter by disease name"),
+):
+    """
+    Cases within radius_km of a point, per disease, straight from
+    prediction_reports via $geoNear on the {geo: 2dsphere, ts} index.
+    """
+    query = {"ts": {"$gte": datetime.utcnow() - timedelta(days=days)}}
     if disease:
-        pipeline.append({"$match": {"disease_norm": {"$regex": f"^{disease}$", "$options": "i"}}})
-    if district:
-        # user sample had district inside input_water.district; try both
-        pipeline.append({
-            "$match": {
-                "$or": [
-                    {"location_norm": {"$regex": f"{district}", "$options": "i"}},
-                    {"input_water.district": {"$regex": f"{district}", "$options": "i"}},
-                    {"input.sym_doc.district": {"$regex": f"{district}", "$options": "i"}}
-                ]
+        query["disease"] = disease
+
+    pipeline = [
+        {
+            "$geoNear": {
+                "near": make_point(lon, lat),
+                "key": "geo",
+                "distanceField": "distance_m",
+                "maxDistance": radius_km * 1000,
+                "query": query,
+                "spherical": True
             }
-        })
-
-    # 3) Group by location_norm + disease_norm
-    pipeline.append({
-        "$group": {
-            "_id": {"location": "$location_norm", "disease": "$disease_norm"},
-            "count": {"$sum": 1},
-            "samples": {"$push": {
-                "prediction_id": "$_id",
-                "patientName": {"$ifNull": ["$patientName", "$input.sym_doc.patientName"]},
-                "predicted_at": "$predicted_at_norm",
-                "location": "$location_norm"
-            }}
-        }
-    })
-
-    # 4) keep only groups >= threshold
-    pipeline.append({"$match": {"count": {"$gte": threshold}}})
-
-    # 5) sort by count desc, limit
-    pipeline.append({"$sort": {"count": -1}})
-    pipeline.append({"$limit": limit})
-
-    # 6) project a friendly shape
-    pipeline.append({
-        "$project": {
-            "_id": 0,
-            "location": "$_id.location",
-            "disease": "$_id.disease",
-            "count": 1,
-            "samples": {"$slice": ["$samples", 10]}
-        }
-    })
-
-    try:
-        cursor = pr.aggregate(pipeline)
-        out = []
-        async for doc in cursor:
-            # compute severity based on threshold
-            cnt = doc.get("count", 0)
-            if cnt >= threshold * 1.5:
-                severity = "high"
-            elif cnt >= threshold:
-                severity = "medium"
-            else:
-                severity = "low"
+        },
+        {
+            "$group": {
+                "_id": "$disease",
+                "count": {"$sum": 1},
+                "nearest_m": {"$min": "$distance_m"},
+                "cells": {"$addToSet": "$geo_cell"},
+                "locations": {"$addToSet": "$location"}
+            }
+        },
+        {"$sort": {"count": -1}}
+    ]
+
+    results = await prediction_col.aggregate(pipeline).to_list(None)
+    return {
+        "center": [lat, lon],  # same [lat, lon] shape as /hotspots
+        "radius_km": radius_km,
+        "window_days": days,
+        "total_cases": sum(r["count"] for r in results),
+        "by_disease": [
+            {
+                "disease": r["_id"],
+                "count": r["count"],
+                "nearest_km": round(r["nearest_m"] / 1000, 3),
+                "cells": sorted(c for c in r["cells"] if c),
+                "locations": sorted(l for l in r["locations"] if l)
+            }
+            for r in results
+        ]
+    }
 
-            out.append({
-                "location": doc.get("location"),
-                "disease": doc.get("disease"),
-                "count": cnt,
-                "severity": severity,
-                "samples": doc.get("samples", [])
-            })
 
-        return {"hotspots": out, "threshold": threshold, "window_days": days}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Aggregation failed: {e}")
\ No newline at end of file
+@router.get("/hotspots/stats")
+async def get_hotspot_engine_stats():
+    return hotspot_engine.stats()
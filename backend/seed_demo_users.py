@@ -5,6 +5,8 @@ Run this script to create demo accounts in the database.
 import asyncio
 from datetime import datetime
 from backend.services.mongo_client import users_col
+from backend.services.locations import location_registry
+from backend.services.recipient_index import index_user
 from backend.auth.utils import hash_password
 
 
@@ -153,6 +155,8 @@ async def seed_demo_users():
     except Exception as e:
         print(f"⚠ Index creation warning: {e}")
     
+    await location_registry.load()
+    
     created_count = 0
     updated_count = 0
     
@@ -163,7 +167,9 @@ async def seed_demo_users():
         existing = await users_col.find_one({"email": email})
         
         if existing:
-            # Update existing user's password
+            # Update existing user's password (and role/location). This runs
+            # outside the API, whose principal cache picks the change up
+            # within PRINCIPAL_CACHE_TTL_SECONDS.
             hashed = hash_password(demo_user["password"])
             await users_col.update_one(
                 {"email": email},
@@ -174,6 +180,7 @@ async def seed_demo_users():
                         "role": demo_user["role"],
                         "organization": demo_user["organization"],
                         "location": demo_user["location"],
+                        **location_registry.fields(demo_user["location"]),
                         "phone": demo_user["phone"]
                     }
                 }
@@ -190,6 +197,7 @@ async def seed_demo_users():
                 "password": hashed,
                 "organization": demo_user["organization"],
                 "location": demo_user["location"],
+                **location_registry.fields(demo_user["location"]),
                 "phone": demo_user["phone"],
                 "created_at": datetime.utcnow()
             }
@@ -197,6 +205,8 @@ async def seed_demo_users():
             print(f"✓ Created: {email} ({demo_user['role']})")
             created_count += 1
     
+        await index_user(await users_col.find_one({"email": email}))
+    
     print(f"\n✅ Seeding complete!")
     print(f"   Created: {created_count} users")
     print(f"   Updated: {updated_count} users")
@@ -0,0 +1,226 @@
+# backend/services/alert_dispatch.py
+"""
+Fan-out of water alerts to the users of a region, through the outbound
+queue (outbound_queue.py); nothing here talks to the email provider.
+
+- the email is rendered once per alert and stored as shared content
+- recipients are streamed from the region -> recipient index
+  (recipient_index.py; one indexed equality on the region key, sorted by
+  user _id, no cap on how many users a region has) and enqueued in chunks of
+  ALERT_DISPATCH_CHUNK, one message per user with idempotency key
+  alert:<alert_id>:<user_id>
+- after every chunk the last user _id and the recipient count are
+  checkpointed on the water_alerts doc, under a lease, so a fan-out
+  interrupted by a crash or restart is resumed from its checkpoint by
+  resume_loop (re-enqueueing a chunk is a no-op thanks to the keys)
+
+Fields written on water_alerts docs:
+  status            pending | sending | sent | failed
+  recipients        messages enqueued; emails_sent / emails_failed are kept
+                    up to date by the outbound consumer, which marks the
+                    alert sent once every message is sent or dead
+  dispatch          {region_key, last_user_id, enqueued, lease_owner, lease_until, attempts, last_error}
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from backend.services.email_service import ALERT_FROM, render_water_alert
+from backend.services.mongo_client import alerts_col, recipients_col
+from backend.services.outbound_queue import PRIORITY_BULK, complete_alerts, enqueue, put_content
+from backend.services.recipient_index import region_key as resolve_region_key
+from backend.services.work_queue import WORKER_ID
+
+ALERT_DISPATCH_CHUNK = int(os.getenv("ALERT_DISPATCH_CHUNK", "500"))
+ALERT_LEASE_SECONDS = int(os.getenv("ALERT_LEASE_SECONDS", "300"))
+ALERT_DISPATCH_MAX_ATTEMPTS = int(os.getenv("ALERT_DISPATCH_MAX_ATTEMPTS", "3"))
+ALERT_RESUME_SECONDS = float(os.getenv("ALERT_RESUME_SECONDS", "60"))
+
+
+# ---------- dispatcher ----------
+def _alert_email_data(alert: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "region": alert.get("region"),
+        "title": alert.get("title"),
+        "description": alert.get("description"),
+        "severity": alert.get("severity"),
+        "issued_by": alert.get("created_by_name") if alert.get("created_by_name") not in (None, "", "Unknown") else "Health Department",
+    }
+
+
+class AlertDispatcher:
+    def __init__(self, chunk: int = ALERT_DISPATCH_CHUNK):
+        self.chunk = max(1, chunk)
+        self._active: set = set()
+
+    # ---------- lease / checkpoint ----------
+    async def _claim(self, alert_id: ObjectId) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        return await alerts_col.find_one_and_update(
+            {
+                "_id": alert_id,
+                "status": {"$in": ["pending", "sending"]},
+                "dispatch.enqueued": {"$ne": True},
+                "$or": [{"dispatch.lease_until": None}, {"dispatch.lease_until": {"$lt": now}}],
+            },
+            {
+                "$set": {
+                    "status": "sending",
+                    "dispatch.lease_owner": WORKER_ID,
+                    "dispatch.lease_until": now + timedelta(seconds=ALERT_LEASE_SECONDS),
+                },
+                "$inc": {"dispatch.attempts": 1},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _checkpoint(self, alert_id: ObjectId, last_user_id, enqueued: int) -> bool:
+        """
+        Record progress and renew the lease; False if the lease was lost.
+        """
+        res = await alerts_col.update_one(
+            {"_id": alert_id, "dispatch.lease_owner": WORKER_ID},
+            {
+                "$set": {
+                    "dispatch.last_user_id": last_user_id,
+                    "dispatch.lease_until": datetime.utcnow() + timedelta(seconds=ALERT_LEASE_SECONDS),
+                },
+                "$inc": {"recipients": enqueued},
+            },
+        )
+        return res.matched_count == 1
+
+    async def _finish(self, alert_id: ObjectId):
+        await alerts_col.update_one(
+            {"_id": alert_id, "dispatch.lease_owner": WORKER_ID},
+            {
+                "$set": {"dispatch.enqueued": True, "dispatch.enqueued_at": datetime.utcnow()},
+                "$unset": {"dispatch.lease_owner": "", "dispatch.lease_until": ""},
+            },
+        )
+        # nothing to wait for if every message was already delivered (or there were none)
+        await complete_alerts([alert_id])
+
+    async def _release(self, alert: Dict[str, Any], error: Exception):
+        # retried by resume_loop until ALERT_DISPATCH_MAX_ATTEMPTS
+        attempts = (alert.get("dispatch") or {}).get("attempts", 1)
+        update: Dict[str, Any] = {
+            "$set": {"dispatch.last_error": str(error)},
+            "$unset": {"dispatch.lease_owner": "", "dispatch.lease_until": ""},
+        }
+        if attempts >= ALERT_DISPATCH_MAX_ATTEMPTS:
+            update["$set"].update(status="failed", error=str(error), completed_at=datetime.utcnow())
+        await alerts_col.update_one({"_id": alert["_id"], "dispatch.lease_owner": WORKER_ID}, update)
+
+    # ---------- fan-out ----------
+    async def dispatch(self, alert_id) -> Optional[int]:
+        """
+        Enqueue (or resume enqueueing) an alert's emails. Returns how many
+        messages this run enqueued, or None if the alert is already fully
+        enqueued or leased by another worker.
+        """
+        alert_id = ObjectId(alert_id) if not isinstance(alert_id, ObjectId) else alert_id
+        if alert_id in self._active:
+            return None
+        alert = await self._claim(alert_id)
+        if alert is None:
+            return None
+        self._active.add(alert_id)
+        try:
+            return await self._run(alert)
+        except Exception as e:
+            print(f"[ALERT ERROR] Dispatch of {alert_id} failed: {e}")
+            await self._release(alert, e)
+            return None
+        finally:
+            self._active.discard(alert_id)
+
+    async def _run(self, alert: Dict[str, Any]) -> int:
+        alert_id = alert["_id"]
+        state = alert.get("dispatch") or {}
+        region_key = state.get("region_key")
+        if region_key is None:
+            # fixed at the first attempt so a resumed run targets the same users
+            region_key = resolve_region_key(alert.get("region") or "") or ""
+            await alerts_col.update_one({"_id": alert_id}, {"$set": {"dispatch.region_key": region_key}})
+
+        content_id = f"alert:{alert_id}"
+        subject, html = render_water_alert(_alert_email_data(alert))
+        await put_content(content_id, subject, html, ALERT_FROM)
+
+        query: Dict[str, Any] = {"region_keys": region_key}
+        if state.get("last_user_id") is not None:
+            query["_id"] = {"$gt": state["last_user_id"]}
+            print(f"[ALERT] Resuming {alert_id} after user {state['last_user_id']}")
+
+        total = 0
+        batch = []
+        cursor = recipients_col.find(query, {"email": 1}).sort("_id", 1).batch_size(self.chunk)
+        async for user in cursor:
+            batch.append(user)
+            if len(batch) >= self.chunk:
+                n = await self._flush(alert_id, content_id, batch)
+                if n is None:
+                    print(f"[ALERT] Lost lease on {alert_id}; stopping")
+                    return total
+                total += n
+                batch = []
+        if batch:
+            n = await self._flush(alert_id, content_id, batch)
+            if n is None:
+                return total
+            total += n
+
+        await self._finish(alert_id)
+        print(f"[ALERT] Queued {total} emails for {alert_id}")
+        return total
+
+    async def _flush(self, alert_id: ObjectId, content_id: str, batch) -> Optional[int]:
+        n = await enqueue([{
+            "idempotency_key": f"alert:{alert_id}:{u['_id']}",
+            "kind": "water_alert",
+            "priority": PRIORITY_BULK,
+            "to": u["email"],
+            "content_id": content_id,
+            "alert_id": alert_id,
+        } for u in batch])
+        return n if await self._checkpoint(alert_id, batch[-1]["_id"], n) else None
+
+    async def resume_incomplete(self) -> int:
+        """
+        Dispatch every alert not yet fully enqueued whose lease has expired.
+        """
+        now = datetime.utcnow()
+        n = 0
+        cursor = alerts_col.find(
+            {
+                "status": {"$in": ["pending", "sending"]},
+                "dispatch.enqueued": {"$ne": True},
+                "$or": [{"dispatch.lease_until": None}, {"dispatch.lease_until": {"$lt": now}}],
+            },
+            {"_id": 1},
+        ).sort("created_at", 1)
+        async for alert in cursor:
+            if await self.dispatch(alert["_id"]) is not None:
+                n += 1
+        return n
+
+    async def resume_loop(self, interval: float = ALERT_RESUME_SECONDS):
+        """
+        Background task: pick up alerts interrupted by a crash or restart.
+        """
+        while True:
+            try:
+                n = await self.resume_incomplete()
+                if n:
+                    print(f"[ALERT] Resumed {n} interrupted alert(s)")
+            except Exception as e:
+                print("[ALERT ERROR] Resume scan failed:", e)
+            await asyncio.sleep(interval)
+
+
+alert_dispatcher = AlertDispatcher()
@@ -0,0 +1,136 @@
+# backend/services/auth_crypto.py
+"""
+Password hashing / verification off the event loop.
+
+bcrypt costs tens to hundreds of ms of CPU per call; run inline it stalls
+every other request on the worker (a morning login spike blocks
+predictions and dashboards). Calls go to a dedicated bounded pool instead:
+
+AUTH_CRYPTO_MODE:
+  - thread:  dedicated thread pool (default; bcrypt releases the GIL while
+             hashing, so threads run on separate cores)
+  - process: spawned process pool
+  - inline:  on the event loop (tests)
+
+Admission control:
+  - at most AUTH_CRYPTO_MAX_PENDING jobs queued or running; beyond that
+    AuthCryptoBusy(503) is raised, which app.py turns into 503 + Retry-After
+  - at most AUTH_CRYPTO_PER_ACCOUNT jobs per account (email) at a time;
+    beyond that AuthCryptoBusy(429), so one account being hammered cannot
+    take the whole pool
+
+verify() also returns a replacement hash when the stored one was made with
+other cost parameters (BCRYPT_ROUNDS); the login route stores it.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from backend.auth.utils import hash_password, verify_and_update_password
+
+AUTH_CRYPTO_MODE = os.getenv("AUTH_CRYPTO_MODE", "thread").lower()
+AUTH_CRYPTO_WORKERS = int(os.getenv("AUTH_CRYPTO_WORKERS", str(min(2, os.cpu_count() or 1))))
+AUTH_CRYPTO_MAX_PENDING = int(os.getenv("AUTH_CRYPTO_MAX_PENDING", "64"))
+AUTH_CRYPTO_PER_ACCOUNT = int(os.getenv("AUTH_CRYPTO_PER_ACCOUNT", "2"))
+AUTH_CRYPTO_RETRY_AFTER_SECONDS = int(os.getenv("AUTH_CRYPTO_RETRY_AFTER_SECONDS", "1"))
+
+VALID_MODES = ("inline", "thread", "process")
+
+
+class AuthCryptoBusy(Exception):
+    """Raised when the crypto pool (503) or an account's share of it (429) is full."""
+
+    def __init__(self, status_code: int = 503, retry_after: int = AUTH_CRYPTO_RETRY_AFTER_SECONDS):
+        super().__init__("Too many authentication attempts in progress, retry later")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AuthCrypto:
+    def __init__(self, mode: str = AUTH_CRYPTO_MODE, workers: int = AUTH_CRYPTO_WORKERS,
+                 max_pending: int = AUTH_CRYPTO_MAX_PENDING, per_account: int = AUTH_CRYPTO_PER_ACCOUNT):
+        if mode not in VALID_MODES:
+            print(f"AuthCrypto: unknown AUTH_CRYPTO_MODE={mode!r}, using 'thread'")
+            mode = "thread"
+        self.mode = mode
+        self.workers = 1 if mode == "inline" else max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.per_account = max(1, per_account)
+        self._pool: Optional[Executor] = None
+        self._pending = 0
+        self._by_account: Dict[str, int] = {}
+        self.finished = 0
+        self.rejected = 0
+        self.rejected_per_account = 0
+        self.rehashed = 0
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.mode == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="auth-crypto")
+        return self._pool
+
+    async def _run(self, account: Optional[str], fn: Callable, *args) -> Any:
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise AuthCryptoBusy(503)
+        if account is not None:
+            if self._by_account.get(account, 0) >= self.per_account:
+                self.rejected_per_account += 1
+                raise AuthCryptoBusy(429)
+            self._by_account[account] = self._by_account.get(account, 0) + 1
+
+        self._pending += 1
+        try:
+            if self.mode == "inline":
+                return fn(*args)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_pool(), fn, *args)
+        finally:
+            self._pending -= 1
+            self.finished += 1
+            if account is not None:
+                left = self._by_account[account] - 1
+                if left:
+                    self._by_account[account] = left
+                else:
+                    del self._by_account[account]
+
+    async def hash(self, password: str, account: Optional[str] = None) -> str:
+        return await self._run(account, hash_password, password)
+
+    async def verify(self, account: str, password: str, stored_hash: str) -> Tuple[bool, Optional[str]]:
+        """
+        (ok, new_hash); new_hash is set when the password matched and the
+        stored hash should be replaced (cost parameters changed).
+        """
+        ok, new_hash = await self._run(account, verify_and_update_password, password, stored_hash)
+        if ok and new_hash:
+            self.rehashed += 1
+        return ok, new_hash
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "per_account": self.per_account,
+            "accounts_in_flight": len(self._by_account),
+            "finished": self.finished,
+            "rejected": self.rejected,
+            "rejected_per_account": self.rejected_per_account,
+            "rehashed": self.rehashed,
+        }
+
+
+auth_crypto = AuthCrypto()
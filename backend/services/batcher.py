@@ -0,0 +1,133 @@
+# backend/services/batcher.py
+"""
+Async micro-batching in front of predictor.predict_batch.
+
+Concurrent callers await predict_disease_async(); their requests are collected
+for up to PREDICT_BATCH_MAX_WAIT_MS (or until PREDICT_BATCH_MAX_SIZE rows are
+queued), scored with one vectorized predict on the inference executor, and the
+results are fanned back to each awaiting caller. At most PREDICT_QUEUE_MAX_ROWS
+requests may wait; beyond that callers get InferenceSaturated.
+"""
+import asyncio
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend.services.predictor import predict_batch
+from backend.services.inference_executor import InferenceExecutor, InferenceSaturated, inference_executor
+
+PREDICT_BATCH_MAX_SIZE = int(os.getenv("PREDICT_BATCH_MAX_SIZE", "64"))
+PREDICT_BATCH_MAX_WAIT_MS = float(os.getenv("PREDICT_BATCH_MAX_WAIT_MS", "5"))
+PREDICT_QUEUE_MAX_ROWS = int(os.getenv("PREDICT_QUEUE_MAX_ROWS", "1024"))
+
+
+class MicroBatcher:
+    """
+    Collects (w_doc, s_doc) pairs from concurrent coroutines and runs them through
+    `predict_fn` (a sync, module-level function taking a list of pairs) in one call.
+    Batches are scored on `executor`; up to executor.workers batches run at once,
+    and while all slots are busy new requests keep accumulating into the next batch.
+    """
+
+    def __init__(self, predict_fn: Callable[[List[Tuple[dict, dict]]], List[Dict[str, Any]]],
+                 executor: InferenceExecutor = inference_executor,
+                 max_size: int = PREDICT_BATCH_MAX_SIZE, max_wait_ms: float = PREDICT_BATCH_MAX_WAIT_MS,
+                 max_queue: int = PREDICT_QUEUE_MAX_ROWS):
+        self._predict_fn = predict_fn
+        self._executor = executor
+        self.max_size = max(1, max_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_queue = max(1, max_queue)
+        self._queue: Optional[asyncio.Queue] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        # strong refs: the loop only keeps weak ones to running tasks
+        self._dispatching: set = set()
+        self.rejected = 0
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._slots = asyncio.Semaphore(self._executor.workers)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def predict(self, w_doc: dict, s_doc: dict) -> Dict[str, Any]:
+        self._ensure_started()
+        fut = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((w_doc or {}, s_doc or {}, fut))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise InferenceSaturated()
+        return await fut
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_size:
+            # take whatever is already queued without yielding
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _dispatch(self, batch: list):
+        pairs = [(w, s) for w, s, _ in batch]
+        try:
+            results = await self._executor.run(self._predict_fn, pairs)
+        except Exception as e:
+            for _, _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        results = list(results)
+        for i, (_, _, fut) in enumerate(batch):
+            if fut.done():
+                continue
+            if i < len(results):
+                fut.set_result(results[i])
+            else:
+                fut.set_exception(RuntimeError(f"predict_fn returned {len(results)} results for {len(batch)} rows"))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = loop.create_task(self._dispatch(batch))
+            self._dispatching.add(task)
+            task.add_done_callback(self._dispatching.discard)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "batches_in_flight": len(self._dispatching),
+            "rejected": self.rejected,
+        }
+
+
+batcher = MicroBatcher(predict_batch)
+
+
+async def predict_disease_async(w_doc: dict, s_doc: dict) -> Dict[str, Any]:
+    """
+    Async, micro-batched equivalent of predictor.predict_disease.
+    """
+    return await batcher.predict(w_doc, s_doc)
@@ -19,16 +19,21 @@ resend.api_key = RESEND_API_KEY
 DEV_MODE = not RESEND_API_KEY
 
 
+class EmailRejected(Exception):
+    """The provider refused the request's content (e.g. one invalid address in a batch)."""
+
+
 def generate_otp(length: int = 6) -> str:
     """Generate a numeric OTP."""
     return ''.join(random.choices(string.digits, k=length))
 
 
-def send_otp_email(to_email: str, otp: str) -> bool:
-    """
-    Send OTP to user's email.
-    Returns True if sent successfully, False otherwise.
-    """
+OTP_FROM = "Nirogya <onboarding@resend.dev>"
+ALERT_FROM = "Nirogya Alerts <onboarding@resend.dev>"
+
+
+def render_otp_email(otp: str):
+    """(subject, html) of the login OTP email."""
     subject = "Your Nirogya Login OTP"
     html_content = f"""
     <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
@@ -50,7 +55,16 @@ def send_otp_email(to_email: str, otp: str) -> bool:
         </div>
     </div>
     """
-    
+    return subject, html_content
+
+
+def send_otp_email(to_email: str, otp: str) -> bool:
+    """
+    Send OTP to user's email.
+    Returns True if sent successfully, False otherwise.
+    """
+    subject, html_content = render_otp_email(otp)
+
     if DEV_MODE:
         print(f"[DEV EMAIL - OTP] To: {to_email}")
         print(f"[DEV EMAIL - OTP] OTP Code: {otp}")
@@ -59,7 +73,7 @@ def send_otp_email(to_email: str, otp: str) -> bool:
     
     try:
         params: resend.Emails.SendParams = {
-            "from": "Nirogya <onboarding@resend.dev>",
+            "from": OTP_FROM,
             "to": [to_email],
             "subject": subject,
             "html": html_content
@@ -72,10 +86,10 @@ def send_otp_email(to_email: str, otp: str) -> bool:
         return False
 
 
-def send_water_alert_email(to_email: str, alert_data: dict) -> bool:
+def render_water_alert(alert_data: dict):
     """
-    Send water contamination alert to users in affected region.
-    Returns True if sent successfully, False otherwise.
+    (subject, html) of a water alert email. Rendered once per alert and
+    reused for every recipient.
     """
     region = alert_data.get('region', 'Your Area')
     title = alert_data.get('title', 'Water Contamination Detected')
@@ -132,7 +146,38 @@ def send_water_alert_email(to_email: str, alert_data: dict) -> bool:
         </div>
     </div>
     """
-    
+    return subject, html_content
+
+
+def send_email_batch(emails: list) -> list:
+    """
+    Send up to 100 rendered emails ({"from", "to", "subject", "html"}) in one
+    Resend batch request (blocking). Returns the provider ids in input order.
+    Raises EmailRejected when Resend refuses the content (any invalid message
+    rejects the whole batch) and other exceptions for transport/server errors.
+    """
+    if DEV_MODE:
+        for e in emails:
+            print(f"[DEV EMAIL - BATCH] To: {e['to']}, Subject: {e['subject']}")
+        return [f"dev-{i}" for i in range(len(emails))]
+
+    try:
+        response = resend.Batch.send([{**e, "to": [e["to"]] if isinstance(e["to"], str) else e["to"]} for e in emails])
+    except (resend.exceptions.ValidationError, resend.exceptions.MissingRequiredFieldsError) as e:
+        raise EmailRejected(str(e)) from e
+    data = response.get("data", response) if isinstance(response, dict) else response
+    return [(d or {}).get("id") for d in data]
+
+
+def send_water_alert_email(to_email: str, alert_data: dict) -> bool:
+    """
+    Send water contamination alert to users in affected region.
+    Returns True if sent successfully, False otherwise.
+    """
+    region = alert_data.get('region', 'Your Area')
+    title = alert_data.get('title', 'Water Contamination Detected')
+    subject, html_content = render_water_alert(alert_data)
+
     if DEV_MODE:
         print(f"[DEV EMAIL - ALERT] To: {to_email}")
         print(f"[DEV EMAIL - ALERT] Region: {region}, Title: {title}")
@@ -141,7 +186,7 @@ def send_water_alert_email(to_email: str, alert_data: dict) -> bool:
     
     try:
         params: resend.Emails.SendParams = {
-            "from": "Nirogya Alerts <onboarding@resend.dev>",
+            "from": ALERT_FROM,
             "to": [to_email],
             "subject": subject,
             "html": html_content
@@ -174,7 +219,7 @@ def send_test_email(to_email: str) -> bool:
     
     try:
         params: resend.Emails.SendParams = {
-            "from": "Nirogya <onboarding@resend.dev>",
+            "from": OTP_FROM,
             "to": [to_email],
             "subject": subject,
             "html": html_content
@@ -0,0 +1,162 @@
+# backend/services/feature_encoder.py
+"""
+Compiled feature encoder for the disease model.
+
+Column indices are resolved once from EXPECTED_FEATURES; each (water, symptom)
+pair is written straight into a preallocated float32 row, with all symptom
+keywords found in a single regex pass.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# EXACT expected features (from your model)
+EXPECTED_FEATURES = [
+    'ph', 'turbidity', 'tds', 'chlorine', 'fluoride', 'nitrate', 'coliform',
+    'temperature', 'diarrhea', 'vomiting', 'fever', 'abdominal_pain', 'jaundice',
+    'dehydration', 'fatigue', 'nausea', 'headache', 'symptom_diarrhea',
+    'symptom_vomiting', 'symptom_fever', 'symptom_abdominal_pain',
+    'symptom_jaundice', 'symptom_dehydration', 'symptom_fatigue',
+    'symptom_nausea', 'symptom_headache', 'district_Dibrugarh',
+    'district_Jorhat', 'district_Kamrup Metro', 'district_Sonitpur',
+    'primary_water_source_Municipal tap water', 'primary_water_source_Pond water',
+    'primary_water_source_River water', 'primary_water_source_Tube well',
+    'primary_water_source_Well water'
+]
+
+DISTRICT_CATS = ["Dibrugarh", "Jorhat", "Kamrup Metro", "Sonitpur"]
+WATER_SOURCE_CATS = ["Municipal tap water", "Pond water", "River water", "Tube well", "Well water"]
+
+WATER_NUMERIC = ['turbidity', 'tds', 'chlorine', 'fluoride', 'nitrate', 'coliform', 'temperature']
+
+# symptom flag -> substrings that set it (matched against lower-cased symptom strings)
+SYMPTOM_KEYWORDS = {
+    'diarrhea': ["diarrh"],
+    'vomiting': ["vomit"],
+    'fever': ["fever"],
+    'abdominal_pain': ["abdominal pain", "stomach pain"],
+    'jaundice': ["jaundice"],
+    'dehydration': ["dehydra"],
+    'fatigue': ["fatigue"],
+    'nausea': ["nausea"],
+    'headache': ["headache"],
+}
+
+
+def _safe_float(x):
+    try:
+        return float(x)
+    except Exception:
+        return 0.0
+
+
+def _normalize_symptoms(symptoms):
+    if symptoms is None:
+        return []
+    if isinstance(symptoms, str):
+        parts = [s.strip() for s in symptoms.split(",") if s.strip()]
+        return [p.lower() for p in parts]
+    return [str(s).lower() for s in symptoms]
+
+
+class FeatureEncoder:
+    """
+    Encodes (w_doc, s_doc) pairs into rows laid out as `feature_names`.
+    Features the encoder doesn't know about are left at 0.
+    """
+
+    def __init__(self, feature_names: Sequence[str] = EXPECTED_FEATURES, dtype=np.float32):
+        self.feature_names = list(feature_names)
+        self.n_features = len(self.feature_names)
+        self.dtype = dtype
+        idx = {name: i for i, name in enumerate(self.feature_names)}
+
+        self._ph_col = idx.get('ph')
+        self._water_cols = [(idx[k], k) for k in WATER_NUMERIC if k in idx]
+
+        # one regex, one named group per symptom flag; a hit sets both the plain
+        # and the duplicated symptom_ column
+        self._symptom_cols: Dict[str, List[int]] = {}
+        alternatives = []
+        for flag, keywords in SYMPTOM_KEYWORDS.items():
+            cols = [idx[c] for c in (flag, f"symptom_{flag}") if c in idx]
+            if not cols:
+                continue
+            self._symptom_cols[flag] = cols
+            alternatives.append(f"(?P<{flag}>{'|'.join(re.escape(k) for k in keywords)})")
+        self._symptom_re = re.compile("|".join(alternatives)) if alternatives else None
+
+        self._district_cols = {
+            d.lower(): idx[f"district_{d}"] for d in DISTRICT_CATS if f"district_{d}" in idx
+        }
+        self._source_cols = {
+            s.lower(): idx[f"primary_water_source_{s}"]
+            for s in WATER_SOURCE_CATS if f"primary_water_source_{s}" in idx
+        }
+
+    def encode_into(self, row: np.ndarray, w_doc: Optional[dict], s_doc: Optional[dict]) -> np.ndarray:
+        """
+        Write the features for one pair into `row` (a 1-D view of length n_features).
+        """
+        row[:] = 0
+        w_doc = w_doc or {}
+        s_doc = s_doc or {}
+
+        # water numeric features
+        if self._ph_col is not None:
+            row[self._ph_col] = _safe_float(w_doc.get("pH") if "pH" in w_doc else w_doc.get("ph"))
+        for col, key in self._water_cols:
+            row[col] = _safe_float(w_doc.get(key, 0))
+
+        # symptom flags - single pass over all symptom strings
+        if self._symptom_re is not None:
+            symptoms_list = _normalize_symptoms(s_doc.get("symptoms"))
+            if symptoms_list:
+                for m in self._symptom_re.finditer("\n".join(symptoms_list)):
+                    for col in self._symptom_cols[m.lastgroup]:
+                        row[col] = 1.0
+
+        # district one-hot (case-insensitive match)
+        district = s_doc.get("district") or s_doc.get("district_name") or s_doc.get("village_district")
+        if not district:
+            district = w_doc.get("district")
+        if isinstance(district, str):
+            col = self._district_cols.get(district.strip().lower())
+            if col is not None:
+                row[col] = 1.0
+
+        # primary water source one-hot (case-insensitive)
+        src = w_doc.get("primary_water_source") or w_doc.get("water_source") or w_doc.get("primaryWaterSource")
+        if isinstance(src, str):
+            col = self._source_cols.get(src.strip().lower())
+            if col is not None:
+                row[col] = 1.0
+
+        return row
+
+    def encode(self, w_doc: Optional[dict], s_doc: Optional[dict]) -> np.ndarray:
+        row = np.zeros(self.n_features, dtype=self.dtype)
+        return self.encode_into(row, w_doc, s_doc)
+
+    def encode_batch(self, pairs: Iterable[Tuple[Optional[dict], Optional[dict]]],
+                     out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Encode a list of (w_doc, s_doc) pairs into an (n, n_features) matrix.
+        `out` may be a preallocated block with at least n rows; the used rows are returned.
+        """
+        pairs = list(pairs)
+        if out is None:
+            out = np.zeros((len(pairs), self.n_features), dtype=self.dtype)
+        for i, (w_doc, s_doc) in enumerate(pairs):
+            self.encode_into(out[i], w_doc, s_doc)
+        return out[:len(pairs)]
+
+    def to_dict(self, row: np.ndarray) -> Dict[str, float]:
+        """
+        Named view of an encoded row (the shape build_feature_dict used to return).
+        """
+        return {name: round(float(v), 6) for name, v in zip(self.feature_names, row.tolist())}
+
+
+encoder = FeatureEncoder()
@@ -0,0 +1,191 @@
+# backend/services/geo.py
+"""
+Coordinates for reports and predictions.
+
+- point_from_payload(): GeoJSON Point from lat/lng style fields in a report
+  payload, else a gazetteer lookup of its village/location/district name
+- geohash cells at GEO_CELL_PRECISION (6 = roughly 1.2 km x 0.6 km) used to
+  bucket hotspots independently of how a place name was spelled
+- haversine / bbox helpers for the in-memory hotspot filters
+
+The built-in gazetteer covers the demo districts; GAZETTEER_PATH may point to
+a JSON file of {"name": [lon, lat], ...} that extends or overrides it.
+"""
+import json
+import math
+import os
+from typing import Any, Dict, Optional, Tuple
+
+GEO_CELL_PRECISION = int(os.getenv("GEO_CELL_PRECISION", "6"))
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", "")
+
+EARTH_RADIUS_KM = 6371.0088
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_BASE32_INDEX = {c: i for i, c in enumerate(_BASE32)}
+
+# name -> (lon, lat)
+GAZETTEER: Dict[str, Tuple[float, float]] = {
+    "dibrugarh": (94.9120, 27.4728),
+    "jorhat": (94.2037, 26.7509),
+    "kamrup metro": (91.7362, 26.1445),
+    "guwahati": (91.7362, 26.1445),
+    "sonitpur": (92.8000, 26.6338),
+    "tezpur": (92.8000, 26.6338),
+    "chandmari": (91.7467, 26.1875),
+    "silchar": (92.7789, 24.8333),
+}
+
+
+def _load_gazetteer_file(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for name, (lon, lat) in json.load(f).items():
+                GAZETTEER[name.strip().lower()] = (float(lon), float(lat))
+    except Exception as e:
+        print("Gazetteer: could not load", path, e)
+
+
+if GAZETTEER_PATH:
+    _load_gazetteer_file(GAZETTEER_PATH)
+
+
+# ---------- geohash ----------
+def geohash_encode(lon: float, lat: float, precision: int = GEO_CELL_PRECISION) -> str:
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    out, bits, ch, even = [], 0, 0, True
+    while len(out) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch, lon_lo = (ch << 1) | 1, mid
+            else:
+                ch, lon_hi = ch << 1, mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch, lat_lo = (ch << 1) | 1, mid
+            else:
+                ch, lat_hi = ch << 1, mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            out.append(_BASE32[ch])
+            bits, ch = 0, 0
+    return "".join(out)
+
+
+def geohash_bounds(cell: str) -> Tuple[float, float, float, float]:
+    """
+    (min_lon, min_lat, max_lon, max_lat) of a geohash cell.
+    """
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    even = True
+    for c in cell:
+        v = _BASE32_INDEX[c]
+        for shift in range(4, -1, -1):
+            bit = (v >> shift) & 1
+            if even:
+                mid = (lon_lo + lon_hi) / 2
+                lon_lo, lon_hi = (mid, lon_hi) if bit else (lon_lo, mid)
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                lat_lo, lat_hi = (mid, lat_hi) if bit else (lat_lo, mid)
+            even = not even
+    return lon_lo, lat_lo, lon_hi, lat_hi
+
+
+def geohash_center(cell: str) -> Tuple[float, float]:
+    min_lon, min_lat, max_lon, max_lat = geohash_bounds(cell)
+    return (min_lon + max_lon) / 2, (min_lat + max_lat) / 2
+
+
+# ---------- points ----------
+def make_point(lon: float, lat: float) -> Dict[str, Any]:
+    return {"type": "Point", "coordinates": [round(lon, 6), round(lat, 6)]}
+
+
+def point_coords(geo: Optional[Dict[str, Any]]) -> Optional[Tuple[float, float]]:
+    if not isinstance(geo, dict):
+        return None
+    coords = geo.get("coordinates")
+    if isinstance(coords, (list, tuple)) and len(coords) == 2:
+        return float(coords[0]), float(coords[1])
+    return None
+
+
+def _valid(lon, lat) -> bool:
+    return -180.0 <= lon <= 180.0 and -90.0 <= lat <= 90.0
+
+
+def _coerce_pair(lat, lon) -> Optional[Tuple[float, float]]:
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    return (lon, lat) if _valid(lon, lat) else None
+
+
+def gazetteer_lookup(*names) -> Optional[Tuple[float, float]]:
+    for name in names:
+        if isinstance(name, str):
+            hit = GAZETTEER.get(name.strip().lower())
+            if hit:
+                return hit
+    return None
+
+
+def point_from_payload(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    {"geo": Point, "geo_cell": str, "geo_source": "reported" | "gazetteer"}
+    for a report payload, or None when neither coordinates nor a known place
+    name are present. Accepts lat/lng, lat/lon, latitude/longitude, a GeoJSON
+    `geo`/`coordinates` value, or a {lat, lng} `location`.
+    """
+    pair = None
+    geo = payload.get("geo")
+    if point_coords(geo):
+        lon, lat = point_coords(geo)
+        pair = (lon, lat) if _valid(lon, lat) else None
+    if pair is None:
+        lat = payload.get("lat", payload.get("latitude"))
+        lon = payload.get("lng", payload.get("lon", payload.get("longitude")))
+        if lat is not None and lon is not None:
+            pair = _coerce_pair(lat, lon)
+    if pair is None and isinstance(payload.get("location"), dict):
+        loc = payload["location"]
+        pair = _coerce_pair(loc.get("lat"), loc.get("lng", loc.get("lon")))
+
+    source = "reported"
+    if pair is None:
+        pair = gazetteer_lookup(payload.get("village"), payload.get("location"), payload.get("waterLocation"),
+                                payload.get("district"))
+        source = "gazetteer"
+    if pair is None:
+        return None
+    return {"geo": make_point(*pair), "geo_cell": geohash_encode(*pair), "geo_source": source}
+
+
+# ---------- distances ----------
+def haversine_km(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    lon1, lat1 = map(math.radians, a)
+    lon2, lat2 = map(math.radians, b)
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+
+def in_bbox(point: Tuple[float, float], bbox: Tuple[float, float, float, float]) -> bool:
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return min_lon <= point[0] <= max_lon and min_lat <= point[1] <= max_lat
+
+
+def parse_bbox(value: Optional[str]) -> Optional[Tuple[float, float, float, float]]:
+    """
+    "min_lon,min_lat,max_lon,max_lat" -> tuple; ValueError if malformed.
+    """
+    if not value:
+        return None
+    parts = [float(p) for p in value.split(",")]
+    if len(parts) != 4 or parts[0] > parts[2] or parts[1] > parts[3]:
+        raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    return parts[0], parts[1], parts[2], parts[3]
@@ -0,0 +1,324 @@
+# backend/services/hotspot_engine.py
+"""
+In-memory sliding-window case counts for /api/hotspots, per (location, disease)
+and per (geohash cell, disease) so spelling variants of one village and
+nearby villages land in the same cell.
+
+Each key keeps a ring buffer of HOTSPOT_BUCKET_SECONDS buckets covering
+HOTSPOT_MAX_DAYS, plus running totals for the 1/7/30-day windows that are
+adjusted as buckets expire, so those windows are read in O(1) and any other
+window in O(buckets). A bounded reservoir of sample predictions is kept per key.
+
+Fed from the prediction write path (observe) and, for predictions stored by
+other workers, by tailing prediction_reports on `_id` (sync loop). Tailing by
+insertion order rather than `ts` also catches late inserts carrying an old
+`ts`; each pass re-reads HOTSPOT_SYNC_OVERLAP_SECONDS of inserts (ObjectIds
+from different writers are only roughly ordered) and skips ids already seen.
+"""
+import asyncio
+import os
+import random
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+from backend.services.geo import geohash_center, haversine_km, in_bbox, point_coords
+from backend.services.locations import location_registry
+from backend.services.mongo_client import prediction_col
+
+HOTSPOT_BUCKET_SECONDS = int(os.getenv("HOTSPOT_BUCKET_SECONDS", "3600"))
+HOTSPOT_MAX_DAYS = int(os.getenv("HOTSPOT_MAX_DAYS", "30"))
+HOTSPOT_SAMPLE_SIZE = int(os.getenv("HOTSPOT_SAMPLE_SIZE", "10"))
+HOTSPOT_SYNC_SECONDS = float(os.getenv("HOTSPOT_SYNC_SECONDS", "5"))
+HOTSPOT_SYNC_OVERLAP_SECONDS = float(os.getenv("HOTSPOT_SYNC_OVERLAP_SECONDS", "30"))
+
+TRACKED_WINDOWS_DAYS = (1, 7, 30)
+
+_EPOCH = datetime(1970, 1, 1)
+_SEEN_IDS_MAX = 50000
+
+_PROJECTION = {"disease": 1, "ts": 1, "location": 1, "location_id": 1, "district_id": 1, "patient_name": 1,
+               "geo": 1, "geo_cell": 1}
+
+GROUP_BY_LOCATION = "location"
+GROUP_BY_CELL = "cell"
+_MAX_NAMES_PER_CELL = 10
+
+
+def _slot_of(ts: datetime) -> int:
+    return int((ts - _EPOCH).total_seconds() // HOTSPOT_BUCKET_SECONDS)
+
+
+def _fields(doc: Dict[str, Any]) -> Optional[Tuple[str, str, datetime, Optional[str], Dict[str, Any]]]:
+    """
+    (location, disease, ts, region ids, sample) from a canonical prediction doc
+    (see prediction_schema.py); None if unusable. The sample carries the
+    doc's point, if any.
+    """
+    disease, ts, loc = doc.get("disease"), doc.get("ts"), doc.get("location")
+    if not disease or not loc or not isinstance(ts, datetime):
+        return None
+
+    sample = {
+        "prediction_id": str(doc["_id"]) if doc.get("_id") is not None else None,
+        "patientName": doc.get("patient_name"),
+        "predicted_at": ts,
+        "location": loc,
+        "geo": doc.get("geo"),
+        "geo_cell": doc.get("geo_cell"),
+    }
+    region_ids = {i for i in (doc.get("location_id"), doc.get("district_id")) if i}
+    return loc, disease, ts, region_ids, sample
+
+
+class _Series:
+    __slots__ = ("counts", "head", "totals", "samples", "seen", "region_ids", "point", "names")
+
+    def __init__(self, n_slots: int, head: int):
+        self.counts = array("I", [0]) * n_slots
+        self.head = head
+        self.totals = {w: 0 for w in TRACKED_WINDOWS_DAYS}
+        self.samples: List[Dict[str, Any]] = []
+        self.seen = 0
+        self.region_ids: set = set()  # location_id / district_id values seen
+        self.point: Optional[Tuple[float, float]] = None  # (lon, lat): cell center / last reported point
+        self.names: set = set()  # location names seen in a cell
+
+
+class HotspotEngine:
+    def __init__(self, bucket_seconds: int = HOTSPOT_BUCKET_SECONDS, max_days: int = HOTSPOT_MAX_DAYS,
+                 sample_size: int = HOTSPOT_SAMPLE_SIZE):
+        self.bucket_seconds = bucket_seconds
+        self.max_days = max_days
+        self.sample_size = sample_size
+        self.slots_per_day = max(1, 86400 // bucket_seconds)
+        self.n_slots = max_days * self.slots_per_day
+        # window days -> width in slots (only windows that fit the ring)
+        self._tracked = {w: w * self.slots_per_day for w in TRACKED_WINDOWS_DAYS if w <= max_days}
+        # (group_by, location or cell, disease) -> series
+        self._series: Dict[Tuple[str, str, str], _Series] = {}
+        self._seen_ids: "OrderedDict[Any, None]" = OrderedDict()
+        self._high_water: Optional[ObjectId] = None  # highest prediction _id read from Mongo
+        self.seeded = False
+        self.observed = 0
+
+    # ---------- ring maintenance ----------
+    def _advance(self, s: _Series, slot: int):
+        """
+        Move the head forward to `slot`, expiring buckets from every window.
+        """
+        steps = slot - s.head
+        if steps <= 0:
+            return
+        if steps >= self.n_slots:
+            s.counts = array("I", [0]) * self.n_slots
+            s.totals = {w: 0 for w in s.totals}
+        else:
+            for h in range(s.head + 1, slot + 1):
+                for w, width in self._tracked.items():
+                    s.totals[w] -= s.counts[(h - width) % self.n_slots]
+                s.counts[h % self.n_slots] = 0
+        s.head = slot
+        self._expire_samples(s, slot)
+
+    def _expire_samples(self, s: _Series, head: int):
+        oldest = head - self.n_slots + 1
+        if s.samples and _slot_of(s.samples[0]["predicted_at"]) < oldest:
+            s.samples = [x for x in s.samples if _slot_of(x["predicted_at"]) >= oldest]
+            # restart the reservoir at what is still in range
+            s.seen = len(s.samples)
+
+    def _window_total(self, s: _Series, days: int) -> int:
+        if days in self._tracked:
+            return s.totals[days]
+        width = min(days * self.slots_per_day, self.n_slots)
+        return sum(s.counts[(s.head - i) % self.n_slots] for i in range(width))
+
+    # ---------- writes ----------
+    def observe(self, doc: Dict[str, Any], now: Optional[datetime] = None) -> bool:
+        """
+        Count one stored prediction. Returns False if it was unusable, too old,
+        or already counted.
+        """
+        pid = doc.get("_id")
+        if pid is not None:
+            if pid in self._seen_ids:
+                return False
+            self._seen_ids[pid] = None
+            while len(self._seen_ids) > _SEEN_IDS_MAX:
+                self._seen_ids.popitem(last=False)
+
+        f = _fields(doc)
+        if f is None:
+            return False
+        loc, disease, ts, region_ids, sample = f
+
+        head = _slot_of(now or datetime.utcnow())
+        slot = _slot_of(ts)
+        if slot > head:
+            head = slot  # clock skew: never count into the future
+        if head - slot >= self.n_slots:
+            return False
+
+        point = point_coords(sample["geo"])
+        counted = self._count((GROUP_BY_LOCATION, loc, disease), head, slot, region_ids, sample, point, loc)
+        cell = sample["geo_cell"]
+        if cell:
+            self._count((GROUP_BY_CELL, cell, disease), head, slot, region_ids, sample, geohash_center(cell), loc)
+        if counted:
+            self.observed += 1
+        return counted
+
+    def _count(self, key: Tuple[str, str, str], head: int, slot: int, region_ids: set,
+               sample: Dict[str, Any], point: Optional[Tuple[float, float]], name: str) -> bool:
+        s = self._series.get(key)
+        if s is None:
+            s = self._series[key] = _Series(self.n_slots, head)
+        self._advance(s, head)
+        age = s.head - slot
+        if age >= self.n_slots:
+            return False
+
+        s.counts[slot % self.n_slots] += 1
+        for w, width in self._tracked.items():
+            if age < width:
+                s.totals[w] += 1
+        s.region_ids |= region_ids
+        if point:
+            s.point = point
+        if key[0] == GROUP_BY_CELL and len(s.names) < _MAX_NAMES_PER_CELL:
+            s.names.add(name)
+
+        # reservoir sampling (Algorithm R); kept sorted oldest-first for expiry
+        s.seen += 1
+        if len(s.samples) < self.sample_size:
+            s.samples.append(sample)
+        else:
+            j = random.randrange(s.seen)
+            if j < self.sample_size:
+                s.samples[j] = sample
+        s.samples.sort(key=lambda x: x["predicted_at"])
+        return True
+
+    # ---------- reads ----------
+    def hotspots(self, days: int = 7, threshold: int = 10, disease: Optional[str] = None,
+                 district: Optional[str] = None, limit: int = 100, group_by: str = GROUP_BY_LOCATION,
+                 bbox: Optional[Tuple[float, float, float, float]] = None,
+                 near: Optional[Tuple[float, float]] = None, radius_km: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Buckets (locations or geohash cells) whose count over the last `days`
+        (capped at max_days) is >= threshold, highest first. disease is a
+        case-insensitive exact match; district is resolved through the location
+        registry and matched on location_id / district_id. bbox / near+radius_km keep buckets
+        whose point (cell center, or last reported point of a location) is
+        inside; buckets without a point are dropped by those filters.
+        """
+        days = max(1, min(days, self.max_days))
+        head = _slot_of(datetime.utcnow())
+        oldest = head - days * self.slots_per_day + 1
+        disease_cf = disease.casefold() if disease else None
+        region = location_registry.resolve(district) if district else None
+
+        out = []
+        for key, s in list(self._series.items()):
+            self._advance(s, head)
+            empty = s.totals[self.max_days] == 0 if self.max_days in self._tracked else not any(s.counts)
+            if empty:
+                del self._series[key]  # nothing left in the ring
+                continue
+            kind, name, dis = key
+            if kind != group_by:
+                continue
+            if disease_cf and dis.casefold() != disease_cf:
+                continue
+            if region and region.id not in s.region_ids:
+                continue
+            if (bbox or near) and s.point is None:
+                continue
+            if bbox and not in_bbox(s.point, bbox):
+                continue
+            distance = haversine_km(near, s.point) if near else None
+            if near and radius_km is not None and distance > radius_km:
+                continue
+            count = self._window_total(s, days)
+            if count < threshold:
+                continue
+
+            row = {"disease": dis, "count": count,
+                   "samples": [x for x in s.samples if _slot_of(x["predicted_at"]) >= oldest],
+                   # [lat, lon], the shape the dashboard map reads (points are kept as (lon, lat))
+                   "center": [s.point[1], s.point[0]] if s.point else None}
+            if kind == GROUP_BY_CELL:
+                row.update(cell=name, location=", ".join(sorted(s.names)), locations=sorted(s.names))
+            else:
+                row["location"] = name
+            if distance is not None:
+                row["distance_km"] = round(distance, 3)
+            out.append(row)
+
+        out.sort(key=lambda r: r["count"], reverse=True)
+        return out[:limit]
+
+    # ---------- sync with Mongo ----------
+    async def _load(self, query: Dict[str, Any], sort_field: str) -> int:
+        n = 0
+        async for doc in prediction_col.find(query, _PROJECTION).sort(sort_field, 1):
+            if self.observe(doc):
+                n += 1
+            pid = doc.get("_id")
+            if isinstance(pid, ObjectId) and (self._high_water is None or pid > self._high_water):
+                self._high_water = pid
+        return n
+
+    async def _tail(self) -> int:
+        """
+        Predictions inserted since the high-water _id (minus the overlap).
+        """
+        since = self._high_water.generation_time - timedelta(seconds=HOTSPOT_SYNC_OVERLAP_SECONDS)
+        return await self._load({"_id": {"$gte": ObjectId.from_datetime(since)}}, "_id")
+
+    async def seed(self) -> int:
+        """
+        Load the last max_days of predictions (indexed range scan on ts).
+        """
+        # the tail starts from here, so inserts made while seeding aren't missed
+        self._high_water = ObjectId.from_datetime(datetime.utcnow())
+        since = datetime.utcnow() - timedelta(days=self.max_days)
+        n = await self._load({"ts": {"$gte": since}}, "ts")
+        self.seeded = True
+        print(f"HotspotEngine: seeded {n} predictions into {len(self._series)} keys")
+        return n
+
+    async def sync_loop(self, interval: float = HOTSPOT_SYNC_SECONDS):
+        """
+        Background task: seed, then pick up predictions stored by other workers.
+        Ids already observed locally are skipped.
+        """
+        while not self.seeded:
+            try:
+                await self.seed()
+            except Exception as e:
+                print("HotspotEngine seed error:", e)
+                await asyncio.sleep(interval)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._tail()
+            except Exception as e:
+                print("HotspotEngine sync error:", e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keys": len(self._series),
+            "bucket_seconds": self.bucket_seconds,
+            "max_days": self.max_days,
+            "observed": self.observed,
+            "seeded": self.seeded,
+            "high_water": self._high_water.generation_time.isoformat() if self._high_water else None,
+        }
+
+
+hotspot_engine = HotspotEngine()
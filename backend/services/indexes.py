@@ -0,0 +1,161 @@
+# backend/services/indexes.py
+"""
+Declarative index definitions for every collection, built idempotently at
+startup (ENSURE_INDEXES_ON_STARTUP) or from the command line:
+
+    python -m backend.services.indexes            # report missing / unused / undeclared
+    python -m backend.services.indexes --apply    # build missing indexes, then report
+"""
+import asyncio
+import os
+import sys
+from typing import Any, Dict, List, Tuple
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, IndexModel
+from pymongo.errors import OperationFailure
+
+from backend.services.mongo_client import db
+
+ENSURE_INDEXES_ON_STARTUP = os.getenv("ENSURE_INDEXES_ON_STARTUP", "1").lower() in ("1", "true", "yes")
+
+# collection name -> list of (keys, options)
+INDEX_SPECS: Dict[str, List[Tuple[List[Tuple[str, Any]], Dict[str, Any]]]] = {
+    "prediction_reports": [
+        # canonical fields (see prediction_schema.py)
+        ([("ts", DESCENDING)], {}),
+        ([("location", ASCENDING), ("ts", DESCENDING)], {}),
+        ([("disease", ASCENDING), ("ts", DESCENDING)], {}),
+        ([("district", ASCENDING), ("ts", DESCENDING)], {}),
+        ([("location_id", ASCENDING), ("ts", DESCENDING)], {}),
+        ([("district_id", ASCENDING), ("ts", DESCENDING)], {}),
+        ([("geo", GEOSPHERE), ("ts", DESCENDING)], {}),
+        ([("geo_cell", ASCENDING), ("ts", DESCENDING)], {}),
+        # one prediction per symptom doc (merger upserts on it); /predict docs have no symptom_id
+        ([("symptom_id", ASCENDING)], {"unique": True, "partialFilterExpression": {"symptom_id": {"$type": "string"}}}),
+    ],
+    "daily_disease_counts": [
+        ([("day", ASCENDING), ("location_id", ASCENDING), ("district_id", ASCENDING), ("disease", ASCENDING)], {"unique": True}),
+        ([("district_id", ASCENDING), ("day", DESCENDING)], {}),
+        ([("district_id", ASCENDING), ("location_id", ASCENDING), ("day", DESCENDING)], {}),
+    ],
+    "symptoms_reports": [
+        ([("processed_by_model", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("location_id", ASCENDING), ("processed_by_model", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("scoring_state", ASCENDING)], {"partialFilterExpression": {"scoring_state": "dead_letter"}}),
+        ([("geo", GEOSPHERE)], {}),
+    ],
+    "water_reports": [
+        ([("location", ASCENDING), ("created_at", DESCENDING)], {}),
+        # serves the latest-sample lookup sort exactly
+        ([("location_id", ASCENDING), ("meta.submitted_at", DESCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("district_id", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("district", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("geo", GEOSPHERE)], {}),
+    ],
+    "email_otps": [
+        ([("email", ASCENDING), ("created_at", DESCENDING)], {}),
+    ],
+    "users": [
+        ([("email", ASCENDING)], {"unique": True}),
+        ([("location_id", ASCENDING)], {}),
+        ([("district_id", ASCENDING)], {}),
+    ],
+    "alert_recipients": [
+        # one region key equality, streamed in user _id order (alert_dispatch.py)
+        ([("region_keys", ASCENDING), ("_id", ASCENDING)], {}),
+    ],
+    "outbound_messages": [
+        ([("idempotency_key", ASCENDING)], {"unique": True}),
+        # claim order: due messages by priority, then age
+        ([("state", ASCENDING), ("priority", ASCENDING), ("next_attempt_at", ASCENDING)], {}),
+        ([("state", ASCENDING), ("lease_until", ASCENDING)], {}),
+        ([("alert_id", ASCENDING), ("state", ASCENDING)], {"sparse": True}),
+    ],
+    "water_alerts": [
+        ([("created_at", DESCENDING)], {}),
+        ([("status", ASCENDING), ("created_at", ASCENDING)], {}),
+    ],
+}
+
+
+def _key_tuple(keys) -> Tuple:
+    return tuple((k, v) for k, v in keys)
+
+
+def _models(specs) -> List[IndexModel]:
+    return [IndexModel(keys, **opts) for keys, opts in specs]
+
+
+async def ensure_indexes(database=db) -> Dict[str, Any]:
+    """
+    Build every declared index. Already-existing identical indexes are a no-op;
+    conflicts (same keys, different options) are reported, not fatal.
+    """
+    result: Dict[str, Any] = {}
+    for coll_name, specs in INDEX_SPECS.items():
+        col = database[coll_name]
+        try:
+            names = await col.create_indexes(_models(specs))
+            result[coll_name] = {"ok": names}
+        except OperationFailure:
+            # build one by one so a single conflict doesn't block the rest
+            ok, errors = [], []
+            for model in _models(specs):
+                try:
+                    ok.extend(await col.create_indexes([model]))
+                except OperationFailure as e:
+                    errors.append({"keys": model.document["key"], "error": str(e)})
+            result[coll_name] = {"ok": ok, "errors": errors}
+            for err in errors:
+                print(f"[INDEXES] {coll_name} {dict(err['keys'])}: {err['error']}")
+    return result
+
+
+async def index_report(database=db) -> Dict[str, Any]:
+    """
+    Per collection: declared indexes that are missing, existing indexes that
+    are not declared, and existing indexes with zero recorded accesses
+    (since the last mongod restart, per $indexStats).
+    """
+    report: Dict[str, Any] = {}
+    for coll_name, specs in INDEX_SPECS.items():
+        col = database[coll_name]
+        info = await col.index_information()
+        existing = {_key_tuple(v["key"]): name for name, v in info.items()}
+        declared = {_key_tuple(keys) for keys, _ in specs}
+
+        usage: Dict[str, int] = {}
+        try:
+            async for s in col.aggregate([{"$indexStats": {}}]):
+                usage[s["name"]] = int(s.get("accesses", {}).get("ops", 0))
+        except OperationFailure:
+            pass  # $indexStats may be forbidden for the app user
+
+        report[coll_name] = {
+            "missing": [dict(k) for k in declared if k not in existing],
+            "undeclared": [name for k, name in existing.items() if k not in declared and name != "_id_"],
+            "unused": [name for name, ops in usage.items() if ops == 0 and name != "_id_"],
+        }
+    return report
+
+
+async def _main(argv: List[str]) -> int:
+    if "--apply" in argv:
+        for coll_name, res in (await ensure_indexes()).items():
+            print(f"{coll_name}: built/verified {len(res['ok'])}, errors {len(res.get('errors', []))}")
+
+    problems = 0
+    for coll_name, r in (await index_report()).items():
+        print(f"\n== {coll_name}")
+        for k in r["missing"]:
+            print("  MISSING   ", k)
+            problems += 1
+        for name in r["undeclared"]:
+            print("  UNDECLARED", name)
+        for name in r["unused"]:
+            print("  UNUSED    ", name)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
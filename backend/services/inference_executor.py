@@ -0,0 +1,96 @@
+# backend/services/inference_executor.py
+"""
+Configurable executor for CPU-bound scoring.
+
+INFERENCE_MODE:
+  - inline:  score on the event loop (tests / tiny deployments)
+  - thread:  dedicated thread pool (default)
+  - process: process pool; each worker loads the model once at start, so one
+             Uvicorn worker can use several cores without GIL contention
+
+The micro-batcher (batcher.py) keeps at most `workers` batches in flight
+here and rejects callers with InferenceSaturated once PREDICT_QUEUE_MAX_ROWS
+requests are waiting; app.py turns that into 503 + Retry-After.
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "thread").lower()
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", str(min(4, os.cpu_count() or 1))))
+INFERENCE_RETRY_AFTER_SECONDS = int(os.getenv("INFERENCE_RETRY_AFTER_SECONDS", "2"))
+
+VALID_MODES = ("inline", "thread", "process")
+
+
+class InferenceSaturated(Exception):
+    """Raised when inference has no room for more work."""
+
+    def __init__(self, retry_after: int = INFERENCE_RETRY_AFTER_SECONDS):
+        super().__init__("Inference capacity exhausted, retry later")
+        self.retry_after = retry_after
+
+
+def _init_worker():
+    # importing the predictor loads the model once for the life of the worker process;
+    # workers have no event loop, so they pick up new model versions inline
+    import backend.services.predictor as predictor
+    predictor.AUTO_REFRESH_MODEL = True
+
+
+class InferenceExecutor:
+    def __init__(self, mode: str = INFERENCE_MODE, workers: int = INFERENCE_WORKERS):
+        if mode not in VALID_MODES:
+            print(f"InferenceExecutor: unknown INFERENCE_MODE={mode!r}, using 'thread'")
+            mode = "thread"
+        self.mode = mode
+        self.workers = 1 if mode == "inline" else max(1, workers)
+        self._pool: Optional[Executor] = None
+        self._pending = 0
+        self.finished = 0
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.mode == "process":
+                # spawn: never fork a process that owns an event loop and Mongo sockets
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        return self._pool
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """
+        Run fn(*args) according to the configured mode. `fn` must be a
+        module-level function when mode == "process" (it is pickled).
+        """
+        self._pending += 1
+        try:
+            if self.mode == "inline":
+                return fn(*args)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_pool(), fn, *args)
+        finally:
+            self._pending -= 1
+            self.finished += 1
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "pending": self._pending,
+            "finished": self.finished,
+        }
+
+
+inference_executor = InferenceExecutor()
@@ -0,0 +1,336 @@
+# backend/services/locations.py
+"""
+Canonical location registry (district -> block -> village, with aliases).
+
+Free-text locations are resolved at ingest time to stable ids such as
+"assam/kamrup-metro/chandmari", so reports, users and predictions are joined
+and filtered on indexed `location_id` / `district_id` equality instead of
+string equality or $regex.
+
+Resolution (in memory): exact alias match on the normalized name, else
+trigram (Dice) similarity >= LOCATION_MATCH_MIN_SCORE, preferring the most
+specific kind and candidates inside the hinted / mentioned district.
+Unknown names get a deterministic "unregistered:<slug>" id whether or not a
+district was given (the district, when known, goes to district_id), so
+identical spellings still join.
+
+Registry entries live in the `locations` collection (seeded with the
+built-in districts on first load). Import more with:
+
+    python -m backend.services.locations --import locations.json
+    python -m backend.services.locations --backfill [--all]
+
+An import is followed by a backfill, which also re-resolves docs still
+holding unregistered:* ids (the name may be registered now). --all
+re-resolves every doc, for when existing entries or aliases changed.
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+import unicodedata
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from backend.services.mongo_client import locations_col, symptom_col, users_col, water_col
+
+LOCATION_MATCH_MIN_SCORE = float(os.getenv("LOCATION_MATCH_MIN_SCORE", "0.6"))
+LOCATION_RESOLVE_CACHE_SIZE = int(os.getenv("LOCATION_RESOLVE_CACHE_SIZE", "20000"))
+LOCATION_BACKFILL_BATCH = int(os.getenv("LOCATION_BACKFILL_BATCH", "500"))
+
+UNREGISTERED_PREFIX = "unregistered:"
+KIND_RANK = {"village": 3, "block": 2, "district": 1, "state": 0}
+
+# words that qualify a name without identifying it
+_NOISE_WORDS = {"district", "dist", "village", "vill", "block", "town", "city"}
+
+_BUILTIN: List[Dict[str, Any]] = [
+    {"_id": "assam", "name": "Assam", "kind": "state"},
+    {"_id": "assam/dibrugarh", "name": "Dibrugarh", "kind": "district", "parent_id": "assam"},
+    {"_id": "assam/jorhat", "name": "Jorhat", "kind": "district", "parent_id": "assam"},
+    {"_id": "assam/kamrup-metro", "name": "Kamrup Metro", "kind": "district", "parent_id": "assam",
+     "aliases": ["Kamrup Metropolitan", "Guwahati"]},
+    {"_id": "assam/kamrup", "name": "Kamrup", "kind": "district", "parent_id": "assam", "aliases": ["Kamrup Rural"]},
+    {"_id": "assam/sonitpur", "name": "Sonitpur", "kind": "district", "parent_id": "assam", "aliases": ["Tezpur"]},
+    {"_id": "assam/cachar", "name": "Cachar", "kind": "district", "parent_id": "assam", "aliases": ["Silchar"]},
+    {"_id": "assam/kamrup-metro/chandmari", "name": "Chandmari", "kind": "village", "parent_id": "assam/kamrup-metro"},
+]
+
+
+def normalize_name(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode().lower()
+    words = [w for w in re.split(r"[^a-z0-9]+", text) if w and w not in _NOISE_WORDS]
+    return " ".join(words)
+
+
+def slugify(text: str) -> str:
+    return normalize_name(text).replace(" ", "-")
+
+
+def _trigrams(norm: str) -> set:
+    padded = f"  {norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class LocationMatch(NamedTuple):
+    id: str
+    name: str
+    kind: Optional[str]
+    district_id: Optional[str]
+    score: float
+
+    @property
+    def registered(self) -> bool:
+        return not self.id.startswith(UNREGISTERED_PREFIX)
+
+
+class LocationRegistry:
+    def __init__(self, entries: Iterable[Dict[str, Any]] = _BUILTIN):
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._aliases: Dict[str, List[str]] = defaultdict(list)   # normalized alias -> ids
+        self._grams: Dict[str, set] = defaultdict(set)            # trigram -> normalized aliases
+        self._alias_grams: Dict[str, set] = {}
+        self._cache: "OrderedDict[Tuple[str, Optional[str]], Optional[LocationMatch]]" = OrderedDict()
+        self.loaded = False
+        for e in entries:
+            self.add(e)
+
+    # ---------- building ----------
+    def add(self, entry: Dict[str, Any]):
+        lid = entry["_id"]
+        self._entries[lid] = entry
+        for alias in [entry["name"], *(entry.get("aliases") or [])]:
+            norm = normalize_name(alias)
+            if not norm:
+                continue
+            if lid not in self._aliases[norm]:
+                self._aliases[norm].append(lid)
+            if norm not in self._alias_grams:
+                grams = _trigrams(norm)
+                self._alias_grams[norm] = grams
+                for g in grams:
+                    self._grams[g].add(norm)
+        self._cache.clear()
+
+    def get(self, lid: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(lid)
+
+    def district_of(self, lid: str) -> Optional[str]:
+        seen = 0
+        entry = self._entries.get(lid)
+        while entry is not None and seen < 8:
+            if entry.get("kind") == "district":
+                return entry["_id"]
+            entry = self._entries.get(entry.get("parent_id"))
+            seen += 1
+        return None
+
+    def ancestors(self, lid: str) -> List[str]:
+        """
+        Registered parent chain of an id, nearest first (excluding itself).
+        """
+        out, seen = [], 0
+        entry = self._entries.get(lid)
+        while entry is not None and entry.get("parent_id") and seen < 8:
+            out.append(entry["parent_id"])
+            entry = self._entries.get(entry["parent_id"])
+            seen += 1
+        return out
+
+    def _within(self, lid: str, ancestor: str) -> bool:
+        entry, seen = self._entries.get(lid), 0
+        while entry is not None and seen < 8:
+            if entry["_id"] == ancestor:
+                return True
+            entry = self._entries.get(entry.get("parent_id"))
+            seen += 1
+        return False
+
+    # ---------- lookup ----------
+    def _candidates(self, norm: str) -> List[Tuple[str, float]]:
+        if norm in self._aliases:
+            return [(lid, 1.0) for lid in self._aliases[norm]]
+        grams = _trigrams(norm)
+        shared: Dict[str, int] = defaultdict(int)
+        for g in grams:
+            for alias in self._grams.get(g, ()):
+                shared[alias] += 1
+        out = []
+        for alias, n in shared.items():
+            score = 2.0 * n / (len(grams) + len(self._alias_grams[alias]))
+            if score >= LOCATION_MATCH_MIN_SCORE:
+                out.extend((lid, score) for lid in self._aliases[alias])
+        return out
+
+    def _best(self, cands: List[Tuple[str, float]], within: Optional[str]) -> Optional[Tuple[str, float]]:
+        if not cands:
+            return None
+
+        def rank(c):
+            lid, score = c
+            inside = 1 if within and self._within(lid, within) else 0
+            return (round(score, 3), inside, KIND_RANK.get(self._entries[lid].get("kind"), 0))
+
+        return max(cands, key=rank)
+
+    def resolve(self, text: Optional[str], district: Optional[str] = None) -> Optional[LocationMatch]:
+        """
+        Resolve free text ("Chandmary, Kamrup Metro", "Jorhat district", ...)
+        to a registry entry, or to an "unregistered:<slug>" id. `district`
+        is an optional hint. None for empty input.
+        """
+        if not isinstance(text, str) or not normalize_name(text):
+            return None
+        key = (text, district)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        match = self._resolve(text, district)
+        self._cache[key] = match
+        while len(self._cache) > LOCATION_RESOLVE_CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return match
+
+    def _match(self, lid: str, score: float) -> LocationMatch:
+        entry = self._entries[lid]
+        return LocationMatch(lid, entry["name"], entry.get("kind"), self.district_of(lid), round(score, 3))
+
+    def _resolve(self, text: str, district: Optional[str]) -> LocationMatch:
+        parts = [normalize_name(p) for p in re.split(r"[,/|;()]+", text)]
+        parts = [p for p in parts if p]
+
+        # district context: the hint, else the first part that names a district
+        within, within_score, context_part = None, 0.0, None
+        for hint in ([normalize_name(district)] if isinstance(district, str) else []) + parts:
+            best = self._best([c for c in self._candidates(hint) if self._entries[c[0]].get("kind") == "district"], None)
+            if best:
+                (within, within_score), context_part = best, hint
+                break
+
+        # the place itself: parts other than the district and its ancestors ("..., Assam")
+        cands, place_parts = [], []
+        for p in parts:
+            if p == context_part:
+                continue
+            found = self._candidates(p)
+            if within and found and all(self._within(within, lid) for lid, _ in found):
+                continue
+            place_parts.append(p)
+            cands.extend(found)
+
+        best = self._best(cands, within)
+        if best and (within is None or self._within(best[0], within) or best[1] == 1.0):
+            return self._match(*best)
+        if not place_parts and within:
+            return self._match(within, within_score)
+
+        slug = (place_parts[0] if place_parts else parts[0] if parts else normalize_name(text)).replace(" ", "-")
+        return LocationMatch(UNREGISTERED_PREFIX + slug, text.strip(), None, within, 0.0)
+
+    def fields(self, text: Optional[str], district: Optional[str] = None) -> Dict[str, Any]:
+        """
+        {"location_id", "district_id"} to store next to a free-text location.
+        """
+        m = self.resolve(text, district)
+        if m is None:
+            return {}
+        return {"location_id": m.id, "district_id": m.district_id}
+
+    # ---------- persistence ----------
+    async def load(self) -> int:
+        """
+        Load registry entries from Mongo, seeding the built-ins into an empty collection.
+        """
+        if await locations_col.estimated_document_count() == 0:
+            await locations_col.bulk_write([UpdateOne({"_id": e["_id"]}, {"$setOnInsert": e}, upsert=True) for e in _BUILTIN])
+        n = 0
+        async for e in locations_col.find({}):
+            self.add(e)
+            n += 1
+        self.loaded = True
+        print(f"LocationRegistry: {len(self._entries)} entries ({n} from Mongo)")
+        return n
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "aliases": len(self._aliases), "cached": len(self._cache), "loaded": self.loaded}
+
+
+location_registry = LocationRegistry()
+
+
+async def import_locations(path: str) -> int:
+    """
+    Upsert entries from a JSON list of {"name", "kind", "parent_id"?, "aliases"?, "_id"?}.
+    Ids default to the parent id + "/" + slug of the name.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    ops = []
+    for item in items:
+        lid = item.get("_id") or "/".join(filter(None, [item.get("parent_id"), slugify(item["name"])]))
+        doc = {**item, "_id": lid}
+        ops.append(UpdateOne({"_id": lid}, {"$set": doc}, upsert=True))
+    if ops:
+        await locations_col.bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+# collection -> (free-text field, district hint field)
+_BACKFILL_TARGETS = [(symptom_col, "location", "district"), (water_col, "location", "district"), (users_col, "location", "district")]
+
+
+async def backfill_location_ids(batch_size: int = LOCATION_BACKFILL_BATCH, everything: bool = False) -> Dict[str, int]:
+    """
+    Add location_id/district_id to report and user docs that predate the
+    registry, and re-resolve docs holding an unregistered:* id (run after an
+    import; also rewrites the older district-qualified unregistered ids), or
+    every doc with `everything`. Walks _id in batches, one unordered bulk
+    write per batch.
+    """
+    done: Dict[str, int] = {}
+    projection = {"location_id": 1, "district_id": 1, "village": 1}
+    for col, text_field, hint_field in _BACKFILL_TARGETS:
+        n, last_id = 0, None
+        while True:
+            query: Dict[str, Any] = {} if everything else {"$or": [
+                {"location_id": {"$exists": False}},
+                {"location_id": {"$regex": "^" + re.escape(UNREGISTERED_PREFIX)}},
+            ]}
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            docs = await col.find(query, {text_field: 1, hint_field: 1, **projection}).sort("_id", 1).limit(batch_size).to_list(None)
+            if not docs:
+                break
+            ops = []
+            for d in docs:
+                fields = location_registry.fields(d.get(text_field) or d.get("village"), d.get(hint_field))
+                if fields and any(d.get(k) != v for k, v in fields.items()):
+                    ops.append(UpdateOne({"_id": d["_id"]}, {"$set": fields}))
+            if ops:
+                res = await col.bulk_write(ops, ordered=False)
+                n += res.modified_count
+            last_id = docs[-1]["_id"]
+        done[col.name] = n
+    return done
+
+
+async def _main(argv) -> int:
+    if "--import" in argv:
+        n = await import_locations(argv[argv.index("--import") + 1])
+        print(f"upserted {n} locations")
+    elif "--backfill" not in argv:
+        print("usage: python -m backend.services.locations [--import FILE] [--backfill [--all]]")
+        return 2
+    # newly imported names turn existing unregistered ids into registered ones
+    if "--import" in argv or "--backfill" in argv:
+        await location_registry.load()
+        print(await backfill_location_ids(everything="--all" in argv))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
@@ -3,16 +3,24 @@ from datetime import datetime
 from typing import Dict, Any, Optional
 
 # Correct absolute import to the mongo client using Motor
-from backend.services.mongo_client import symptom_col, water_col, prediction_col
-from backend.services.predictor import predict_disease  # synchronous function - call in executor from async callers if needed
+from backend.services.mongo_client import prediction_col
+from backend.services.batcher import predict_disease_async
+from backend.services.inference_executor import InferenceSaturated
+from backend.services.prediction_store import after_insert, build_prediction_doc
+from backend.services.work_queue import complete_symptom, fail_symptom, release_symptom
 
 async def merge_and_predict_and_store(sym_doc: Dict[str, Any], water_doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """
     Merge symptom and water docs, run prediction (via predictor.predict_disease),
     store prediction into prediction_col, and mark symptom doc as processed.
 
-    This function is async because it performs Motor DB ops. If predictor.predict_disease
-    is CPU-bound sync, callers should run it in a threadpool (you already do that in app.py).
+    `sym_doc` must be leased by this worker (work_queue.claim_symptom); the
+    outcome is recorded on the lease (done / retry with backoff / dead letter).
+    The prediction insert is keyed on symptom_id, so a retry after a crash
+    between insert and completion never stores a second prediction.
+
+    This function is async because it performs Motor DB ops. Scoring goes through the
+    micro-batcher, so concurrent merges share one vectorized predict off the event loop.
     """
     try:
         # Build merged input (choose fields your model expects)
@@ -35,26 +43,36 @@ async def merge_and_predict_and_store(sym_doc: Dict[str, Any], water_doc: Dict[s
             "merged_at": datetime.utcnow()
         }
 
-        # NOTE: predict_disease is synchronous and should be called from a threadpool in callers.
-        # Here we assume callers already run it in executor (as in your app.py). If not, do it here.
-        prediction_result = predict_disease(merged_input.get("water", {}), merged_input.get("sym_doc", {}))
-
-        pred_doc = {
-            "location": merged_input["location"],
-            "timestamp": datetime.utcnow(),
-            "input": merged_input,
-            "prediction": prediction_result,
-            "symptom_id": str(sym_doc.get("_id")),
-            "water_id": str(water_doc.get("_id")) if water_doc.get("_id") else None,
-        }
+        prediction_result = await predict_disease_async(merged_input.get("water", {}), merged_input.get("sym_doc", {}))
 
-        await prediction_col.insert_one(pred_doc)
+        pred_doc = build_prediction_doc(
+            prediction_result,
+            location=merged_input["location"],
+            input_doc=merged_input,
+            symptom_id=str(sym_doc.get("_id")),
+            water_id=str(water_doc.get("_id")) if water_doc.get("_id") else None,
+        )
 
-        # mark symptom processed
-        await symptom_col.update_one({"_id": sym_doc.get("_id")}, {"$set": {"processed_by_model": True, "processed_at": datetime.utcnow()}})
+        res = await prediction_col.update_one(
+            {"symptom_id": pred_doc["symptom_id"]},
+            {"$setOnInsert": pred_doc},
+            upsert=True,
+        )
+        if res.upserted_id is not None:
+            # count it once, only when this call actually stored the prediction
+            await after_insert({**pred_doc, "_id": res.upserted_id})
+
+        # mark symptom processed (only if we still hold its lease)
+        if not await complete_symptom(sym_doc):
+            print("merge_and_predict_and_store: lease lost for symptom", sym_doc.get("_id"))
 
         return prediction_result
+    except InferenceSaturated:
+        # not the document's fault - hand it back without spending an attempt
+        await release_symptom(sym_doc)
+        return None
     except Exception as e:
         # keep error handling simple — in production, log properly
         print("merge_and_predict_and_store error:", e)
+        await fail_symptom(sym_doc, str(e))
         return None
@@ -0,0 +1,304 @@
+# backend/services/model_registry.py
+"""
+Versioned model registry with background warm-up and atomic hot swap.
+
+Two layouts are supported:
+
+  1. MODEL_REGISTRY_DIR/<version>/ directories, each holding
+       disease_prediction_model.joblib  and/or  disease_prediction_trees.npz
+       label_encoder.joblib             (optional)
+       features.json                    (optional feature order)
+     The active version is named in MODEL_REGISTRY_DIR/CURRENT, or else the
+     lexicographically greatest directory.
+
+  2. The legacy single files MODEL_PATH / TREE_MODEL_PATH / LABEL_ENCODER_PATH,
+     versioned by their file signature.
+
+Callers take `model_registry.active` once per batch and use that bundle for the
+whole call, so swapping in a new bundle never disturbs in-flight predictions.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from backend.services.feature_encoder import EXPECTED_FEATURES, FeatureEncoder
+from backend.services.tree_scorer import ObliviousTreeScorer
+from backend.services.prediction_cache import model_file_signature
+
+MODEL_PATH = os.getenv("MODEL_PATH", "backend/models/disease_prediction_model.joblib")
+# Optional flat tree arrays from nirogya-ml/export_tree_model.py. When set and
+# compatible with the feature layout, the joblib model (and its runtime) is not loaded.
+TREE_MODEL_PATH = os.getenv("TREE_MODEL_PATH", "")
+# Label encoder saved by nirogya-ml/train_model.py; used to decode integer classes
+LABEL_ENCODER_PATH = os.getenv("LABEL_ENCODER_PATH", "nirogya-ml/models/label_encoder.joblib")
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "")
+# How often the registry looks for a new artifact/version
+MODEL_STAT_INTERVAL_SECONDS = float(os.getenv("MODEL_STAT_INTERVAL_SECONDS", "5"))
+
+MODEL_FILE = "disease_prediction_model.joblib"
+TREES_FILE = "disease_prediction_trees.npz"
+LABEL_ENCODER_FILE = "label_encoder.joblib"
+FEATURES_FILE = "features.json"
+
+# rows pushed through every new bundle before it is made active
+_WARMUP_PAIRS = [
+    ({}, {}),
+    (
+        {"pH": 7.0, "turbidity": 5.0, "tds": 300, "chlorine": 0.2, "fluoride": 0.5,
+         "nitrate": 10, "coliform": 20, "temperature": 25, "primary_water_source": "Tube well"},
+        {"symptoms": ["fever", "diarrhea"], "district": "Jorhat"},
+    ),
+]
+
+
+def _load_label_encoder(path: Optional[str]):
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        obj = joblib.load(Path(path))
+    except Exception as e:
+        print("ModelRegistry: failed to load label encoder:", e)
+        return None
+    # train_model.py saves {"label_encoder": le, "feature_cols": ..., ...}
+    return obj.get("label_encoder") if isinstance(obj, dict) else obj
+
+
+def _decode_classes(model, label_encoder) -> np.ndarray:
+    """
+    Human-readable label for each model class, in predict_proba column order.
+    """
+    if getattr(model, "class_labels", None) is not None:
+        return np.asarray(model.class_labels).astype(str)
+    classes = np.asarray(getattr(model, "classes_", []))
+    if label_encoder is not None and classes.dtype.kind in "iu":
+        try:
+            return np.asarray(label_encoder.inverse_transform(classes)).astype(str)
+        except Exception as e:
+            print("ModelRegistry: label encoder doesn't match model classes:", e)
+    return classes.astype(str)
+
+
+class ModelBundle:
+    """
+    One loaded model version: model, decoded class labels, feature order and
+    the encoder compiled for that order.
+    """
+
+    def __init__(self, version: str, model, class_labels: np.ndarray, feature_names: List[str], source: str):
+        self.version = version
+        self.model = model
+        self.class_labels = class_labels
+        self.feature_names = list(feature_names)
+        self.encoder = FeatureEncoder(self.feature_names)
+        self.source = source
+        self.loaded_at = datetime.utcnow()
+        self._wants_frame = hasattr(model, "feature_names_in_")
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """
+        Class probabilities in one vectorized call; columns follow class_labels.
+        Pipelines fitted on a DataFrame get a zero-copy frame view so sklearn
+        doesn't warn about missing feature names. Models without predict_proba
+        get one-hot rows.
+        """
+        data = pd.DataFrame(X, columns=self.feature_names, copy=False) if self._wants_frame else X
+        if hasattr(self.model, "predict_proba"):
+            return np.asarray(self.model.predict_proba(data), dtype=np.float64)
+
+        preds = np.asarray(self.model.predict(data)).reshape(-1)
+        classes = list(np.asarray(getattr(self.model, "classes_", [])))
+        proba = np.zeros((len(preds), len(classes)), dtype=np.float64)
+        for i, p in enumerate(preds):
+            proba[i, classes.index(p)] = 1.0
+        return proba
+
+    def warm(self):
+        """
+        Score a small fixed batch; raises if the bundle can't produce sane output.
+        """
+        proba = self.predict_proba(self.encoder.encode_batch(_WARMUP_PAIRS))
+        if proba.shape != (len(_WARMUP_PAIRS), len(self.class_labels)) or not np.all(np.isfinite(proba)):
+            raise ValueError(f"warm-up produced unexpected output shape {proba.shape}")
+
+    def info(self) -> dict:
+        return {
+            "version": self.version,
+            "source": self.source,
+            "classes": self.class_labels.tolist(),
+            "n_features": len(self.feature_names),
+            "loaded_at": self.loaded_at,
+        }
+
+
+def _feature_order(model, features_path: Optional[str]) -> List[str]:
+    if features_path and os.path.exists(features_path):
+        with open(features_path) as f:
+            return list(json.load(f))
+    names = getattr(model, "feature_names_in_", None)
+    if names is not None:
+        return [str(n) for n in names]
+    return list(EXPECTED_FEATURES)
+
+
+def _load_model(model_path: Optional[str], trees_path: Optional[str], features: Optional[List[str]]):
+    """
+    Returns (model, source_path). Flat tree arrays win when they bind to the layout.
+    """
+    if trees_path and os.path.exists(trees_path):
+        try:
+            return ObliviousTreeScorer.load(trees_path).bind(features or EXPECTED_FEATURES), trees_path
+        except Exception as e:
+            print("ModelRegistry: tree arrays unusable, falling back to joblib model:", e)
+    if not model_path or not os.path.exists(model_path):
+        raise FileNotFoundError(f"No model artifact at {model_path}")
+    return joblib.load(Path(model_path)), model_path
+
+
+class ModelRegistry:
+    def __init__(self, registry_dir: str = MODEL_REGISTRY_DIR, model_path: str = MODEL_PATH,
+                 trees_path: str = TREE_MODEL_PATH, label_encoder_path: str = LABEL_ENCODER_PATH,
+                 check_interval: float = MODEL_STAT_INTERVAL_SECONDS):
+        self.registry_dir = registry_dir
+        self.model_path = model_path
+        self.trees_path = trees_path
+        self.label_encoder_path = label_encoder_path
+        self.check_interval = check_interval
+
+        self._active: Optional[ModelBundle] = None
+        self._reload_lock = threading.Lock()
+        self._last_check = 0.0
+        self.last_error: Optional[str] = None
+
+    # ---------- discovery ----------
+    def _candidate(self):
+        """
+        Returns (version, model_path, trees_path, label_encoder_path, features_path) for
+        the artifact that should be active, or None if nothing is deployed.
+        """
+        if self.registry_dir and os.path.isdir(self.registry_dir):
+            current = os.path.join(self.registry_dir, "CURRENT")
+            version = None
+            if os.path.exists(current):
+                with open(current) as f:
+                    version = f.read().strip() or None
+            if version is None:
+                versions = sorted(
+                    d for d in os.listdir(self.registry_dir)
+                    if os.path.isdir(os.path.join(self.registry_dir, d))
+                )
+                version = versions[-1] if versions else None
+            if version is None:
+                return None
+            vdir = os.path.join(self.registry_dir, version)
+            return (
+                version,
+                os.path.join(vdir, MODEL_FILE),
+                os.path.join(vdir, TREES_FILE),
+                os.path.join(vdir, LABEL_ENCODER_FILE),
+                os.path.join(vdir, FEATURES_FILE),
+            )
+
+        trees_sig = model_file_signature(self.trees_path) if self.trees_path else None
+        version = trees_sig or model_file_signature(self.model_path)
+        if version is None:
+            return None
+        return version, self.model_path, self.trees_path, self.label_encoder_path, None
+
+    # ---------- loading ----------
+    def load_bundle(self, candidate) -> ModelBundle:
+        version, model_path, trees_path, le_path, features_path = candidate
+        features = None
+        if features_path and os.path.exists(features_path):
+            features = _feature_order(None, features_path)
+        model, source = _load_model(model_path, trees_path, features)
+        feature_names = features or _feature_order(model, None)
+        if isinstance(model, ObliviousTreeScorer):
+            feature_names = model.feature_names
+        bundle = ModelBundle(
+            version=version,
+            model=model,
+            class_labels=_decode_classes(model, _load_label_encoder(le_path)),
+            feature_names=feature_names,
+            source=source,
+        )
+        bundle.warm()
+        return bundle
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Load, warm and atomically activate the deployed version if it differs
+        from the active one. The previous bundle stays active on any failure.
+        Returns True if a new bundle was activated.
+        """
+        with self._reload_lock:
+            self._last_check = time.monotonic()
+            candidate = self._candidate()
+            if candidate is None:
+                if self._active is None:
+                    self.last_error = "no model artifact found"
+                return False
+            if not force and self._active is not None and self._active.version == candidate[0]:
+                return False
+            try:
+                bundle = self.load_bundle(candidate)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"ModelRegistry: failed to load version {candidate[0]}:", e)
+                return False
+
+            previous = self._active.version if self._active else None
+            self._active = bundle  # single reference swap; in-flight callers keep their bundle
+            self.last_error = None
+            print(f"ModelRegistry: activated model version {bundle.version} (previous: {previous})")
+            return True
+
+    def refresh_if_stale(self):
+        """
+        Synchronous periodic check, for processes without the async watcher
+        (e.g. process-pool inference workers).
+        """
+        if time.monotonic() - self._last_check >= self.check_interval:
+            self.reload()
+
+    async def watch(self):
+        """
+        Background task: polls for new versions and loads/warms them off the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await loop.run_in_executor(None, self.reload)
+            except Exception as e:
+                print("ModelRegistry watch error:", e)
+
+    # ---------- access ----------
+    @property
+    def active(self) -> Optional[ModelBundle]:
+        return self._active
+
+    @property
+    def ready(self) -> bool:
+        return self._active is not None
+
+    def info(self) -> dict:
+        return {
+            "ready": self.ready,
+            "active": self._active.info() if self._active else None,
+            "registry_dir": self.registry_dir or None,
+            "last_error": self.last_error,
+        }
+
+
+model_registry = ModelRegistry()
+# initial load is synchronous so the first request already has a model
+model_registry.reload()
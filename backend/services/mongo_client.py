@@ -25,9 +25,25 @@ users_col = db["users"]
 otp_col = db["email_otps"]
 alerts_col = db["water_alerts"]
 
+# durable outbound email queue (one doc per recipient) and shared rendered content
+outbound_col = db["outbound_messages"]
+outbound_contents_col = db["outbound_contents"]
+
 # ASHA workers collection
 asha_workers_col = db["asha_workers"]
 
+# canonical location registry (district -> block -> village)
+locations_col = db["locations"]
+
+# user -> canonical region keys (own location and every ancestor), for alert targeting
+recipients_col = db["alert_recipients"]
+
+# materialized (day, location, disease) case counts
+daily_counts_col = db["daily_disease_counts"]
+
+# background pipeline bookkeeping (leases, change-stream resume tokens)
+pipeline_state_col = db["pipeline_state"]
+
 
 def get_db():
     return db
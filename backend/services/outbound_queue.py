@@ -0,0 +1,418 @@
+# backend/services/outbound_queue.py
+"""
+Durable outbound email queue (`outbound_messages`) and its consumer.
+
+The API only enqueues; a separate consumer process talks to the provider:
+
+    python -m backend.services.outbound_queue            # run the consumer
+    python -m backend.services.outbound_queue --stats    # counts per state
+
+One document per recipient:
+  idempotency_key   unique; enqueueing the same key twice is a no-op
+  kind              otp | water_alert
+  priority          0 (OTP) is claimed before 10 (bulk alerts)
+  to, subject/html/from  or  content_id (shared rendered content in
+                    outbound_contents, e.g. one per alert)
+  alert_id          set for alert emails; the consumer keeps the alert's
+                    emails_sent / emails_failed counters up to date
+  state             queued | sending | sent | dead
+  attempts, next_attempt_at, last_error, provider_id, sent_at
+  lease_owner, lease_until, claim, requeue_batch
+
+The consumer claims up to OUTBOUND_BATCH_SIZE due messages at a time (highest
+priority first), sends them in one provider batch request (rate limited by a
+token bucket), and records per-message results in one bulk write. A batch the
+provider rejects outright (one bad address fails a whole Resend batch) is
+split in halves and resent, so only the offending messages fail. Failures
+retry with exponential backoff; after OUTBOUND_MAX_ATTEMPTS a message is
+dead. A consumer that dies mid-batch leaves its lease to expire and the
+messages are claimed again (delivery is at-least-once).
+
+OUTBOUND_PROVIDER=mock uses MockProvider (no network; configurable latency and
+failure rate) instead of Resend.
+"""
+import asyncio
+import os
+import random
+import sys
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from backend.services.email_service import EmailRejected, send_email_batch
+from backend.services.mongo_client import alerts_col, outbound_col, outbound_contents_col
+from backend.services.rate_limit import TokenBucket
+from backend.services.work_queue import WORKER_ID
+
+OUTBOUND_PROVIDER = os.getenv("OUTBOUND_PROVIDER", "resend").lower()
+OUTBOUND_BATCH_SIZE = min(100, int(os.getenv("OUTBOUND_BATCH_SIZE", "100")))  # Resend batch limit is 100
+OUTBOUND_CONCURRENCY = int(os.getenv("OUTBOUND_CONCURRENCY", "2"))
+# provider requests per second (a batch is one request; Resend's default limit is 2/s)
+OUTBOUND_RATE_PER_SECOND = float(os.getenv("OUTBOUND_RATE_PER_SECOND", "2"))
+OUTBOUND_RATE_BURST = int(os.getenv("OUTBOUND_RATE_BURST", "2"))
+OUTBOUND_POLL_SECONDS = float(os.getenv("OUTBOUND_POLL_SECONDS", "0.5"))
+OUTBOUND_LEASE_SECONDS = int(os.getenv("OUTBOUND_LEASE_SECONDS", "120"))
+OUTBOUND_MAX_ATTEMPTS = int(os.getenv("OUTBOUND_MAX_ATTEMPTS", "6"))
+OUTBOUND_BACKOFF_BASE_SECONDS = float(os.getenv("OUTBOUND_BACKOFF_BASE_SECONDS", "5"))
+OUTBOUND_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOUND_BACKOFF_MAX_SECONDS", "900"))
+OUTBOUND_MOCK_LATENCY_MS = float(os.getenv("OUTBOUND_MOCK_LATENCY_MS", "80"))
+OUTBOUND_MOCK_FAILURE_RATE = float(os.getenv("OUTBOUND_MOCK_FAILURE_RATE", "0"))
+# run the consumer inside the API process as well (single-process dev setups)
+OUTBOUND_CONSUMER_IN_API = os.getenv("OUTBOUND_CONSUMER_IN_API", "0").lower() in ("1", "true", "yes")
+
+PRIORITY_HIGH = 0
+PRIORITY_BULK = 10
+
+_CONTENT_CACHE_MAX = 256
+_DUPLICATE_KEY = 11000
+
+
+def _backoff_seconds(attempts: int) -> float:
+    # exponential (base * 2^(attempts-1), capped) with jitter in its upper half
+    ceiling = min(OUTBOUND_BACKOFF_MAX_SECONDS, OUTBOUND_BACKOFF_BASE_SECONDS * (2 ** max(0, attempts - 1)))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+# ---------- providers ----------
+class ResendProvider:
+    """
+    One Resend batch request per call; the client is blocking, so it runs in
+    the default thread pool. Raises EmailRejected if the request's content was
+    refused, any other exception if the request itself failed.
+    """
+    name = "resend"
+
+    async def send_batch(self, emails: List[Dict[str, Any]]) -> List[Tuple[Optional[str], Optional[str]]]:
+        ids = await asyncio.to_thread(send_email_batch, emails)
+        ids = list(ids) + [None] * (len(emails) - len(ids))
+        return [(pid, None if pid else "no id in provider response") for pid in ids]
+
+
+class MockProvider:
+    """
+    Offline provider: one `latency` sleep per batch request; each message
+    fails with probability `failure_rate`. Like Resend, a batch holding an
+    address without "@" is rejected as a whole.
+    """
+    name = "mock"
+
+    def __init__(self, latency: float = OUTBOUND_MOCK_LATENCY_MS / 1000.0, failure_rate: float = OUTBOUND_MOCK_FAILURE_RATE):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.sent = 0
+
+    async def send_batch(self, emails: List[Dict[str, Any]]) -> List[Tuple[Optional[str], Optional[str]]]:
+        await asyncio.sleep(self.latency)
+        self.requests += 1
+        bad = [e["to"] for e in emails if "@" not in e["to"]]
+        if bad:
+            raise EmailRejected(f"invalid recipient {bad[0]!r}")
+        out = []
+        for _ in emails:
+            if self.failure_rate and random.random() < self.failure_rate:
+                out.append((None, "mock failure"))
+            else:
+                self.sent += 1
+                out.append((f"mock-{uuid.uuid4().hex[:12]}", None))
+        return out
+
+
+def make_provider(kind: str = OUTBOUND_PROVIDER):
+    return MockProvider() if kind == "mock" else ResendProvider()
+
+
+# ---------- producer side ----------
+async def put_content(content_id: str, subject: str, html: str, sender: str):
+    """
+    Store rendered content shared by many messages (written once).
+    """
+    await outbound_contents_col.update_one(
+        {"_id": content_id},
+        {"$setOnInsert": {"subject": subject, "html": html, "from": sender, "created_at": datetime.utcnow()}},
+        upsert=True,
+    )
+
+
+async def enqueue(messages: List[Dict[str, Any]]) -> int:
+    """
+    Queue messages (each needs idempotency_key, to, and subject/html/from or
+    content_id). Keys already queued are skipped. Returns how many were new.
+    """
+    if not messages:
+        return 0
+    now = datetime.utcnow()
+    docs = [{
+        "priority": PRIORITY_BULK,
+        **m,
+        "state": "queued",
+        "attempts": 0,
+        "next_attempt_at": now,
+        "created_at": now,
+    } for m in messages]
+    try:
+        res = await outbound_col.insert_many(docs, ordered=False)
+        return len(res.inserted_ids)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != _DUPLICATE_KEY for err in errors):
+            raise
+        return e.details.get("nInserted", 0)
+
+
+async def enqueue_email(to_email: str, subject: str, html: str, sender: str, idempotency_key: str,
+                        kind: str, priority: int = PRIORITY_HIGH) -> bool:
+    """
+    Queue a single self-contained email. Returns False if the key was
+    already queued.
+    """
+    return await enqueue([{
+        "idempotency_key": idempotency_key,
+        "kind": kind,
+        "priority": priority,
+        "to": to_email,
+        "subject": subject,
+        "html": html,
+        "from": sender,
+    }]) == 1
+
+
+async def delivery_summary(alert_id) -> Dict[str, int]:
+    out = {"queued": 0, "sending": 0, "sent": 0, "dead": 0}
+    async for r in outbound_col.aggregate([
+        {"$match": {"alert_id": alert_id}},
+        {"$group": {"_id": "$state", "count": {"$sum": 1}}},
+    ]):
+        out[r["_id"]] = r["count"]
+    return out
+
+
+async def queue_stats() -> Dict[str, int]:
+    out = {"queued": 0, "sending": 0, "dead": 0}
+    async for r in outbound_col.aggregate([
+        {"$match": {"state": {"$in": list(out)}}},
+        {"$group": {"_id": "$state", "count": {"$sum": 1}}},
+    ]):
+        out[r["_id"]] = r["count"]
+    return out
+
+
+async def requeue_dead(limit: int = 1000) -> int:
+    """
+    Give dead messages a fresh attempt budget. Alert messages are taken back
+    out of their alert's emails_failed, and an alert already marked sent goes
+    back to sending until they are delivered or dead again.
+    """
+    ids = [d["_id"] async for d in outbound_col.find({"state": "dead"}, {"_id": 1}).limit(limit)]
+    if not ids:
+        return 0
+    batch = uuid.uuid4().hex
+    res = await outbound_col.update_many(
+        {"_id": {"$in": ids}, "state": "dead"},
+        {"$set": {"state": "queued", "attempts": 0, "next_attempt_at": datetime.utcnow(), "requeue_batch": batch}},
+    )
+    # only the messages this call moved (another requeue may have raced us)
+    async for r in outbound_col.aggregate([
+        {"$match": {"requeue_batch": batch, "alert_id": {"$ne": None}}},
+        {"$group": {"_id": "$alert_id", "count": {"$sum": 1}}},
+    ]):
+        reopen = {"$eq": ["$status", "sent"]}
+        await alerts_col.update_one({"_id": r["_id"]}, [{"$set": {
+            "emails_failed": {"$subtract": ["$emails_failed", r["count"]]},
+            "status": {"$cond": [reopen, "sending", "$status"]},
+            "completed_at": {"$cond": [reopen, "$$REMOVE", "$completed_at"]},
+        }}])
+    return res.modified_count
+
+
+async def complete_alerts(alert_ids) -> int:
+    """
+    Mark fully enqueued alerts whose every message is sent or dead as sent.
+    """
+    if not alert_ids:
+        return 0
+    res = await alerts_col.update_many(
+        {
+            "_id": {"$in": list(alert_ids)},
+            "status": "sending",
+            "dispatch.enqueued": True,
+            "$expr": {"$gte": [{"$add": ["$emails_sent", "$emails_failed"]}, "$recipients"]},
+        },
+        {"$set": {"status": "sent", "completed_at": datetime.utcnow()}},
+    )
+    return res.modified_count
+
+
+# ---------- consumer ----------
+class OutboundConsumer:
+    def __init__(self, provider=None, batch_size: int = OUTBOUND_BATCH_SIZE, concurrency: int = OUTBOUND_CONCURRENCY,
+                 rate: float = OUTBOUND_RATE_PER_SECOND, burst: int = OUTBOUND_RATE_BURST):
+        self.provider = provider or make_provider()
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.bucket = TokenBucket(rate, burst)
+        self._contents: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.sent = 0
+        self.failed = 0
+
+    async def _reclaim_expired(self):
+        await outbound_col.update_many(
+            {"state": "sending", "lease_until": {"$lt": datetime.utcnow()}},
+            {"$set": {"state": "queued"}, "$unset": {"lease_owner": "", "lease_until": "", "claim": ""}},
+        )
+
+    async def claim(self) -> List[Dict[str, Any]]:
+        """
+        Lease up to batch_size due messages, highest priority first.
+        """
+        now = datetime.utcnow()
+        due = {"state": "queued", "next_attempt_at": {"$lte": now}}
+        ids = [d["_id"] async for d in outbound_col.find(due, {"_id": 1})
+               .sort([("priority", 1), ("next_attempt_at", 1)]).limit(self.batch_size)]
+        if not ids:
+            return []
+        claim = uuid.uuid4().hex
+        await outbound_col.update_many(
+            {"_id": {"$in": ids}, **due},
+            {"$set": {"state": "sending", "lease_owner": WORKER_ID, "claim": claim,
+                      "lease_until": now + timedelta(seconds=OUTBOUND_LEASE_SECONDS)}},
+        )
+        return await outbound_col.find({"_id": {"$in": ids}, "claim": claim}).to_list(None)
+
+    async def _content(self, content_id: str) -> Optional[Dict[str, Any]]:
+        hit = self._contents.get(content_id)
+        if hit is None:
+            hit = await outbound_contents_col.find_one({"_id": content_id})
+            if hit is None:
+                return None
+            self._contents[content_id] = hit
+            while len(self._contents) > _CONTENT_CACHE_MAX:
+                self._contents.popitem(last=False)
+        return hit
+
+    async def render(self, msg: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        src = msg if "html" in msg else await self._content(msg.get("content_id") or "")
+        if src is None:
+            return None
+        return {"from": src["from"], "to": msg["to"], "subject": src["subject"], "html": src["html"]}
+
+    async def deliver(self, emails: List[Dict[str, Any]]) -> List[Tuple[Optional[str], Optional[str]]]:
+        """
+        One rate-limited provider batch request, as (provider_id, error) per
+        email. A rejected batch is bisected until the rejected emails are
+        isolated; any other request failure fails the whole batch (retried
+        with backoff).
+        """
+        await self.bucket.acquire()
+        try:
+            return await self.provider.send_batch(emails)
+        except EmailRejected as e:
+            if len(emails) == 1:
+                return [(None, str(e)[:500])]
+        except Exception as e:
+            return [(None, str(e)[:500])] * len(emails)
+        mid = len(emails) // 2
+        return await self.deliver(emails[:mid]) + await self.deliver(emails[mid:])
+
+    async def process_batch(self, msgs: List[Dict[str, Any]]) -> int:
+        rendered, results = [], {}
+        for m in msgs:
+            email = await self.render(m)
+            if email is None:
+                results[m["_id"]] = (None, "missing content")
+            else:
+                rendered.append((m, email))
+        if rendered:
+            for (m, _), res in zip(rendered, await self.deliver([e for _, e in rendered])):
+                results[m["_id"]] = res
+        await self._record(msgs, results)
+        return len(msgs)
+
+    async def _record(self, msgs: List[Dict[str, Any]], results: Dict[Any, Tuple[Optional[str], Optional[str]]]):
+        now = datetime.utcnow()
+        ops = []
+        alert_counts: Dict[Any, Dict[str, int]] = {}
+        release = {"lease_owner": "", "lease_until": "", "claim": ""}
+        for m in msgs:
+            provider_id, error = results[m["_id"]]
+            held = {"_id": m["_id"], "claim": m["claim"]}
+            attempts = int(m.get("attempts") or 0) + 1
+            outcome = None
+            if provider_id:
+                ops.append(UpdateOne(held, {"$set": {"state": "sent", "sent_at": now, "provider_id": provider_id,
+                                                     "attempts": attempts}, "$unset": release}))
+                outcome = "emails_sent"
+                self.sent += 1
+            elif attempts >= OUTBOUND_MAX_ATTEMPTS:
+                ops.append(UpdateOne(held, {"$set": {"state": "dead", "attempts": attempts, "last_error": error,
+                                                     "dead_at": now}, "$unset": release}))
+                outcome = "emails_failed"
+                self.failed += 1
+                print(f"[OUTBOUND] {m.get('kind')} to {m.get('to')} dead after {attempts} attempts: {error}")
+            else:
+                retry_at = now + timedelta(seconds=_backoff_seconds(attempts))
+                ops.append(UpdateOne(held, {"$set": {"state": "queued", "attempts": attempts, "last_error": error,
+                                                     "next_attempt_at": retry_at}, "$unset": release}))
+            if outcome and m.get("alert_id") is not None:
+                c = alert_counts.setdefault(m["alert_id"], {"emails_sent": 0, "emails_failed": 0})
+                c[outcome] += 1
+        if ops:
+            await outbound_col.bulk_write(ops, ordered=False)
+        for alert_id, inc in alert_counts.items():
+            await alerts_col.update_one({"_id": alert_id}, {"$inc": inc})
+        await complete_alerts(list(alert_counts))
+
+    async def _worker(self):
+        while True:
+            n = 0
+            try:
+                msgs = await self.claim()
+                if msgs:
+                    n = await self.process_batch(msgs)
+            except Exception as e:
+                print("[OUTBOUND] consumer error:", e)
+            if n < self.batch_size:
+                await asyncio.sleep(OUTBOUND_POLL_SECONDS)
+
+    async def run(self):
+        """
+        Consume forever with `concurrency` batch workers.
+        """
+        print(f"[OUTBOUND] consumer {WORKER_ID}: provider={self.provider.name}, batch={self.batch_size}, "
+              f"workers={self.concurrency}")
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        try:
+            while True:
+                try:
+                    await self._reclaim_expired()
+                except Exception as e:
+                    print("[OUTBOUND] reclaim error:", e)
+                await asyncio.sleep(OUTBOUND_LEASE_SECONDS / 2)
+        finally:
+            for w in workers:
+                w.cancel()
+
+
+async def _main(argv) -> int:
+    if "--stats" in argv:
+        print(await queue_stats())
+        return 0
+
+    from backend.services.alert_dispatch import alert_dispatcher
+    from backend.services.indexes import ENSURE_INDEXES_ON_STARTUP, ensure_indexes
+    from backend.services.locations import location_registry
+    if ENSURE_INDEXES_ON_STARTUP:
+        await ensure_indexes()
+    await location_registry.load()
+    # the consumer process also resumes alert fan-outs interrupted mid-enqueue
+    asyncio.create_task(alert_dispatcher.resume_loop())
+    await OutboundConsumer().run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
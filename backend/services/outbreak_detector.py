@@ -0,0 +1,239 @@
+# backend/services/outbreak_detector.py
+"""
+Streaming outbreak detection over daily case counts per rollup bucket key
+(location_id, district_id, disease).
+
+Each key keeps an EWMA baseline of daily counts (mean and variance) over
+closed days plus a one-sided CUSUM of standardized daily excesses. The
+current day is scored as it fills up:
+
+- Poisson upper tail P(X >= today's count | baseline mean); the pmf/cdf are
+  advanced by one term per new case, so scoring a new case is O(1)
+- CUSUM including today's provisional excess
+
+A key is flagged when p < OUTBREAK_P_VALUE (with at least OUTBREAK_MIN_CASES
+cases today) or CUSUM > OUTBREAK_CUSUM_H.
+
+Fed with running daily totals from the rollup (`record_prediction` returns the
+bucket count after its $inc) and by a sync loop over today's
+daily_disease_counts buckets, so every worker converges on the same counts;
+totals are monotone, so feeding the same total twice is a no-op. Live totals
+are ignored until the baselines are seeded (the seed and the first sync read
+them from the rollup anyway); otherwise a key created by a live total for
+today would make the seed drop every older day of that key.
+"""
+import asyncio
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from backend.services.locations import location_registry
+from backend.services.mongo_client import daily_counts_col
+from backend.services.rollups import day_start
+
+OUTBREAK_EWMA_ALPHA = float(os.getenv("OUTBREAK_EWMA_ALPHA", "0.1"))
+OUTBREAK_MIN_BASELINE = float(os.getenv("OUTBREAK_MIN_BASELINE", "0.5"))
+OUTBREAK_CUSUM_K = float(os.getenv("OUTBREAK_CUSUM_K", "0.5"))
+OUTBREAK_CUSUM_H = float(os.getenv("OUTBREAK_CUSUM_H", "5"))
+OUTBREAK_P_VALUE = float(os.getenv("OUTBREAK_P_VALUE", "0.001"))
+OUTBREAK_MIN_CASES = int(os.getenv("OUTBREAK_MIN_CASES", "3"))
+OUTBREAK_BASELINE_DAYS = int(os.getenv("OUTBREAK_BASELINE_DAYS", "60"))
+OUTBREAK_SYNC_SECONDS = float(os.getenv("OUTBREAK_SYNC_SECONDS", "10"))
+
+_BUCKET_PROJECTION = {"_id": 0, "day": 1, "location_id": 1, "district_id": 1, "location": 1, "disease": 1, "count": 1}
+
+
+class _KeyState:
+    __slots__ = ("day", "count", "mean", "var", "cusum", "days_seen", "lam", "pmf", "cdf_below")
+
+    def __init__(self, day: datetime):
+        self.day = day
+        self.count = 0
+        self.mean = OUTBREAK_MIN_BASELINE
+        self.var = OUTBREAK_MIN_BASELINE
+        self.cusum = 0.0
+        self.days_seen = 0
+        self._start_day_scoring()
+
+    def _start_day_scoring(self):
+        # P(X = count) and P(X < count) under Poisson(lam), with count = 0
+        self.lam = max(self.mean, OUTBREAK_MIN_BASELINE)
+        self.pmf = math.exp(-self.lam)
+        self.cdf_below = 0.0
+
+    def _sigma(self) -> float:
+        return math.sqrt(max(self.var, self.mean, OUTBREAK_MIN_BASELINE))
+
+    def _close_day(self, x: int):
+        z = (x - self.mean) / self._sigma()
+        self.cusum = max(0.0, self.cusum + z - OUTBREAK_CUSUM_K)
+        diff = x - self.mean
+        self.mean += OUTBREAK_EWMA_ALPHA * diff
+        self.var = (1 - OUTBREAK_EWMA_ALPHA) * (self.var + OUTBREAK_EWMA_ALPHA * diff * diff)
+        self.days_seen += 1
+
+    def roll_to(self, day: datetime):
+        """
+        Close the current day and any empty days up to `day`.
+        """
+        gap = (day - self.day).days
+        if gap <= 0:
+            return
+        self._close_day(self.count)
+        for _ in range(min(gap - 1, OUTBREAK_BASELINE_DAYS)):
+            self._close_day(0)
+        self.day = day
+        self.count = 0
+        self._start_day_scoring()
+
+    def add(self, n: int):
+        for _ in range(n):
+            self.cdf_below += self.pmf
+            self.count += 1
+            self.pmf *= self.lam / self.count
+
+    def p_value(self) -> float:
+        return min(1.0, max(0.0, 1.0 - self.cdf_below)) if self.count else 1.0
+
+    def provisional_cusum(self) -> float:
+        z = (self.count - self.mean) / self._sigma()
+        return max(0.0, self.cusum + z - OUTBREAK_CUSUM_K)
+
+
+class OutbreakDetector:
+    def __init__(self):
+        self._keys: Dict[Tuple[str, str, str], _KeyState] = {}
+        self._names: Dict[Tuple[str, str], str] = {}  # (location_id, district_id) -> latest free text
+        self.seeded = False
+
+    def update(self, location_id: Optional[str], district_id: Optional[str], disease: str, day: datetime, total: int,
+               name: Optional[str] = None):
+        """
+        Apply the running case total of a rollup bucket for `day` (no-op
+        until seeded).
+        """
+        if self.seeded:
+            self._apply(location_id, district_id, disease, day, total, name)
+
+    def _apply(self, location_id: Optional[str], district_id: Optional[str], disease: str, day: datetime, total: int,
+               name: Optional[str] = None):
+        if not location_id or not disease:
+            return
+        key = (location_id, district_id or "", disease)
+        if name:
+            self._names[key[:2]] = name
+        st = self._keys.get(key)
+        if st is None:
+            st = self._keys[key] = _KeyState(day)
+        if day < st.day:
+            return  # late total for a day already folded into the baseline
+        st.roll_to(day)
+        if total > st.count:
+            st.add(total - st.count)
+
+    def _location_name(self, location_id: str, district_id: str) -> str:
+        entry = location_registry.get(location_id)
+        return entry["name"] if entry else self._names.get((location_id, district_id), location_id)
+
+    def _signal(self, location_id: str, district_id: str, disease: str, st: _KeyState) -> Dict[str, Any]:
+        p = st.p_value()
+        cusum = st.provisional_cusum()
+        poisson_alarm = p < OUTBREAK_P_VALUE and st.count >= OUTBREAK_MIN_CASES
+        cusum_alarm = cusum > OUTBREAK_CUSUM_H
+        if poisson_alarm and cusum_alarm:
+            severity = "critical"
+        elif poisson_alarm:
+            severity = "high"
+        elif cusum_alarm:
+            severity = "medium"
+        else:
+            severity = None
+        return {
+            "location": self._location_name(location_id, district_id),
+            "location_id": location_id,
+            "district_id": district_id or None,
+            "disease": disease,
+            "cases_today": st.count,
+            "baseline_mean": round(st.mean, 3),
+            "baseline_days": st.days_seen,
+            "p_value": p,
+            "score": round(-math.log10(max(p, 1e-300)), 3),
+            "cusum": round(cusum, 3),
+            "outbreak": severity is not None,
+            "severity": severity,
+        }
+
+    def signals(self, only_alerts: bool = False, min_cases: int = 0) -> List[Dict[str, Any]]:
+        """
+        Current scores of every key with cases today, strongest first.
+        """
+        today = day_start(datetime.utcnow())
+        out = []
+        for (loc, district, dis), st in self._keys.items():
+            if st.day != today or st.count < max(1, min_cases):
+                continue
+            sig = self._signal(loc, district, dis, st)
+            if only_alerts and not sig["outbreak"]:
+                continue
+            out.append(sig)
+        out.sort(key=lambda s: (s["score"], s["cusum"]), reverse=True)
+        return out
+
+    def _apply_bucket(self, b: Dict[str, Any]):
+        self._apply(b.get("location_id"), b.get("district_id"), b.get("disease"), b["day"], int(b.get("count") or 0),
+                    b.get("location"))
+
+    async def _sync_today(self):
+        today = day_start(datetime.utcnow())
+        async for b in daily_counts_col.find({"day": {"$gte": today}}, _BUCKET_PROJECTION):
+            self._apply_bucket(b)
+
+    async def seed(self) -> int:
+        """
+        Build baselines from the last OUTBREAK_BASELINE_DAYS of rollup buckets.
+        """
+        since = day_start(datetime.utcnow() - timedelta(days=OUTBREAK_BASELINE_DAYS))
+        n = 0
+        cursor = daily_counts_col.find({"day": {"$gte": since}}, _BUCKET_PROJECTION).sort("day", 1)
+        async for b in cursor:
+            self._apply_bucket(b)
+            n += 1
+        self.seeded = True
+        print(f"OutbreakDetector: seeded {len(self._keys)} keys from {n} daily buckets")
+        return n
+
+    async def sync_loop(self, interval: float = OUTBREAK_SYNC_SECONDS):
+        """
+        Background task: seed, then re-read today's buckets (one small indexed
+        query) to pick up cases counted by other workers.
+        """
+        while not self.seeded:
+            try:
+                await self.seed()
+            except Exception as e:
+                print("OutbreakDetector seed error:", e)
+                await asyncio.sleep(interval)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._sync_today()
+            except Exception as e:
+                print("OutbreakDetector sync error:", e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keys": len(self._keys),
+            "seeded": self.seeded,
+            "params": {
+                "ewma_alpha": OUTBREAK_EWMA_ALPHA,
+                "min_baseline": OUTBREAK_MIN_BASELINE,
+                "cusum_k": OUTBREAK_CUSUM_K,
+                "cusum_h": OUTBREAK_CUSUM_H,
+                "p_value": OUTBREAK_P_VALUE,
+                "min_cases": OUTBREAK_MIN_CASES,
+            },
+        }
+
+
+outbreak_detector = OutbreakDetector()
@@ -0,0 +1,130 @@
+# backend/services/prediction_cache.py
+"""
+LRU + TTL cache for model outputs, keyed on the quantized encoded feature
+vector and the model version. Only the model output is cached; callers
+rebuild anything derived from the exact input row themselves.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+PREDICT_CACHE_SIZE = int(os.getenv("PREDICT_CACHE_SIZE", "10000"))
+PREDICT_CACHE_TTL_SECONDS = float(os.getenv("PREDICT_CACHE_TTL_SECONDS", "3600"))
+# feature values are rounded to this many decimals before hashing
+PREDICT_CACHE_DECIMALS = int(os.getenv("PREDICT_CACHE_DECIMALS", "3"))
+
+# returned by get() on a miss (cached values may legitimately be falsy)
+MISSING = object()
+
+
+def model_file_signature(path: str) -> Optional[str]:
+    """
+    Cheap version string for a model file (name, mtime, size); None if missing.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return f"{os.path.basename(path)}:{st.st_mtime_ns}:{st.st_size}"
+
+
+class PredictionCache:
+    """
+    Thread-safe (predictions run in executor threads) LRU with per-entry TTL.
+    The cache empties itself whenever the model version it is asked about changes.
+    """
+
+    def __init__(self, max_size: int = PREDICT_CACHE_SIZE, ttl_seconds: float = PREDICT_CACHE_TTL_SECONDS,
+                 decimals: int = PREDICT_CACHE_DECIMALS):
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        self.decimals = decimals
+        self._data: "OrderedDict[bytes, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def key(self, row: np.ndarray, model_version: Optional[str]) -> bytes:
+        q = np.round(np.asarray(row, dtype=np.float64), self.decimals) + 0.0  # +0.0 folds -0.0 into 0.0
+        h = hashlib.blake2b(q.tobytes(), digest_size=16)
+        h.update((model_version or "").encode())
+        return h.digest()
+
+    def ensure_version(self, model_version: Optional[str]):
+        """
+        Drop every entry if the model version changed since the last call.
+        """
+        with self._lock:
+            if model_version != self._version:
+                if self._data:
+                    self.invalidations += 1
+                self._data.clear()
+                self._version = model_version
+
+    def get(self, key: bytes):
+        """
+        Returns the cached value, or MISSING.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, MISSING)
+            if entry is MISSING:
+                self.misses += 1
+                return MISSING
+            expires_at, value = entry
+            if expires_at < now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: bytes, value: Any):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "model_version": self._version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+prediction_cache = PredictionCache()
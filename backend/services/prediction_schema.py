@@ -0,0 +1,150 @@
+# backend/services/prediction_schema.py
+"""
+Canonical prediction_reports fields, written at insert time so analytics can
+filter and group on plain indexed fields:
+
+    disease, ts, location, district, location_id, district_id, model_version,
+    patient_name, geo (GeoJSON Point), geo_cell (geohash), schema_version
+
+Older documents only have the nested / alternative shapes written by earlier
+versions of /predict and the merger (or an older schema_version);
+migrate_legacy() rewrites them in batches
+(at startup when PREDICTION_MIGRATE_ON_STARTUP, or via
+`python -m backend.services.prediction_schema --migrate`).
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pymongo import UpdateOne
+
+from backend.services.geo import gazetteer_lookup, geohash_encode, make_point, point_coords
+from backend.services.locations import location_registry
+from backend.services.mongo_client import prediction_col
+
+# 2: geo / geo_cell, 3: location_id / district_id
+SCHEMA_VERSION = 3
+
+PREDICTION_MIGRATE_ON_STARTUP = os.getenv("PREDICTION_MIGRATE_ON_STARTUP", "1").lower() in ("1", "true", "yes")
+PREDICTION_MIGRATION_BATCH = int(os.getenv("PREDICTION_MIGRATION_BATCH", "500"))
+PREDICTION_MIGRATION_PAUSE_SECONDS = float(os.getenv("PREDICTION_MIGRATION_PAUSE_SECONDS", "0.05"))
+
+# legacy fields canonical_fields() may read
+_LEGACY_PROJECTION = {
+    "location": 1, "timestamp": 1, "predicted_at": 1, "predicted_disease": 1, "patientName": 1, "model_version": 1,
+    "prediction.predicted_disease": 1, "prediction.predicted_at": 1, "prediction.timestamp": 1,
+    "prediction.model_version": 1,
+    "input.location": 1, "input.district": 1,
+    "input.sym_doc.location": 1, "input.sym_doc.patientName": 1, "input.sym_doc.district": 1,
+    "input.water_doc.location": 1, "input.water_doc.district": 1, "input_water.district": 1,
+    "disease": 1, "ts": 1, "district": 1, "patient_name": 1, "geo": 1, "location_id": 1, "district_id": 1,
+    "input.sym_doc.geo": 1, "input.water_doc.geo": 1,
+    "input.sym_doc.location_id": 1, "input.sym_doc.district_id": 1,
+}
+
+
+def _first(*values):
+    for v in values:
+        if v not in (None, ""):
+            return v
+    return None
+
+
+def canonical_fields(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Flat canonical fields for any prediction doc shape (current or legacy).
+    """
+    pred = doc.get("prediction") or {}
+    inp = doc.get("input") or {}
+    sym = inp.get("sym_doc") or {}
+    water = inp.get("water_doc") or {}
+
+    ts = _first(doc.get("ts"), doc.get("predicted_at"), pred.get("predicted_at"), pred.get("timestamp"), doc.get("timestamp"))
+    if isinstance(ts, str):
+        try:
+            ts = datetime.fromisoformat(ts)
+        except ValueError:
+            ts = None
+
+    location = _first(doc.get("location"), sym.get("location"), water.get("location"), inp.get("location"))
+    district = _first(doc.get("district"), water.get("district"), sym.get("district"),
+                      (doc.get("input_water") or {}).get("district"), inp.get("district"))
+
+    # ids resolved at ingest win; older reports are resolved now
+    ids = {"location_id": _first(doc.get("location_id"), sym.get("location_id")),
+           "district_id": _first(doc.get("district_id"), sym.get("district_id"))}
+    if not ids["location_id"]:
+        ids.update(location_registry.fields(location, district))
+
+    # reported coordinates of the symptom (then water) report, else the gazetteer
+    coords = point_coords(doc.get("geo")) or point_coords(sym.get("geo")) or point_coords(water.get("geo")) \
+        or gazetteer_lookup(location, district)
+
+    return {
+        "disease": _first(doc.get("disease"), doc.get("predicted_disease"), pred.get("predicted_disease")),
+        "ts": ts,
+        "location": location,
+        "district": district,
+        "location_id": ids.get("location_id"),
+        "district_id": ids.get("district_id"),
+        "geo": make_point(*coords) if coords else None,
+        "geo_cell": geohash_encode(*coords) if coords else None,
+        "model_version": _first(doc.get("model_version"), pred.get("model_version")),
+        "patient_name": _first(doc.get("patient_name"), doc.get("patientName"), sym.get("patientName")),
+        "schema_version": SCHEMA_VERSION,
+    }
+
+
+def canonicalize(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Add the canonical fields to a prediction doc about to be written.
+    """
+    doc.update(canonical_fields(doc))
+    return doc
+
+
+async def migrate_legacy(batch_size: int = PREDICTION_MIGRATION_BATCH,
+                         pause: float = PREDICTION_MIGRATION_PAUSE_SECONDS) -> int:
+    """
+    Add canonical fields to every doc below SCHEMA_VERSION, walking _id in
+    batches (one unordered bulk write per batch). Idempotent and safe to run
+    from several workers at once.
+    """
+    migrated = 0
+    last_id: Optional[Any] = None
+    while True:
+        query: Dict[str, Any] = {"schema_version": {"$not": {"$gte": SCHEMA_VERSION}}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = await prediction_col.find(query, _LEGACY_PROJECTION).sort("_id", 1).limit(batch_size).to_list(None)
+        if not docs:
+            break
+
+        ops = [
+            UpdateOne({"_id": d["_id"], "schema_version": {"$not": {"$gte": SCHEMA_VERSION}}}, {"$set": canonical_fields(d)})
+            for d in docs
+        ]
+        res = await prediction_col.bulk_write(ops, ordered=False)
+        migrated += res.modified_count
+        last_id = docs[-1]["_id"]
+        if pause:
+            await asyncio.sleep(pause)
+
+    if migrated:
+        print(f"[PREDICTION_SCHEMA] migrated {migrated} legacy prediction docs")
+    return migrated
+
+
+async def _main(argv) -> int:
+    if "--migrate" not in argv:
+        print("usage: python -m backend.services.prediction_schema --migrate")
+        return 2
+    n = await migrate_legacy(pause=0)
+    print(f"migrated {n} docs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
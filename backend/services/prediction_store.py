@@ -0,0 +1,141 @@
+# backend/services/prediction_store.py
+"""
+Builds the prediction_reports document for a scored report, runs the
+post-insert bookkeeping (rollup, outbreak detector, hotspot windows) and
+rehydrates stored records on demand.
+
+PREDICTION_RECORD_MODE=compact (default) stores only what analytics and the
+UI need: the canonical fields (prediction_schema.py), symptom_id/water_id
+references instead of embedded source docs, the label/confidence/top_k part
+of the result, and the encoded feature vector as packed little-endian float32
+(`features_bin`, layout identified by `features_layout`). Set
+PREDICTION_FEATURES=omit to drop the vector entirely.
+
+PREDICTION_RECORD_MODE=full keeps the previous shape (embedded input, full
+result including per-class probabilities and the feature dict).
+"""
+import hashlib
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from bson import Binary, ObjectId
+from bson.errors import InvalidId
+
+from backend.services.feature_encoder import EXPECTED_FEATURES
+from backend.services.hotspot_engine import hotspot_engine
+from backend.services.model_registry import model_registry
+from backend.services.mongo_client import symptom_col, water_col
+from backend.services.outbreak_detector import outbreak_detector
+from backend.services.prediction_schema import canonicalize
+from backend.services.rollups import day_start, record_prediction
+
+PREDICTION_RECORD_MODE = os.getenv("PREDICTION_RECORD_MODE", "compact").lower()
+PREDICTION_FEATURES = os.getenv("PREDICTION_FEATURES", "packed").lower()
+
+# result keys kept in compact records
+_COMPACT_RESULT_KEYS = ("predicted_disease", "confidence", "top_k", "model_version")
+
+
+def feature_layout_id(names: List[str]) -> str:
+    return hashlib.blake2b(",".join(names).encode(), digest_size=8).hexdigest()
+
+
+_KNOWN_LAYOUTS = {feature_layout_id(EXPECTED_FEATURES): list(EXPECTED_FEATURES)}
+
+
+def pack_features(features: Dict[str, float]) -> Dict[str, Any]:
+    names = list(features)
+    layout = feature_layout_id(names)
+    _KNOWN_LAYOUTS.setdefault(layout, names)
+    packed = np.asarray(list(features.values()), dtype="<f4").tobytes()
+    return {"features_bin": Binary(packed), "features_layout": layout}
+
+
+def unpack_features(doc: Dict[str, Any]) -> Optional[Any]:
+    """
+    Feature dict from a compact record (a plain list if the layout is unknown
+    to this process), the stored dict from a full record, or None.
+    """
+    if "features_bin" not in doc:
+        return (doc.get("prediction") or {}).get("features")
+    values = np.frombuffer(bytes(doc["features_bin"]), dtype="<f4").astype(float).round(6).tolist()
+
+    names = _KNOWN_LAYOUTS.get(doc.get("features_layout"))
+    bundle = model_registry.active
+    if names is None and bundle is not None and feature_layout_id(list(bundle.feature_names)) == doc.get("features_layout"):
+        names = list(bundle.feature_names)
+    if names is None or len(names) != len(values):
+        return values
+    return dict(zip(names, values))
+
+
+def build_prediction_doc(result: Dict[str, Any], location: Optional[str], input_doc: Dict[str, Any],
+                         symptom_id: Optional[str] = None, water_id: Optional[str] = None,
+                         ts: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Prediction document to insert, in the configured record mode. In compact
+    mode the input is only embedded when there is no source doc to reference
+    (direct /predict calls).
+    """
+    ts = ts or datetime.utcnow()
+    doc: Dict[str, Any] = {
+        "location": location,
+        "timestamp": ts,
+        "input": input_doc,
+        "prediction": result,
+        "model_version": result.get("model_version"),
+    }
+    if symptom_id is not None:
+        doc["symptom_id"] = symptom_id
+        doc["water_id"] = water_id
+    # canonical fields are derived from the full shape, before compaction
+    canonicalize(doc)
+    if PREDICTION_RECORD_MODE != "compact":
+        return doc
+
+    del doc["timestamp"]  # same as ts
+    if symptom_id is not None:
+        del doc["input"]
+    doc["prediction"] = {k: result[k] for k in _COMPACT_RESULT_KEYS if k in result}
+    if PREDICTION_FEATURES == "packed" and result.get("features"):
+        doc.update(pack_features(result["features"]))
+    return doc
+
+
+async def after_insert(doc: Dict[str, Any]):
+    """
+    Bookkeeping for a newly stored prediction (call once per inserted doc,
+    with its _id set): daily rollup, outbreak baselines, hotspot windows.
+    """
+    total = await record_prediction(doc.get("location_id"), doc.get("district_id"), doc.get("location"),
+                                    doc.get("disease"), doc.get("ts"))
+    if total:
+        outbreak_detector.update(doc.get("location_id"), doc.get("district_id"), doc["disease"], day_start(doc["ts"]), total,
+                                 doc.get("location"))
+    hotspot_engine.observe(doc)
+
+
+async def _find_source(col, ref: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not ref:
+        return None
+    try:
+        return await col.find_one({"_id": ObjectId(ref)})
+    except InvalidId:
+        return await col.find_one({"_id": ref})
+
+
+async def rehydrate(doc: Dict[str, Any], sources: bool = True) -> Dict[str, Any]:
+    """
+    Expand a stored prediction: unpack the feature vector and, if the record
+    references its source reports instead of embedding them, load those.
+    """
+    out = dict(doc)
+    out.pop("features_bin", None)
+    out["features"] = unpack_features(doc)
+    if sources and "input" not in doc and doc.get("symptom_id"):
+        sym_doc = await _find_source(symptom_col, doc.get("symptom_id"))
+        water_doc = await _find_source(water_col, doc.get("water_id"))
+        out["input"] = {"location": doc.get("location"), "sym_doc": sym_doc, "water_doc": water_doc}
+    return out
@@ -1,129 +1,90 @@
 # backend/services/predictor.py
 import os
-from pathlib import Path
-import joblib
+from typing import List, Tuple
 import numpy as np
-import pandas as pd
 
-# Path to model (can override with MODEL_PATH env var)
-MODEL_PATH = os.getenv("MODEL_PATH", "backend/models/disease_prediction_model.joblib")
+from backend.services.feature_encoder import encoder
+from backend.services.model_registry import ModelBundle, model_registry
+from backend.services.prediction_cache import MISSING, prediction_cache
 
-# Load model (this is synchronous)
-try:
-    _model = joblib.load(Path(MODEL_PATH))
-    print("Predictor: model loaded from", MODEL_PATH)
-except Exception as e:
-    _model = None
-    print("Predictor: failed to load model:", e)
+# Number of ranked diagnoses returned with every prediction
+PREDICT_TOP_K = int(os.getenv("PREDICT_TOP_K", "3"))
 
-# EXACT expected features (from your model)
-EXPECTED_FEATURES = [
-    'ph', 'turbidity', 'tds', 'chlorine', 'fluoride', 'nitrate', 'coliform',
-    'temperature', 'diarrhea', 'vomiting', 'fever', 'abdominal_pain', 'jaundice',
-    'dehydration', 'fatigue', 'nausea', 'headache', 'symptom_diarrhea',
-    'symptom_vomiting', 'symptom_fever', 'symptom_abdominal_pain',
-    'symptom_jaundice', 'symptom_dehydration', 'symptom_fatigue',
-    'symptom_nausea', 'symptom_headache', 'district_Dibrugarh',
-    'district_Jorhat', 'district_Kamrup Metro', 'district_Sonitpur',
-    'primary_water_source_Municipal tap water', 'primary_water_source_Pond water',
-    'primary_water_source_River water', 'primary_water_source_Tube well',
-    'primary_water_source_Well water'
-]
-
-DISTRICT_CATS = ["Dibrugarh", "Jorhat", "Kamrup Metro", "Sonitpur"]
-WATER_SOURCE_CATS = ["Municipal tap water", "Pond water", "River water", "Tube well", "Well water"]
-
-def _safe_float(x):
-    try:
-        return float(x)
-    except Exception:
-        return 0.0
-
-def _normalize_symptoms(symptoms):
-    if symptoms is None:
-        return []
-    if isinstance(symptoms, str):
-        parts = [s.strip() for s in symptoms.split(",") if s.strip()]
-        return [p.lower() for p in parts]
-    return [str(s).lower() for s in symptoms]
+# Set in process-pool inference workers, which have no event loop for the
+# registry's background watcher and check for new versions inline instead.
+AUTO_REFRESH_MODEL = False
 
 def build_feature_dict(w_doc: dict, s_doc: dict):
-    # start with zeros
-    base = {k: 0.0 for k in EXPECTED_FEATURES}
-
-    # water numeric features
-    ph_val = None
-    if w_doc:
-        ph_val = w_doc.get("pH", None) if "pH" in w_doc else w_doc.get("ph", None)
-    base['ph'] = _safe_float(ph_val)
-    base['turbidity'] = _safe_float(w_doc.get("turbidity", 0) if w_doc else 0)
-    base['tds'] = _safe_float(w_doc.get("tds", 0) if w_doc else 0)
-    base['chlorine'] = _safe_float(w_doc.get("chlorine", 0) if w_doc else 0)
-    base['fluoride'] = _safe_float(w_doc.get("fluoride", 0) if w_doc else 0)
-    base['nitrate'] = _safe_float(w_doc.get("nitrate", 0) if w_doc else 0)
-    base['coliform'] = _safe_float(w_doc.get("coliform", 0) if w_doc else 0)
-    base['temperature'] = _safe_float(w_doc.get("temperature", 0) if w_doc else 0)
-
-    # symptom flags
-    symptoms_list = _normalize_symptoms(s_doc.get("symptoms") if s_doc else [])
-    base['diarrhea'] = 1.0 if any("diarrh" in s for s in symptoms_list) else 0.0
-    base['vomiting'] = 1.0 if any("vomit" in s for s in symptoms_list) else 0.0
-    base['fever'] = 1.0 if any("fever" in s for s in symptoms_list) else 0.0
-    base['abdominal_pain'] = 1.0 if any(("abdominal pain" in s or "stomach pain" in s) for s in symptoms_list) else 0.0
-    base['jaundice'] = 1.0 if any("jaundice" in s for s in symptoms_list) else 0.0
-    base['dehydration'] = 1.0 if any("dehydra" in s for s in symptoms_list) else 0.0
-    base['fatigue'] = 1.0 if any("fatigue" in s for s in symptoms_list) else 0.0
-    base['nausea'] = 1.0 if any("nausea" in s for s in symptoms_list) else 0.0
-    base['headache'] = 1.0 if any("headache" in s for s in symptoms_list) else 0.0
-
-    # duplicate symptom_ columns
-    base['symptom_diarrhea'] = base['diarrhea']
-    base['symptom_vomiting'] = base['vomiting']
-    base['symptom_fever'] = base['fever']
-    base['symptom_abdominal_pain'] = base['abdominal_pain']
-    base['symptom_jaundice'] = base['jaundice']
-    base['symptom_dehydration'] = base['dehydration']
-    base['symptom_fatigue'] = base['fatigue']
-    base['symptom_nausea'] = base['nausea']
-    base['symptom_headache'] = base['headache']
+    """
+    Named feature dict for one pair. Kept for callers that want the dict shape;
+    scoring paths use the array-backed encoder directly.
+    """
+    return encoder.to_dict(encoder.encode(w_doc, s_doc))
 
-    # district one-hot (case-insensitive match)
-    district = None
-    if s_doc:
-        district = s_doc.get("district") or s_doc.get("district_name") or s_doc.get("village_district")
-    if not district and w_doc:
-        district = w_doc.get("district")
-    if isinstance(district, str):
-        district = district.strip().lower()
-    for d in DISTRICT_CATS:
-        key = f"district_{d}"
-        base[key] = 1.0 if district and district == d.lower() else 0.0
+def _format_predictions(bundle: ModelBundle, proba: np.ndarray, top_k: int) -> List[dict]:
+    """
+    Decode a probability matrix into prediction dicts (label, confidence,
+    per-class probabilities, top-k ranking) with vectorized argmax/argsort.
+    """
+    k = max(1, min(top_k, proba.shape[1]))
+    order = np.argsort(-proba, axis=1, kind="stable")[:, :k]
+    labels = bundle.class_labels.tolist()
+    out = []
+    for row, ranked in zip(proba.tolist(), order.tolist()):
+        best = ranked[0]
+        out.append({
+            "predicted_disease": labels[best],
+            "confidence": round(row[best], 6),
+            "probabilities": {labels[j]: round(row[j], 6) for j in range(len(labels))},
+            "top_k": [{"disease": labels[j], "probability": round(row[j], 6)} for j in ranked],
+            "model_version": bundle.version,
+        })
+    return out
+
+def predict_batch(pairs: List[Tuple[dict, dict]], top_k: int = PREDICT_TOP_K):
+    """
+    Synchronous batched predict. `pairs` is a list of (w_doc, s_doc) tuples;
+    returns one dict per pair, in order, with the decoded label, its
+    confidence, all class probabilities, the top_k ranking, the model version
+    and the features.
+    """
+    if AUTO_REFRESH_MODEL:
+        model_registry.refresh_if_stale()
 
-    # primary water source one-hot (case-insensitive)
-    src = None
-    if w_doc:
-        src = w_doc.get("primary_water_source") or w_doc.get("water_source") or w_doc.get("primaryWaterSource")
-    if isinstance(src, str):
-        src = src.strip().lower()
-    for s in WATER_SOURCE_CATS:
-        key = f"primary_water_source_{s}"
-        base[key] = 1.0 if src and src == s.lower() else 0.0
+    # one bundle for the whole batch, even if a new version is swapped in meanwhile
+    bundle = model_registry.active
+    if bundle is None:
+        raise RuntimeError("Model not loaded")
+    if not pairs:
+        return []
 
-    return base
+    X = bundle.encoder.encode_batch(pairs)
+    rows = [MISSING] * len(X)
+
+    # serve repeated (quantized) feature vectors from the cache; score the rest in one call
+    keys = None
+    if prediction_cache.enabled:
+        prediction_cache.ensure_version(bundle.version)
+        keys = [prediction_cache.key(row, bundle.version) for row in X]
+        rows = [prediction_cache.get(k) for k in keys]
+
+    todo = [i for i, r in enumerate(rows) if r is MISSING]
+    if todo:
+        scored = bundle.predict_proba(X[todo] if len(todo) < len(X) else X)
+        for i, r in zip(todo, scored):
+            rows[i] = r
+            if keys is not None:
+                prediction_cache.put(keys[i], r.copy())
+
+    results = _format_predictions(bundle, np.vstack(rows), top_k)
+    for i, res in enumerate(results):
+        res["features"] = bundle.encoder.to_dict(X[i])
+    return results
 
 def predict_disease(w_doc: dict, s_doc: dict):
     """
-    Synchronous predict function returning label and features dict.
-    Call it inside run_in_executor from async code.
+    Synchronous predict function returning label, probabilities, top-k and features dict.
+    Call it inside run_in_executor from async code, or use
+    backend.services.batcher.predict_disease_async to get micro-batched.
     """
-    if _model is None:
-        raise RuntimeError("Model not loaded")
-
-    feature_dict = build_feature_dict(w_doc or {}, s_doc or {})
-
-    # Build DataFrame with columns ordered exactly as EXPECTED_FEATURES
-    df = pd.DataFrame([feature_dict], columns=EXPECTED_FEATURES)
-
-    # Predict using pipeline (DataFrame preserves feature names; avoids warnings)
-    pred = _model.predict(df)
-    return {"predicted_disease": pred[0], "features": feature_dict}
+    return predict_batch([(w_doc, s_doc)])[0]
@@ -0,0 +1,156 @@
+# backend/services/recipient_index.py
+"""
+Region -> recipient index for alert targeting (`alert_recipients`).
+
+One doc per user (same _id) holding its email and `region_keys`: the user's
+location_id, district_id and every registered ancestor of both, e.g.
+["assam/kamrup-metro/chandmari", "assam/kamrup-metro", "assam"]. An alert for
+any region is then a single equality on the multikey (region_keys, _id)
+index, streamed in _id order - a district covers its villages without
+expanding the district into a list of descendant ids.
+
+Maintained on registration and admin user creation (index_user). After
+importing new locations (which can turn unregistered ids into registered
+ones), or for users created before this index existed, rebuild; it also
+re-resolves users' unregistered:* location ids and writes the corrected ids
+back to `users`:
+
+    python -m backend.services.recipient_index --rebuild
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from backend.services.locations import UNREGISTERED_PREFIX, location_registry
+from backend.services.mongo_client import recipients_col, users_col
+
+RECIPIENT_INDEX_BATCH = int(os.getenv("RECIPIENT_INDEX_BATCH", "1000"))
+
+_USER_PROJECTION = {"email": 1, "role": 1, "location": 1, "district": 1, "location_id": 1, "district_id": 1}
+
+
+def region_keys(location_id: Optional[str], district_id: Optional[str]) -> List[str]:
+    keys: List[str] = []
+    for lid in (location_id, district_id):
+        if not lid:
+            continue
+        for k in [lid, *location_registry.ancestors(lid)]:
+            if k not in keys:
+                keys.append(k)
+    return keys
+
+
+def _location_ids(user: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    location_id, district_id = user.get("location_id"), user.get("district_id")
+    stale = location_id is None or str(location_id).startswith(UNREGISTERED_PREFIX)
+    if stale and user.get("location"):
+        # users stored before the location registry, or whose place may be registered by now
+        f = location_registry.fields(user["location"], user.get("district"))
+        location_id, district_id = f.get("location_id"), f.get("district_id")
+    return location_id, district_id
+
+
+def _entry(user: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    email = user.get("email")
+    if not isinstance(email, str) or not email:
+        return None
+    location_id, district_id = _location_ids(user)
+    return {
+        "email": email,
+        "role": user.get("role"),
+        "region_keys": region_keys(location_id, district_id),
+        "updated_at": datetime.utcnow(),
+    }
+
+
+def _op(user: Dict[str, Any]) -> Optional[UpdateOne]:
+    entry = _entry(user)
+    if entry is None:
+        return None
+    return UpdateOne({"_id": user["_id"]}, {"$set": entry}, upsert=True)
+
+
+async def index_user(user: Dict[str, Any]):
+    """
+    Add or refresh one user's entry (call after inserting/updating the user).
+    """
+    op = _op(user)
+    if op is not None:
+        await recipients_col.bulk_write([op])
+
+
+def region_key(region: str) -> Optional[str]:
+    """
+    The key an alert for `region` (free text, resolved through the location
+    registry) is matched on, or None if it can't be resolved.
+    """
+    m = location_registry.resolve(region)
+    return m.id if m is not None else None
+
+
+async def rebuild(batch_size: int = RECIPIENT_INDEX_BATCH) -> int:
+    """
+    Upsert an entry for every user (walks users by _id, one unordered bulk
+    write per batch), store re-resolved location ids on the users, and drop
+    entries of users that no longer exist.
+    """
+    n, fixed, last_id = 0, 0, None
+    while True:
+        query: Dict[str, Any] = {} if last_id is None else {"_id": {"$gt": last_id}}
+        users = await users_col.find(query, _USER_PROJECTION).sort("_id", 1).limit(batch_size).to_list(None)
+        if not users:
+            break
+        ops = [op for op in map(_op, users) if op is not None]
+        if ops:
+            await recipients_col.bulk_write(ops, ordered=False)
+            n += len(ops)
+        user_ops = []
+        for u in users:
+            location_id, district_id = _location_ids(u)
+            if (location_id, district_id) != (u.get("location_id"), u.get("district_id")):
+                user_ops.append(UpdateOne({"_id": u["_id"]},
+                                          {"$set": {"location_id": location_id, "district_id": district_id}}))
+        if user_ops:
+            fixed += (await users_col.bulk_write(user_ops, ordered=False)).modified_count
+        last_id = users[-1]["_id"]
+
+    stale, last_id = 0, None
+    while True:
+        query = {} if last_id is None else {"_id": {"$gt": last_id}}
+        ids = [d["_id"] async for d in recipients_col.find(query, {"_id": 1}).sort("_id", 1).limit(batch_size)]
+        if not ids:
+            break
+        live = {d["_id"] async for d in users_col.find({"_id": {"$in": ids}}, {"_id": 1})}
+        gone = [i for i in ids if i not in live]
+        if gone:
+            stale += (await recipients_col.delete_many({"_id": {"$in": gone}})).deleted_count
+        last_id = ids[-1]
+    print(f"RecipientIndex: indexed {n} users ({fixed} location ids corrected), removed {stale} stale entries")
+    return n
+
+
+async def ensure_built() -> int:
+    """
+    Rebuild when the index holds fewer entries than there are users (first
+    deploy, or users inserted by scripts that bypass index_user).
+    """
+    if await recipients_col.estimated_document_count() >= await users_col.estimated_document_count():
+        return 0
+    return await rebuild()
+
+
+async def _main(argv) -> int:
+    if "--rebuild" not in argv:
+        print("usage: python -m backend.services.recipient_index --rebuild")
+        return 2
+    await location_registry.load()
+    await rebuild()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
@@ -0,0 +1,163 @@
+# backend/services/rollups.py
+"""
+Materialized daily case counts: one `daily_disease_counts` doc per
+(day, location_id, district_id, disease) with `count`, `last_at` and the
+latest free-text `location` (display only). Ids come from the location
+registry, so spellings of one place share a bucket; missing ids are stored
+as "" ($merge can't key on null). Readers group a district's buckets on
+district_id, and places without a known district on location_id.
+
+Kept current by record_prediction() ($inc upsert) on every stored prediction;
+rebuilt from prediction_reports with:
+
+    python -m backend.services.rollups --backfill
+
+Buckets from before the id keys are rebuilt once by migrate_buckets (run at
+startup and by the command above).
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from pymongo import IndexModel, ReturnDocument
+from pymongo.errors import OperationFailure
+
+from backend.services.indexes import INDEX_SPECS
+from backend.services.mongo_client import daily_counts_col, prediction_col
+
+
+def day_start(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, ts.day)
+
+
+def cutoff_day(days: int, now: Optional[datetime] = None) -> datetime:
+    """
+    First day included in a `days`-day window ending today.
+    """
+    return day_start((now or datetime.utcnow()) - timedelta(days=days))
+
+
+def region_filter(rid: str, is_district: bool) -> Dict[str, Any]:
+    """
+    Buckets reported under `rid`: a district's buckets, or those of a place
+    with no known district.
+    """
+    return {"district_id": rid} if is_district else {"district_id": "", "location_id": rid}
+
+
+async def record_prediction(location_id: Optional[str], district_id: Optional[str], location: Optional[str],
+                            disease: Optional[str], ts: Optional[datetime] = None, n: int = 1) -> int:
+    """
+    Count one stored prediction into its daily bucket and return the bucket's
+    new total.
+    """
+    if disease is None:
+        return 0
+    ts = ts or datetime.utcnow()
+    update: Dict[str, Any] = {"$inc": {"count": n}, "$max": {"last_at": ts}}
+    if location:
+        update["$set"] = {"location": location}
+    doc = await daily_counts_col.find_one_and_update(
+        {"day": day_start(ts), "location_id": location_id or "", "district_id": district_id or "", "disease": disease},
+        update,
+        projection={"_id": 0, "count": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return int((doc or {}).get("count") or 0)
+
+
+async def backfill(since: Optional[datetime] = None) -> int:
+    """
+    Recompute buckets from prediction_reports (optionally only days >= since)
+    and merge them into daily_disease_counts, replacing existing buckets.
+    Reads the canonical fields, so legacy docs must be migrated first.
+    """
+    match: Dict[str, Any] = {
+        "disease": {"$ne": None},
+        "ts": {"$type": "date"},
+    }
+    if since:
+        match["ts"]["$gte"] = day_start(since)
+
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {
+                "day": {"$dateFromString": {"dateString": {"$dateToString": {"format": "%Y-%m-%d", "date": "$ts"}}}},
+                "location_id": {"$ifNull": ["$location_id", ""]},
+                "district_id": {"$ifNull": ["$district_id", ""]},
+                "disease": "$disease",
+            },
+            "count": {"$sum": 1},
+            "last_at": {"$max": "$ts"},
+            "location": {"$last": "$location"},
+        }},
+        {"$project": {
+            "_id": 0,
+            "day": "$_id.day",
+            "location_id": "$_id.location_id",
+            "district_id": "$_id.district_id",
+            "disease": "$_id.disease",
+            "location": {"$ifNull": ["$location", ""]},
+            "count": 1,
+            "last_at": 1,
+        }},
+        # needs the unique {day, location_id, district_id, disease} index declared in indexes.py
+        {"$merge": {
+            "into": daily_counts_col.name,
+            "on": ["day", "location_id", "district_id", "disease"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }},
+    ]
+    await prediction_col.aggregate(pipeline, allowDiskUse=True).to_list(None)
+    return await daily_counts_col.count_documents({})
+
+
+async def migrate_buckets() -> int:
+    """
+    One-time switch from buckets keyed on the free-text location: drop the
+    legacy indexes (their unique key would reject id-keyed buckets sharing a
+    location string) and buckets, build the declared indexes and rebuild
+    every bucket from prediction_reports. No-op once migrated.
+    """
+    info = await daily_counts_col.index_information()
+    legacy = [name for name, v in info.items() if any(k == "location" for k, _ in v["key"])]
+    if not legacy and await daily_counts_col.find_one({"location_id": {"$exists": False}}, {"_id": 1}) is None:
+        return 0
+    for name in legacy:
+        try:
+            await daily_counts_col.drop_index(name)
+        except OperationFailure:
+            pass  # dropped by another worker
+    await daily_counts_col.delete_many({"location_id": {"$exists": False}})
+    await daily_counts_col.create_indexes([IndexModel(keys, **opts) for keys, opts in INDEX_SPECS[daily_counts_col.name]])
+    n = await backfill()
+    print(f"Rollups: rebuilt {n} daily buckets keyed on location ids")
+    return n
+
+
+async def _main(argv) -> int:
+    if "--backfill" not in argv:
+        print("usage: python -m backend.services.rollups --backfill [--days N]")
+        return 2
+
+    from backend.services.indexes import ensure_indexes
+    from backend.services.prediction_schema import migrate_legacy
+    await migrate_legacy(pause=0)
+    # a migration already rebuilds every bucket
+    migrated = await migrate_buckets()
+    await ensure_indexes()
+
+    since = None
+    if "--days" in argv:
+        since = cutoff_day(int(argv[argv.index("--days") + 1]))
+    n = migrated or await backfill(since)
+    print(f"daily_disease_counts now holds {n} buckets")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
@@ -0,0 +1,262 @@
+# backend/services/scoring_pipeline.py
+"""
+Scoring pipeline that replaces the per-worker poller.
+
+One Uvicorn worker at a time holds a lease on the `pipeline_state` document and
+runs the consumer; the others stand by and take over when the lease lapses.
+The consumer follows a change stream on symptoms_reports + water_reports and
+persists its resume token. On a standalone mongod, where change streams are
+unavailable, it falls back to indexed polling of unprocessed symptom docs.
+Events are processed with bounded concurrency.
+"""
+import asyncio
+import os
+import socket
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure, PyMongoError
+
+from backend.services.mongo_client import db, pipeline_state_col, symptom_col, water_col
+from backend.services.work_queue import DEAD_LETTER
+from backend.services.water_index import water_index
+
+POLL_INTERVAL_SECONDS = int(os.getenv("POLL_INTERVAL_SECONDS", "5"))
+SCORING_CONCURRENCY = int(os.getenv("SCORING_CONCURRENCY", "8"))
+SCORING_LEASE_SECONDS = int(os.getenv("SCORING_LEASE_SECONDS", "30"))
+SCORING_TOKEN_FLUSH_SECONDS = float(os.getenv("SCORING_TOKEN_FLUSH_SECONDS", "2"))
+# polling mode: don't retry the same symptom doc more often than this
+SCORING_RETRY_SECONDS = int(os.getenv("SCORING_RETRY_SECONDS", "60"))
+SCORING_POLL_BATCH = int(os.getenv("SCORING_POLL_BATCH", "200"))
+
+STATE_ID = "scoring_pipeline"
+
+
+def unprocessed_filter(now: datetime) -> Dict[str, Any]:
+    """
+    Unprocessed symptom docs that are due: equality-only on the leading field
+    so the {processed_by_model, created_at} index can serve it; dead letters
+    are left for an operator, and docs still backing off (including those
+    waiting for water) or leased by a live worker are skipped (see work_queue).
+    """
+    return {
+        "processed_by_model": {"$in": [False, None]},
+        "scoring_state": {"$ne": DEAD_LETTER},
+        "$and": [
+            {"$or": [{"next_attempt_at": None}, {"next_attempt_at": {"$lte": now}}]},
+            {"$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]},
+        ],
+    }
+
+# server error codes meaning "change streams need a replica set / sharded cluster"
+_NO_CHANGE_STREAM_CODES = {40573, 40324}
+
+
+class _LeaseLost(Exception):
+    pass
+
+
+class ScoringPipeline:
+    def __init__(self, process_symptom: Callable[[Dict[str, Any]], Awaitable[Any]],
+                 process_location: Callable[[str], Awaitable[Any]],
+                 concurrency: int = SCORING_CONCURRENCY):
+        self._process_symptom = process_symptom
+        self._process_location = process_location
+        self._sem = asyncio.Semaphore(max(1, concurrency))
+        self._tasks: set = set()
+        self._pending_locations: set = set()
+        self._recent: "OrderedDict[Any, float]" = OrderedDict()
+
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.mode: Optional[str] = None          # mode this worker runs, if leader
+        self.leader_mode: Optional[str] = None   # mode last published by the leader
+        self.leader_until: Optional[datetime] = None
+        self.events = 0
+
+    # ---------- leadership ----------
+    async def _acquire_lease(self) -> bool:
+        now = datetime.utcnow()
+        try:
+            doc = await pipeline_state_col.find_one_and_update(
+                {"_id": STATE_ID, "$or": [{"owner": self.owner}, {"lease_until": {"$lt": now}}, {"owner": None}]},
+                {"$set": {"owner": self.owner, "lease_until": now + timedelta(seconds=SCORING_LEASE_SECONDS)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            doc = None  # someone else holds a live lease
+
+        if doc is None or doc.get("owner") != self.owner:
+            state = await pipeline_state_col.find_one({"_id": STATE_ID}, {"mode": 1, "lease_until": 1})
+            self.leader_mode = (state or {}).get("mode")
+            self.leader_until = (state or {}).get("lease_until")
+            return False
+        return True
+
+    async def _renew_lease(self, extra: Optional[Dict[str, Any]] = None):
+        now = datetime.utcnow()
+        update = {"lease_until": now + timedelta(seconds=SCORING_LEASE_SECONDS), "mode": self.mode}
+        if extra:
+            update.update(extra)
+        res = await pipeline_state_col.update_one({"_id": STATE_ID, "owner": self.owner}, {"$set": update})
+        if res.matched_count == 0:
+            raise _LeaseLost()
+        self.leader_mode = self.mode
+        self.leader_until = update["lease_until"]
+
+    async def _release_lease(self):
+        try:
+            await pipeline_state_col.update_one(
+                {"_id": STATE_ID, "owner": self.owner},
+                {"$set": {"owner": None, "lease_until": datetime.utcnow()}},
+            )
+        except PyMongoError:
+            pass
+
+    @property
+    def streams_new_reports(self) -> bool:
+        """
+        True while some worker's change stream is picking up new reports, so
+        request handlers don't need to schedule their own scoring.
+        """
+        return (
+            self.leader_mode == "change_stream"
+            and self.leader_until is not None
+            and self.leader_until > datetime.utcnow()
+        )
+
+    # ---------- work ----------
+    def _spawn(self, coro):
+        task = asyncio.create_task(self._bounded(coro))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _bounded(self, coro):
+        async with self._sem:
+            try:
+                await coro
+            except Exception as e:
+                print("ScoringPipeline task error:", e)
+
+    async def _location_job(self, loc: str):
+        try:
+            await self._process_location(loc)
+        finally:
+            self._pending_locations.discard(loc)
+
+    async def _handle_change(self, change: Dict[str, Any]):
+        self.events += 1
+        coll = change.get("ns", {}).get("coll")
+        doc = change.get("fullDocument") or {}
+        if coll == symptom_col.name:
+            if not doc.get("processed_by_model"):
+                await self._sem.acquire()  # backpressure: stop reading the stream when saturated
+                self._sem.release()
+                self._spawn(self._process_symptom(doc))
+        elif coll == water_col.name:
+            water_index.observe(doc)
+            loc = doc.get("location_id")
+            # many samples for one location collapse into one pending job
+            if loc and loc not in self._pending_locations:
+                self._pending_locations.add(loc)
+                self._spawn(self._location_job(loc))
+
+    async def sweep(self, limit: int = SCORING_POLL_BATCH) -> int:
+        """
+        One indexed pass over unprocessed symptom docs. Used for catch-up when
+        the consumer starts, every POLL_INTERVAL_SECONDS alongside the change
+        stream (retries whose backoff elapsed, docs released under load,
+        requeued dead letters - none of which emit an insert event) and as
+        the whole loop in polling mode.
+        """
+        now = time.monotonic()
+        while self._recent and next(iter(self._recent.values())) < now - SCORING_RETRY_SECONDS:
+            self._recent.popitem(last=False)
+
+        n = 0
+        # oldest first, so due retries are reached even when new reports keep arriving
+        cursor = symptom_col.find(unprocessed_filter(datetime.utcnow())).sort("created_at", 1).limit(limit)
+        async for sym in cursor:
+            sid = sym.get("_id")
+            if sid in self._recent:
+                continue
+            self._recent[sid] = now
+            self._spawn(self._process_symptom(sym))
+            n += 1
+        return n
+
+    async def _run_change_stream(self):
+        state = await pipeline_state_col.find_one({"_id": STATE_ID}) or {}
+        token = state.get("resume_token")
+        pipeline = [{"$match": {
+            "operationType": "insert",
+            "ns.coll": {"$in": [symptom_col.name, water_col.name]},
+        }}]
+
+        try:
+            stream = db.watch(pipeline, full_document="updateLookup", resume_after=token, max_await_time_ms=1000)
+            change = await stream.try_next()  # surfaces "not a replica set" immediately
+        except OperationFailure as e:
+            if token and e.code not in _NO_CHANGE_STREAM_CODES:
+                # token fell off the oplog; restart from now and rely on the sweep
+                print("ScoringPipeline: resume token rejected, starting fresh:", e)
+                await pipeline_state_col.update_one({"_id": STATE_ID}, {"$unset": {"resume_token": ""}})
+                return
+            raise
+
+        self.mode = "change_stream"
+        await self._renew_lease()
+        await self.sweep()
+        print("ScoringPipeline: consuming change stream")
+
+        last_flush = last_sweep = time.monotonic()
+        async with stream:
+            while stream.alive:
+                if change is not None:
+                    await self._handle_change(change)
+                if time.monotonic() - last_flush >= SCORING_TOKEN_FLUSH_SECONDS:
+                    await self._renew_lease({"resume_token": stream.resume_token, "token_at": datetime.utcnow()})
+                    last_flush = time.monotonic()
+                # try_next returns at least every max_await_time_ms, so this runs on time
+                if time.monotonic() - last_sweep >= POLL_INTERVAL_SECONDS:
+                    await self.sweep()
+                    last_sweep = time.monotonic()
+                change = await stream.try_next()
+
+    async def _run_polling(self):
+        self.mode = "polling"
+        print("ScoringPipeline: change streams unavailable, polling every", POLL_INTERVAL_SECONDS, "s")
+        while True:
+            await self._renew_lease()
+            await self.sweep()
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+    async def run(self):
+        """
+        Background task: contend for the lease, then consume until it is lost.
+        """
+        while True:
+            try:
+                if not await self._acquire_lease():
+                    await asyncio.sleep(max(1, SCORING_LEASE_SECONDS // 3))
+                    continue
+                try:
+                    await self._run_change_stream()
+                except OperationFailure as e:
+                    if e.code in _NO_CHANGE_STREAM_CODES or "replica set" in str(e):
+                        await self._run_polling()
+                    else:
+                        raise
+            except _LeaseLost:
+                print("ScoringPipeline: lease lost, standing by")
+            except asyncio.CancelledError:
+                await self._release_lease()
+                raise
+            except Exception as e:
+                print("ScoringPipeline error:", e)
+            self.mode = None
+            await asyncio.sleep(1)
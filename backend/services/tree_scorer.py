@@ -0,0 +1,107 @@
+# backend/services/tree_scorer.py
+"""
+Pure-NumPy scorer for oblivious-tree ensembles exported by
+nirogya-ml/export_tree_model.py. Lets API workers score without importing
+the CatBoost runtime.
+"""
+import json
+from typing import List, Sequence
+
+import numpy as np
+
+# rows scored per chunk; keeps the (rows, trees, depth) bit tensor small
+SCORE_CHUNK_ROWS = 1024
+
+
+class ObliviousTreeScorer:
+    """
+    Evaluates every tree of the ensemble at once: each level contributes one
+    bit (x[feature] > border) and the bits form the leaf index.
+    Exposes predict/predict_proba/classes_ like the sklearn-style models.
+    """
+
+    def __init__(self, feature_names: Sequence[str], split_feature: np.ndarray, split_border: np.ndarray,
+                 leaf_values: np.ndarray, scale: float, bias: np.ndarray, class_names: np.ndarray,
+                 class_labels=None, column_specs=None):
+        self.feature_names: List[str] = [str(f) for f in feature_names]
+        self.split_feature = np.asarray(split_feature, dtype=np.intp)
+        # compared in float32, as CatBoost does
+        self.split_border = np.asarray(split_border, dtype=np.float32)
+        self.leaf_values = np.asarray(leaf_values, dtype=np.float64)
+        self.scale = float(scale)
+        self.bias = np.asarray(bias, dtype=np.float64)
+        self.classes_ = np.asarray(class_names)
+        self.class_labels = None if class_labels is None else np.asarray(class_labels)
+        self.column_specs = column_specs
+
+        n_trees, depth = self.split_feature.shape
+        self._tree_idx = np.arange(n_trees)
+        self._level_weights = (1 << np.arange(depth, dtype=np.int64))
+
+    @classmethod
+    def load(cls, path: str) -> "ObliviousTreeScorer":
+        with np.load(path, allow_pickle=False) as z:
+            return cls(
+                feature_names=z["feature_names"].tolist(),
+                split_feature=z["split_feature"],
+                split_border=z["split_border"],
+                leaf_values=z["leaf_values"],
+                scale=float(z["scale"]),
+                bias=z["bias"],
+                class_names=z["class_names"],
+                class_labels=z["class_labels"] if "class_labels" in z.files else None,
+                column_specs=json.loads(str(z["column_specs"])) if "column_specs" in z.files else None,
+            )
+
+    def bind(self, feature_names: Sequence[str]) -> "ObliviousTreeScorer":
+        """
+        Return a scorer that reads its columns straight out of matrices laid out
+        as `feature_names` (e.g. EXPECTED_FEATURES). Raises ValueError if the
+        exported model needs a column that layout doesn't have.
+        """
+        pos = {name: i for i, name in enumerate(feature_names)}
+        missing = [f for f in self.feature_names if f not in pos]
+        if missing:
+            raise ValueError(f"Tree model needs columns missing from feature layout: {missing}")
+
+        remap = np.asarray([pos[f] for f in self.feature_names], dtype=np.intp)
+        return ObliviousTreeScorer(
+            feature_names=list(feature_names),
+            split_feature=remap[self.split_feature],
+            split_border=self.split_border,
+            leaf_values=self.leaf_values,
+            scale=self.scale,
+            bias=self.bias,
+            class_names=self.classes_,
+            class_labels=self.class_labels,
+        )
+
+    def _raw_chunk(self, X: np.ndarray) -> np.ndarray:
+        bits = X[:, self.split_feature] > self.split_border                  # (n, T, D)
+        leaf_idx = (bits.astype(np.int64) * self._level_weights).sum(axis=2)  # (n, T)
+        raw = self.leaf_values[self._tree_idx, leaf_idx].sum(axis=1)          # (n, K)
+        return self.scale * raw + self.bias
+
+    def predict_raw(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        out = np.empty((X.shape[0], self.leaf_values.shape[2]), dtype=np.float64)
+        for start in range(0, X.shape[0], SCORE_CHUNK_ROWS):
+            stop = start + SCORE_CHUNK_ROWS
+            out[start:stop] = self._raw_chunk(X[start:stop])
+        return out
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        raw = self.predict_raw(X)
+        raw -= raw.max(axis=1, keepdims=True)
+        e = np.exp(raw)
+        return e / e.sum(axis=1, keepdims=True)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        Decoded labels when the export carried them, else raw class names.
+        """
+        best = self.predict_raw(X).argmax(axis=1)
+        labels = self.class_labels if self.class_labels is not None else self.classes_
+        return labels[best]
@@ -0,0 +1,136 @@
+# backend/services/water_index.py
+"""
+In-process "latest water sample per location" index used to match symptom
+reports to water data without querying water_reports each time. Keyed by the
+canonical `location_id` (see locations.py).
+
+- seeded at startup from one aggregation over water_reports
+- updated on every water insert seen by this process (/report, /report/bulk,
+  the scoring pipeline's change stream)
+- bounded to WATER_INDEX_MAX_LOCATIONS entries (least recently used evicted)
+- entries older than WATER_INDEX_TTL_SECONDS are re-read from Mongo, which
+  bounds staleness from inserts made by other workers; "no sample" answers are
+  cached for the shorter WATER_INDEX_NEGATIVE_TTL_SECONDS
+"""
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from backend.services.mongo_client import water_col
+
+WATER_INDEX_MAX_LOCATIONS = int(os.getenv("WATER_INDEX_MAX_LOCATIONS", "20000"))
+WATER_INDEX_TTL_SECONDS = float(os.getenv("WATER_INDEX_TTL_SECONDS", "600"))
+WATER_INDEX_NEGATIVE_TTL_SECONDS = float(os.getenv("WATER_INDEX_NEGATIVE_TTL_SECONDS", "30"))
+
+LATEST_SORT = [("meta.submitted_at", -1), ("created_at", -1), ("_id", -1)]
+
+
+def _recency_key(doc: Dict[str, Any]) -> Tuple:
+    """
+    Python equivalent of LATEST_SORT (missing values sort oldest).
+    """
+    submitted = (doc.get("meta") or {}).get("submitted_at")
+    created = doc.get("created_at")
+    return (
+        submitted is not None,
+        str(submitted) if submitted is not None else "",
+        created if isinstance(created, datetime) else datetime.min,
+        str(doc.get("_id") or ""),
+    )
+
+
+class WaterSampleIndex:
+    def __init__(self, max_locations: int = WATER_INDEX_MAX_LOCATIONS, ttl: float = WATER_INDEX_TTL_SECONDS,
+                 negative_ttl: float = WATER_INDEX_NEGATIVE_TTL_SECONDS):
+        self.max_locations = max_locations
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # location_id -> (cached_at, doc or None)
+        self._entries: "OrderedDict[str, Tuple[float, Optional[Dict[str, Any]]]]" = OrderedDict()
+        self.seeded = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _store(self, loc: str, doc: Optional[Dict[str, Any]]):
+        self._entries[loc] = (time.monotonic(), doc)
+        self._entries.move_to_end(loc)
+        while len(self._entries) > self.max_locations:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def observe(self, doc: Dict[str, Any]):
+        """
+        Record a freshly inserted water doc if it is the newest for its location.
+        """
+        loc = doc.get("location_id")
+        if not loc:
+            return
+        entry = self._entries.get(loc)
+        current = entry[1] if entry else None
+        if current is None or _recency_key(doc) >= _recency_key(current):
+            self._store(loc, doc)
+
+    def peek(self, loc: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        (found, doc) without touching Mongo; found is False when the entry is
+        missing or stale.
+        """
+        entry = self._entries.get(loc)
+        if entry is None:
+            return False, None
+        cached_at, doc = entry
+        ttl = self.ttl if doc is not None else self.negative_ttl
+        if time.monotonic() - cached_at > ttl:
+            return False, None
+        self._entries.move_to_end(loc)
+        return True, doc
+
+    async def latest_for(self, loc: str) -> Optional[Dict[str, Any]]:
+        """
+        Latest water sample for a location_id, served from memory when fresh.
+        """
+        found, doc = self.peek(loc)
+        if found:
+            self.hits += 1
+            return doc
+
+        self.misses += 1
+        doc = await water_col.find_one({"location_id": loc}, sort=LATEST_SORT)
+        self._store(loc, doc)
+        return doc
+
+    async def seed(self) -> int:
+        """
+        Load the latest sample of every location with a single aggregation.
+        """
+        pipeline = [
+            {"$match": {"location_id": {"$nin": [None, ""]}}},
+            {"$sort": {"location_id": 1, "meta.submitted_at": -1, "created_at": -1, "_id": -1}},
+            {"$group": {"_id": "$location_id", "doc": {"$first": "$$ROOT"}}},
+            {"$limit": self.max_locations},
+        ]
+        n = 0
+        async for r in water_col.aggregate(pipeline, allowDiskUse=True):
+            self.observe(r["doc"])
+            n += 1
+        self.seeded = True
+        print(f"WaterSampleIndex: seeded {n} locations")
+        return n
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "locations": len(self._entries),
+            "max_locations": self.max_locations,
+            "seeded": self.seeded,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+water_index = WaterSampleIndex()
@@ -0,0 +1,155 @@
+# backend/services/work_queue.py
+"""
+Claim/lease protocol for scoring symptom documents.
+
+Any process (or host) may try to score a symptom doc, but it must first claim
+it with an atomic find_one_and_update that sets lease_owner/lease_until. Only
+the lease holder can complete or fail it. Failures are retried with
+exponential backoff (next_attempt_at); after SCORING_MAX_ATTEMPTS the doc is
+moved to the "dead_letter" state and left for an operator. Docs released
+as "waiting_water" are retried after SCORING_WATER_WAIT_SECONDS, or as soon
+as a water sample arrives for their location (wake_waiting).
+
+Fields written on symptoms_reports docs:
+  scoring_state     pending | leased | waiting_water | done | dead_letter
+  lease_owner, lease_until, attempts, next_attempt_at, last_error
+"""
+import os
+import random
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from pymongo import ReturnDocument
+
+from backend.services.mongo_client import symptom_col
+
+SCORING_LEASE_TTL_SECONDS = int(os.getenv("SCORING_LEASE_TTL_SECONDS", "60"))
+SCORING_MAX_ATTEMPTS = int(os.getenv("SCORING_MAX_ATTEMPTS", "5"))
+SCORING_BACKOFF_BASE_SECONDS = float(os.getenv("SCORING_BACKOFF_BASE_SECONDS", "5"))
+SCORING_BACKOFF_MAX_SECONDS = float(os.getenv("SCORING_BACKOFF_MAX_SECONDS", "900"))
+SCORING_WATER_WAIT_SECONDS = float(os.getenv("SCORING_WATER_WAIT_SECONDS", "300"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+DEAD_LETTER = "dead_letter"
+
+
+def _backoff_seconds(attempts: int) -> float:
+    # exponential (base * 2^(attempts-1), capped) with jitter in its upper half
+    ceiling = min(SCORING_BACKOFF_MAX_SECONDS, SCORING_BACKOFF_BASE_SECONDS * (2 ** max(0, attempts - 1)))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+async def claim_symptom(symptom_id) -> Optional[Dict[str, Any]]:
+    """
+    Atomically lease an unprocessed symptom doc for this worker.
+    Returns the leased doc, or None if it is processed, dead-lettered, backing
+    off, or leased by someone else.
+    """
+    now = datetime.utcnow()
+    return await symptom_col.find_one_and_update(
+        {
+            "_id": symptom_id,
+            "processed_by_model": {"$ne": True},
+            "scoring_state": {"$ne": DEAD_LETTER},
+            "$and": [
+                {"$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}]},
+                {"$or": [{"next_attempt_at": None}, {"next_attempt_at": {"$lte": now}}]},
+            ],
+        },
+        {"$set": {
+            "scoring_state": "leased",
+            "lease_owner": WORKER_ID,
+            "lease_until": now + timedelta(seconds=SCORING_LEASE_TTL_SECONDS),
+            "leased_at": now,
+        }},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _held_by_me(sym_doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {"_id": sym_doc.get("_id"), "lease_owner": WORKER_ID}
+
+
+async def complete_symptom(sym_doc: Dict[str, Any]) -> bool:
+    """
+    Mark a leased doc as scored. Returns False if the lease was lost meanwhile.
+    """
+    now = datetime.utcnow()
+    res = await symptom_col.update_one(
+        _held_by_me(sym_doc),
+        {
+            "$set": {"processed_by_model": True, "processed_at": now, "scoring_state": "done"},
+            "$unset": {"lease_owner": "", "lease_until": "", "next_attempt_at": ""},
+        },
+    )
+    return res.modified_count == 1
+
+
+async def release_symptom(sym_doc: Dict[str, Any], state: str = "pending", retry_after: float = 0):
+    """
+    Give the lease back without counting an attempt (e.g. no water sample
+    yet); with retry_after the doc is not due again before then.
+    """
+    update: Dict[str, Any] = {"$set": {"scoring_state": state}, "$unset": {"lease_owner": "", "lease_until": ""}}
+    if retry_after > 0:
+        update["$set"]["next_attempt_at"] = datetime.utcnow() + timedelta(seconds=retry_after)
+    await symptom_col.update_one(_held_by_me(sym_doc), update)
+
+
+async def wake_waiting(location_id: str) -> int:
+    """
+    Make the location's docs waiting for a water sample due now (call when one arrives).
+    """
+    res = await symptom_col.update_many(
+        {"location_id": location_id, "scoring_state": "waiting_water"},
+        {"$unset": {"next_attempt_at": ""}},
+    )
+    return res.modified_count
+
+
+async def fail_symptom(sym_doc: Dict[str, Any], error: str):
+    """
+    Record a failed attempt: schedule a retry with backoff, or dead-letter the
+    doc once it has failed SCORING_MAX_ATTEMPTS times.
+    """
+    now = datetime.utcnow()
+    attempts = int(sym_doc.get("attempts") or 0) + 1
+    update: Dict[str, Any] = {"attempts": attempts, "last_error": str(error)[:500], "last_failed_at": now}
+    if attempts >= SCORING_MAX_ATTEMPTS:
+        update.update(scoring_state=DEAD_LETTER, dead_lettered_at=now)
+        print(f"[SCORING] symptom {sym_doc.get('_id')} dead-lettered after {attempts} attempts: {error}")
+    else:
+        update.update(scoring_state="pending", next_attempt_at=now + timedelta(seconds=_backoff_seconds(attempts)))
+
+    await symptom_col.update_one(
+        _held_by_me(sym_doc),
+        {"$set": update, "$unset": {"lease_owner": "", "lease_until": ""}},
+    )
+
+
+async def requeue_dead_letters(limit: int = 1000) -> int:
+    """
+    Put dead-lettered docs back in the queue with a fresh attempt budget.
+    """
+    ids = [d["_id"] async for d in symptom_col.find({"scoring_state": DEAD_LETTER}, {"_id": 1}).limit(limit)]
+    if not ids:
+        return 0
+    res = await symptom_col.update_many(
+        {"_id": {"$in": ids}, "scoring_state": DEAD_LETTER},
+        {"$set": {"scoring_state": "pending", "attempts": 0}, "$unset": {"next_attempt_at": "", "dead_lettered_at": ""}},
+    )
+    return res.modified_count
+
+
+async def queue_stats() -> Dict[str, int]:
+    pipeline = [
+        {"$match": {"processed_by_model": {"$ne": True}}},
+        {"$group": {"_id": {"$ifNull": ["$scoring_state", "pending"]}, "count": {"$sum": 1}}},
+    ]
+    out = {"pending": 0, "leased": 0, "waiting_water": 0, DEAD_LETTER: 0}
+    async for r in symptom_col.aggregate(pipeline):
+        out[r["_id"]] = r["count"]
+    return out
@@ -0,0 +1,8 @@
+# backend/tests/conftest.py
+import os
+import sys
+
+# run from anywhere: make `backend` (and the nirogya-ml scripts) importable
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "nirogya-ml"))
@@ -0,0 +1,20 @@
+# backend/tests/test_district_stats.py
+from backend.routes.district_stats import _resolve_district
+from backend.services.rollups import region_filter
+
+
+def test_spellings_of_a_district_share_one_id():
+    expected = ("assam/kamrup-metro", True, "Kamrup Metro")
+    assert _resolve_district("Kamrup Metro") == _resolve_district("Kamrup Metropolitan") == expected
+    assert _resolve_district("kamrup metro dist") == expected
+    assert _resolve_district("Kamrup Rural")[0] == "assam/kamrup"
+
+
+def test_places_without_a_district_use_their_own_id():
+    assert _resolve_district("Nagaon ") == ("unregistered:nagaon", False, "Nagaon")
+    assert _resolve_district("") is None
+
+
+def test_region_filter():
+    assert region_filter("assam/kamrup-metro", True) == {"district_id": "assam/kamrup-metro"}
+    assert region_filter("unregistered:nagaon", False) == {"district_id": "", "location_id": "unregistered:nagaon"}
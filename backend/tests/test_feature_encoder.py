@@ -0,0 +1,50 @@
+# backend/tests/test_feature_encoder.py
+import numpy as np
+
+from backend.services.feature_encoder import EXPECTED_FEATURES, FeatureEncoder
+
+WATER = {"pH": "7.2", "turbidity": 4, "tds": 310, "chlorine": 0.2, "fluoride": "bad", "nitrate": 10,
+         "coliform": 25, "temperature": 24, "primary_water_source": "tube WELL"}
+
+
+def _named(row):
+    return dict(zip(EXPECTED_FEATURES, row.tolist()))
+
+
+def test_encodes_water_symptoms_and_one_hots():
+    row = _named(FeatureEncoder().encode(WATER, {"symptoms": ["High Fever", "stomach pain"], "district": " jorhat "}))
+
+    assert row["ph"] == np.float32(7.2)
+    assert row["tds"] == 310
+    assert row["fluoride"] == 0  # unparseable -> 0
+    assert row["fever"] == row["symptom_fever"] == 1
+    assert row["abdominal_pain"] == row["symptom_abdominal_pain"] == 1
+    assert row["diarrhea"] == 0
+    assert row["district_Jorhat"] == 1 and row["district_Sonitpur"] == 0
+    assert row["primary_water_source_Tube well"] == 1
+
+
+def test_symptoms_as_comma_separated_string():
+    row = _named(FeatureEncoder().encode({}, {"symptoms": "Vomiting, dehydration"}))
+    assert row["vomiting"] == row["dehydration"] == 1
+    assert sum(row.values()) == 4
+
+
+def test_unknown_categories_and_empty_docs_encode_to_zero():
+    enc = FeatureEncoder()
+    assert not enc.encode(None, None).any()
+    assert not enc.encode({"water_source": "tanker"}, {"district": "Cachar"}).any()
+
+
+def test_encode_batch_reuses_buffer_and_clears_rows():
+    enc = FeatureEncoder()
+    out = np.full((4, enc.n_features), 9, dtype=np.float32)
+    X = enc.encode_batch([(WATER, {"symptoms": ["fever"]}), ({}, {})], out=out)
+    assert X.shape == (2, enc.n_features)
+    np.testing.assert_array_equal(X[0], enc.encode(WATER, {"symptoms": ["fever"]}))
+    assert not X[1].any()
+
+
+def test_custom_layout_ignores_unknown_features():
+    enc = FeatureEncoder(["fever", "not_a_feature", "ph"])
+    np.testing.assert_array_equal(enc.encode({"ph": 6.5}, {"symptoms": ["fever"]}), [1, 0, 6.5])
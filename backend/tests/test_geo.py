@@ -0,0 +1,36 @@
+# backend/tests/test_geo.py
+import pytest
+
+from backend.services.geo import geohash_bounds, geohash_center, geohash_encode, haversine_km, parse_bbox
+
+
+def test_geohash_known_value():
+    # reference point from the geohash spec (lat 57.64911, lon 10.40744)
+    assert geohash_encode(10.40744, 57.64911, precision=11) == "u4pruydqqvj"
+
+
+@pytest.mark.parametrize("lon, lat", [(91.7362, 26.1445), (94.912, 27.4728), (-73.9857, 40.7484), (0.0, 0.0)])
+def test_geohash_round_trip(lon, lat):
+    cell = geohash_encode(lon, lat, precision=7)
+    min_lon, min_lat, max_lon, max_lat = geohash_bounds(cell)
+    assert min_lon <= lon <= max_lon and min_lat <= lat <= max_lat
+    # the center is inside the cell and encodes back to it
+    assert geohash_encode(*geohash_center(cell), precision=7) == cell
+
+
+def test_geohash_prefix_is_parent_cell():
+    cell = geohash_encode(91.7362, 26.1445, precision=8)
+    assert geohash_encode(91.7362, 26.1445, precision=5) == cell[:5]
+
+
+def test_haversine_guwahati_jorhat():
+    # (lon, lat) pairs; ~ 270 km apart
+    assert 250 < haversine_km((91.7362, 26.1445), (94.2037, 26.7509)) < 290
+    assert haversine_km((91.7362, 26.1445), (91.7362, 26.1445)) == 0
+
+
+def test_parse_bbox():
+    assert parse_bbox("91,26,92,27") == (91.0, 26.0, 92.0, 27.0)
+    assert parse_bbox(None) is None
+    with pytest.raises(ValueError):
+        parse_bbox("92,26,91,27")
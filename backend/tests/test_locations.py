@@ -0,0 +1,64 @@
+# backend/tests/test_locations.py
+from backend.services.locations import LocationRegistry, normalize_name, slugify
+
+
+def test_normalize_drops_noise_words_and_accents():
+    assert normalize_name("Jorhát  District") == "jorhat"
+    assert slugify("Kamrup Metropolitan") == "kamrup-metropolitan"
+
+
+def test_exact_and_alias_matches():
+    r = LocationRegistry()
+    assert r.resolve("Jorhat district").id == "assam/jorhat"
+    assert r.resolve("Guwahati").id == "assam/kamrup-metro"
+    assert r.resolve("Silchar").district_id == "assam/cachar"
+
+
+def test_kamrup_rural_and_metro_are_distinct_districts():
+    r = LocationRegistry()
+    assert r.resolve("Kamrup Rural").id == r.resolve("Kamrup").id == "assam/kamrup"
+    assert r.resolve("Kamrup Metropolitan").id == r.resolve("kamrup metro dist").id == "assam/kamrup-metro"
+    assert r.resolve("Borjhar", "Kamrup Rural").district_id == "assam/kamrup"
+
+
+def test_fuzzy_district_match_keeps_its_score():
+    m = LocationRegistry().resolve("Kamrupp Metro")
+    assert m.id == "assam/kamrup-metro"
+    assert 0.6 <= m.score < 1
+
+
+def test_fuzzy_village_match_inside_district():
+    m = LocationRegistry().resolve("Chandmary, Kamrup Metro")
+    assert m.id == "assam/kamrup-metro/chandmari"
+    assert m.kind == "village" and m.district_id == "assam/kamrup-metro"
+    assert 0.6 <= m.score < 1
+
+
+def test_district_only_text_resolves_to_district():
+    m = LocationRegistry().resolve("Kamrup Metro, Assam")
+    assert m.id == "assam/kamrup-metro" and m.registered
+
+
+def test_unregistered_names_get_one_id_with_or_without_district():
+    r = LocationRegistry()
+    with_district = r.resolve("Borjhar, Kamrup Metro")
+    hinted = r.resolve("Borjhar", "Kamrup Metro")
+    alone = r.resolve("Borjhar")
+    assert with_district.id == hinted.id == alone.id == "unregistered:borjhar"
+    assert not alone.registered
+    assert with_district.district_id == hinted.district_id == "assam/kamrup-metro"
+    assert alone.district_id is None
+
+
+def test_added_entries_replace_unregistered_ids():
+    r = LocationRegistry()
+    assert r.resolve("Borjhar").id == "unregistered:borjhar"
+    r.add({"_id": "assam/kamrup-metro/borjhar", "name": "Borjhar", "kind": "village", "parent_id": "assam/kamrup-metro"})
+    assert r.resolve("Borjhar").id == "assam/kamrup-metro/borjhar"
+    assert r.ancestors("assam/kamrup-metro/borjhar") == ["assam/kamrup-metro", "assam"]
+
+
+def test_empty_input():
+    r = LocationRegistry()
+    assert r.resolve("") is None and r.resolve(None) is None
+    assert r.fields("  ,  ") == {}
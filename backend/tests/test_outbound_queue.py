@@ -0,0 +1,36 @@
+# backend/tests/test_outbound_queue.py
+import asyncio
+
+from backend.services.outbound_queue import MockProvider, OutboundConsumer
+
+
+def _emails(*to):
+    return [{"to": t, "subject": "s", "html": "h"} for t in to]
+
+
+def test_deliver_sends_a_clean_batch_in_one_request():
+    provider = MockProvider(latency=0, failure_rate=0)
+    out = asyncio.run(OutboundConsumer(provider=provider, rate=0).deliver(_emails("a@x.in", "b@x.in", "c@x.in")))
+    assert [err for _, err in out] == [None, None, None]
+    assert provider.requests == 1
+
+
+def test_deliver_bisects_a_rejected_batch_to_the_bad_address():
+    provider = MockProvider(latency=0, failure_rate=0)
+    to = ["a@x.in", "b@x.in", "not-an-address", "d@x.in", "e@x.in"]
+    out = asyncio.run(OutboundConsumer(provider=provider, rate=0).deliver(_emails(*to)))
+
+    assert len(out) == len(to)
+    failed = [t for t, (_, err) in zip(to, out) if err]
+    assert failed == ["not-an-address"]
+    assert provider.sent == 4
+
+
+class DownProvider:
+    async def send_batch(self, emails):
+        raise ConnectionError("provider down")
+
+
+def test_deliver_fails_the_whole_batch_on_other_errors():
+    out = asyncio.run(OutboundConsumer(provider=DownProvider(), rate=0).deliver(_emails("a@x.in", "b@x.in")))
+    assert out == [(None, "provider down")] * 2
@@ -0,0 +1,89 @@
+# backend/tests/test_outbreak_detector.py
+import math
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend.services import outbreak_detector as od
+
+DAY = datetime(2026, 7, 1)
+
+
+def _poisson_tail(n, lam):
+    # P(X >= n) for X ~ Poisson(lam)
+    return 1.0 - sum(math.exp(-lam) * lam ** k / math.factorial(k) for k in range(n))
+
+
+@pytest.mark.parametrize("n", [1, 2, 5, 12])
+def test_p_value_is_poisson_upper_tail(n):
+    st = od._KeyState(DAY)
+    st.add(n)
+    assert st.p_value() == pytest.approx(_poisson_tail(n, st.lam), abs=1e-12)
+
+
+def test_incremental_adds_match_single_add():
+    a, b = od._KeyState(DAY), od._KeyState(DAY)
+    a.add(7)
+    for _ in range(7):
+        b.add(1)
+    assert a.p_value() == pytest.approx(b.p_value())
+    assert od._KeyState(DAY).p_value() == 1.0  # no cases today
+
+
+def test_roll_to_closes_days_and_moves_baseline():
+    st = od._KeyState(DAY)
+    st.add(4)
+    st.roll_to(DAY + timedelta(days=3))  # closes the day with 4 cases and two empty days
+    assert st.days_seen == 3
+    assert st.count == 0 and st.day == DAY + timedelta(days=3)
+    mean = od.OUTBREAK_MIN_BASELINE
+    for x in (4, 0, 0):
+        mean += od.OUTBREAK_EWMA_ALPHA * (x - mean)
+    assert st.mean == pytest.approx(mean)
+    assert st.lam == max(mean, od.OUTBREAK_MIN_BASELINE)
+
+
+def test_update_is_ignored_until_seeded():
+    det = od.OutbreakDetector()
+    det.update("assam/jorhat", "assam/jorhat", "cholera", DAY, 5)
+    assert not det._keys
+    det.seeded = True
+    det.update("assam/jorhat", "assam/jorhat", "cholera", DAY, 5)
+    assert det._keys[("assam/jorhat", "assam/jorhat", "cholera")].count == 5
+
+
+def test_running_totals_and_late_days():
+    det = od.OutbreakDetector()
+    det._apply("assam/jorhat", "assam/jorhat", "cholera", DAY, 2)
+    det._apply("assam/jorhat", "assam/jorhat", "cholera", DAY, 5)
+    det._apply("assam/jorhat", "assam/jorhat", "cholera", DAY, 3)  # stale total, not a decrease
+    st = det._keys[("assam/jorhat", "assam/jorhat", "cholera")]
+    assert st.count == 5
+    det._apply("assam/jorhat", "assam/jorhat", "cholera", DAY + timedelta(days=1), 1)
+    det._apply("assam/jorhat", "assam/jorhat", "cholera", DAY, 9)  # day already folded into the baseline
+    assert st.count == 1 and st.days_seen == 1
+
+
+def test_spike_over_quiet_baseline_raises_alarm():
+    det = od.OutbreakDetector()
+    today = od.day_start(datetime.utcnow())
+    start = today - timedelta(days=30)
+    det._apply("assam/jorhat", "assam/jorhat", "cholera", start, 1)
+    det._apply("assam/cachar", "assam/cachar", "typhoid", today, 1)
+    det._apply("assam/jorhat", "assam/jorhat", "cholera", today, 15)
+
+    sig = det.signals(only_alerts=True)
+    assert [(s["location"], s["district_id"]) for s in sig] == [("Jorhat", "assam/jorhat")]
+    assert sig[0]["outbreak"] and sig[0]["severity"] == "critical"
+    assert sig[0]["p_value"] < od.OUTBREAK_P_VALUE
+    assert det.signals(min_cases=20) == []
+
+
+def test_buckets_of_one_place_share_a_baseline():
+    det = od.OutbreakDetector()
+    det._apply("unregistered:borjhar", "", "cholera", DAY, 2, "Borjhar")
+    det._apply("unregistered:borjhar", None, "cholera", DAY, 3, "borjhar village")
+    det._apply("", "", "cholera", DAY, 9)  # unresolvable location
+    assert list(det._keys) == [("unregistered:borjhar", "", "cholera")]
+    assert det._keys[("unregistered:borjhar", "", "cholera")].count == 3
+    assert det._location_name("unregistered:borjhar", "") == "borjhar village"
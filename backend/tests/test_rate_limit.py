@@ -0,0 +1,40 @@
+# backend/tests/test_rate_limit.py
+import asyncio
+import time
+
+from backend.services.rate_limit import TokenBucket
+
+
+def _timed_acquires(bucket, n):
+    async def run():
+        start = time.monotonic()
+        for _ in range(n):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    return asyncio.run(run())
+
+
+def test_burst_is_immediate():
+    assert _timed_acquires(TokenBucket(rate=1, burst=5), 5) < 0.05
+
+
+def test_rate_limits_beyond_burst():
+    # 2 free tokens, then 4 more at 50/s -> ~80ms
+    elapsed = _timed_acquires(TokenBucket(rate=50, burst=2), 6)
+    assert 0.06 <= elapsed < 0.5
+
+
+def test_zero_rate_disables_limiting():
+    assert _timed_acquires(TokenBucket(rate=0), 1000) < 0.05
+
+
+def test_concurrent_acquirers_share_the_rate():
+    bucket = TokenBucket(rate=100, burst=1)
+
+    async def run():
+        start = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for _ in range(6)))
+        return time.monotonic() - start
+
+    assert 0.04 <= asyncio.run(run()) < 0.5
@@ -0,0 +1,81 @@
+# backend/tests/test_tree_scorer.py
+import numpy as np
+import pytest
+
+from backend.services.feature_encoder import EXPECTED_FEATURES
+from backend.services.tree_scorer import ObliviousTreeScorer
+
+
+@pytest.fixture(scope="module")
+def serving_model():
+    """
+    A small CatBoost model trained like train_model.train_serving, on the
+    first rows of processed_dataset.csv.
+    """
+    pytest.importorskip("catboost")
+    pd = pytest.importorskip("pandas")
+    from catboost import CatBoostClassifier
+    from train_model import SERVING_DATA_PATH
+
+    df = pd.read_csv(SERVING_DATA_PATH).head(300)
+    X = df[EXPECTED_FEATURES].astype(float)
+    model = CatBoostClassifier(iterations=40, depth=4, loss_function="MultiClass",
+                               random_seed=0, verbose=0, allow_writing_files=False)
+    model.fit(X, df["disease_label"].astype(str))
+    return model, X
+
+
+def test_exported_trees_match_catboost(serving_model, tmp_path):
+    from export_tree_model import export_and_verify
+
+    model, X = serving_model
+    path = tmp_path / "trees.npz"
+    export_and_verify(model, X, [], out_path=str(path))
+
+    # what the registry does: load, then bind to the request-time layout
+    scorer = ObliviousTreeScorer.load(str(path)).bind(EXPECTED_FEATURES)
+    rows = X.to_numpy(dtype=np.float32)
+    np.testing.assert_allclose(scorer.predict_proba(rows), model.predict_proba(X), atol=1e-6)
+    assert list(scorer.predict(rows)) == list(model.predict(X).reshape(-1))
+
+
+def test_export_rejects_raw_csv_layout(serving_model):
+    from export_tree_model import export_trees, check_layout
+
+    model, X = serving_model
+    arrays = export_trees(model, X, [])
+    with pytest.raises(ValueError):
+        check_layout(arrays, [f for f in EXPECTED_FEATURES if not f.startswith("primary_water_source_")])
+
+
+def _tiny_scorer(**kw):
+    # two depth-1 trees over two features, two classes:
+    #   tree 0: x[a] > 0.5 -> class 1 leaf, tree 1: x[b] > 2 -> class 0 leaf
+    leaves = np.array([[[0.0, 0.0], [0.0, 2.0]],
+                       [[0.0, 0.0], [3.0, 0.0]]])
+    return ObliviousTreeScorer(["a", "b"], np.array([[0], [1]]), np.array([[0.5], [2.0]]),
+                               leaves, scale=1.0, bias=np.array([0.0, 0.5]), class_names=np.array(["0", "1"]), **kw)
+
+
+def test_handbuilt_trees_pick_leaves_by_border():
+    scorer = _tiny_scorer()
+    X = np.array([[0.0, 0.0], [1.0, 0.0], [0.0, 5.0], [1.0, 5.0], [0.5, 2.0]])
+    np.testing.assert_allclose(scorer.predict_raw(X), [[0, 0.5], [0, 2.5], [3, 0.5], [3, 2.5], [0, 0.5]])
+    assert list(scorer.predict(X)) == ["1", "1", "0", "0", "1"]
+    np.testing.assert_allclose(scorer.predict_proba(X).sum(axis=1), 1.0)
+    assert scorer.predict_raw(np.array([1.0, 0.0])).shape == (1, 2)
+
+
+def test_predict_uses_decoded_labels():
+    scorer = _tiny_scorer(class_labels=np.array(["healthy", "cholera"]))
+    assert list(scorer.predict(np.array([[1.0, 0.0]]))) == ["cholera"]
+
+
+def test_bind_reads_columns_from_another_layout():
+    scorer = _tiny_scorer()
+    bound = scorer.bind(["b", "unused", "a"])
+    X = np.array([[0.0, 0.0], [1.0, 5.0]])
+    X_bound = np.array([[0.0, 9.0, 0.0], [5.0, 9.0, 1.0]])  # same rows as (b, unused, a)
+    np.testing.assert_allclose(bound.predict_raw(X_bound), scorer.predict_raw(X))
+    with pytest.raises(ValueError):
+        scorer.bind(["a", "c"])
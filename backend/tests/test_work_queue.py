@@ -0,0 +1,72 @@
+# backend/tests/test_work_queue.py
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from backend.services import work_queue as wq
+
+
+class FakeCollection:
+    def __init__(self):
+        self.updates = []
+
+    async def update_one(self, query, update):
+        self.updates.append((query, update))
+
+
+@pytest.fixture
+def symptom_col(monkeypatch):
+    col = FakeCollection()
+    monkeypatch.setattr(wq, "symptom_col", col)
+    return col
+
+
+@pytest.mark.parametrize("attempts", [1, 2, 3, 6, 20])
+def test_backoff_is_jittered_exponential_with_cap(attempts):
+    ceiling = min(wq.SCORING_BACKOFF_MAX_SECONDS, wq.SCORING_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    for _ in range(50):
+        assert ceiling / 2 <= wq._backoff_seconds(attempts) <= ceiling
+
+
+def test_backoff_reaches_the_cap():
+    assert wq._backoff_seconds(100) >= wq.SCORING_BACKOFF_MAX_SECONDS / 2
+
+
+def test_failure_schedules_retry(symptom_col):
+    before = datetime.utcnow()
+    asyncio.run(wq.fail_symptom({"_id": 1, "attempts": 1}, "model timeout"))
+
+    query, update = symptom_col.updates[-1]
+    assert query == {"_id": 1, "lease_owner": wq.WORKER_ID}
+    s = update["$set"]
+    assert s["attempts"] == 2 and s["scoring_state"] == "pending" and s["last_error"] == "model timeout"
+    delay = (s["next_attempt_at"] - before).total_seconds()
+    assert wq.SCORING_BACKOFF_BASE_SECONDS - 0.01 <= delay <= 2 * wq.SCORING_BACKOFF_BASE_SECONDS + 1
+    assert set(update["$unset"]) == {"lease_owner", "lease_until"}
+
+
+def test_last_attempt_dead_letters(symptom_col):
+    asyncio.run(wq.fail_symptom({"_id": 1, "attempts": wq.SCORING_MAX_ATTEMPTS - 1}, "x" * 1000))
+
+    s = symptom_col.updates[-1][1]["$set"]
+    assert s["scoring_state"] == wq.DEAD_LETTER
+    assert s["attempts"] == wq.SCORING_MAX_ATTEMPTS
+    assert "next_attempt_at" not in s and "dead_lettered_at" in s
+    assert len(s["last_error"]) == 500
+
+
+def test_first_failure_of_a_fresh_doc(symptom_col):
+    asyncio.run(wq.fail_symptom({"_id": 7}, "boom"))
+    assert symptom_col.updates[-1][1]["$set"]["attempts"] == 1
+
+
+def test_waiting_for_water_backs_off(symptom_col):
+    before = datetime.utcnow()
+    asyncio.run(wq.release_symptom({"_id": 3}, "waiting_water", wq.SCORING_WATER_WAIT_SECONDS))
+
+    s = symptom_col.updates[-1][1]["$set"]
+    assert s["scoring_state"] == "waiting_water"
+    assert (s["next_attempt_at"] - before).total_seconds() >= wq.SCORING_WATER_WAIT_SECONDS - 0.01
+    asyncio.run(wq.release_symptom({"_id": 4}))
+    assert "next_attempt_at" not in symptom_col.updates[-1][1]["$set"]
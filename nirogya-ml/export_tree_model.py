@@ -0,0 +1,225 @@
+import json
+import os
+import sys
+import tempfile
+
+import joblib
+import numpy as np
+import pandas as pd
+
+# === Paths ===
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))          # nirogya-ml/
+MODELS_DIR = os.path.join(BASE_DIR, "models")
+
+SERVING_MODEL_PATH = os.path.join(MODELS_DIR, "disease_prediction_serving.joblib")
+SERVING_LABEL_ENCODER_PATH = os.path.join(MODELS_DIR, "serving_label_encoder.joblib")
+TREES_PATH = os.path.join(MODELS_DIR, "disease_prediction_trees.npz")
+
+# The columns the backend encodes at request time; an export is only useful
+# if every column it splits on is one of these.
+sys.path.insert(0, os.path.dirname(BASE_DIR))
+from backend.services.feature_encoder import EXPECTED_FEATURES  # noqa: E402
+
+# Flat array layout written to TREES_PATH (read by backend/services/tree_scorer.py):
+#   feature_names  (F,)        columns the scorer consumes, in order
+#   column_specs   json str    per column: {"name", "source", "value"}; value is
+#                              set for one-hot indicator columns built from a
+#                              categorical source column
+#   split_feature  (T, D)      column index per tree level (bit d of the leaf index)
+#   split_border   (T, D)      float32; bit is set when float32(x[split_feature]) > split_border
+#   leaf_values    (T, 2^D, K) raw leaf values per class dimension
+#   scale, bias    ()/(K,)     raw = scale * sum(leaves) + bias
+#   class_names    (K,)        model.classes_
+#   class_labels   (K,)        decoded labels (when a label encoder is available)
+
+
+def _load_json_model(model, X: pd.DataFrame, cat_cols):
+    from catboost import Pool
+
+    pool = Pool(X, cat_features=[X.columns.get_loc(c) for c in cat_cols])
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.json")
+        # pool lets CatBoost include cat_features_hash (hash -> original string)
+        model.save_model(path, format="json", pool=pool)
+        with open(path) as f:
+            return json.load(f)
+
+
+def export_trees(model, X: pd.DataFrame, cat_cols, class_labels=None) -> dict:
+    """
+    Flatten a fitted CatBoostClassifier into the array layout above.
+    Only float and one-hot categorical splits can be flattened; models that
+    split on CTR features must be retrained with one_hot_max_size >= the
+    cardinality of every categorical column.
+    """
+    js = _load_json_model(model, X, cat_cols)
+    info = js["features_info"]
+    feature_names = list(model.feature_names_ or X.columns)
+
+    float_by_idx = {f["feature_index"]: f for f in info.get("float_features", [])}
+    cat_by_idx = {c["feature_index"]: c for c in info.get("categorical_features", [])}
+    hash_to_value = {h["hash"]: h["value"] for h in js.get("cat_features_hash", [])}
+
+    columns = []
+    column_pos = {}
+
+    def column_for(source, value=None):
+        key = (source, value)
+        if key not in column_pos:
+            name = source if value is None else f"{source}_{value}"
+            column_pos[key] = len(columns)
+            columns.append({"name": name, "source": source, "value": value})
+        return column_pos[key]
+
+    trees = js["oblivious_trees"]
+    depth = max((len(t.get("splits", [])) for t in trees), default=0)
+    n_dim = len(js["scale_and_bias"][1])
+
+    split_feature = np.zeros((len(trees), depth), dtype=np.int32)
+    # padded levels never fire, so leaf indices stay inside the real tree;
+    # float32 like CatBoost's own comparisons (a value equal to a border in
+    # float32 must not land on the other side in float64)
+    split_border = np.full((len(trees), depth), np.inf, dtype=np.float32)
+    leaf_values = np.zeros((len(trees), 2 ** depth, n_dim), dtype=np.float64)
+
+    for t, tree in enumerate(trees):
+        splits = tree.get("splits", [])
+        for d, split in enumerate(splits):
+            kind = split["split_type"]
+            if kind == "FloatFeature":
+                f = float_by_idx[split["float_feature_index"]]
+                source = f.get("feature_id") or feature_names[f["flat_feature_index"]]
+                split_feature[t, d] = column_for(source)
+                split_border[t, d] = split["border"]
+            elif kind == "OneHotFeature":
+                c = cat_by_idx[split["cat_feature_index"]]
+                source = c.get("feature_id") or feature_names[c["flat_feature_index"]]
+                value = hash_to_value.get(split["value"])
+                if value is None:
+                    raise ValueError(f"Unknown category hash {split['value']} for {source}")
+                split_feature[t, d] = column_for(source, str(value))
+                split_border[t, d] = 0.5
+            else:
+                raise ValueError(
+                    f"Cannot flatten split type {kind!r}; retrain with "
+                    f"one_hot_max_size >= categorical cardinality"
+                )
+
+        values = np.asarray(tree["leaf_values"], dtype=np.float64).reshape(-1, n_dim)
+        leaf_values[t, :values.shape[0], :] = values
+
+    scale, bias = js["scale_and_bias"]
+    class_names = np.asarray(model.classes_)
+    if class_names.dtype == object:
+        # the backend loads with allow_pickle=False
+        class_names = class_names.astype(str)
+    arrays = {
+        "feature_names": np.asarray([c["name"] for c in columns]),
+        "column_specs": np.asarray(json.dumps(columns)),
+        "split_feature": split_feature,
+        "split_border": split_border,
+        "leaf_values": leaf_values,
+        "scale": np.asarray(scale, dtype=np.float64),
+        "bias": np.asarray(bias, dtype=np.float64),
+        "class_names": class_names,
+    }
+    if class_labels is not None:
+        arrays["class_labels"] = np.asarray(class_labels).astype(str)
+    return arrays
+
+
+def frame_to_matrix(df: pd.DataFrame, column_specs) -> np.ndarray:
+    """
+    Build the scorer's input matrix from a raw training-style DataFrame.
+    """
+    X = np.zeros((len(df), len(column_specs)), dtype=np.float32)
+    for i, spec in enumerate(column_specs):
+        col = df[spec["source"]]
+        if spec["value"] is None:
+            X[:, i] = col.astype(float).to_numpy()
+        else:
+            X[:, i] = (col.astype(str) == spec["value"]).to_numpy(dtype=np.float64)
+    return X
+
+
+def score_arrays(arrays: dict, X: np.ndarray) -> np.ndarray:
+    """
+    Reference NumPy scorer (same math as the backend's ObliviousTreeScorer).
+    Returns class probabilities.
+    """
+    split_feature = arrays["split_feature"]
+    weights = 1 << np.arange(split_feature.shape[1], dtype=np.int64)
+    X = np.asarray(X, dtype=np.float32)
+    bits = X[:, split_feature] > arrays["split_border"]              # (n, T, D)
+    leaf_idx = (bits.astype(np.int64) * weights).sum(axis=2)          # (n, T)
+    trees = np.arange(split_feature.shape[0])
+    raw = arrays["leaf_values"][trees, leaf_idx].sum(axis=1)          # (n, K)
+    raw = arrays["scale"] * raw + arrays["bias"]
+    raw -= raw.max(axis=1, keepdims=True)
+    e = np.exp(raw)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def verify(model, arrays: dict, X: pd.DataFrame, atol: float = 1e-6) -> float:
+    """
+    Compare the flattened trees against CatBoost on X.
+    Raises AssertionError on any mismatch; returns the max abs prob difference.
+    """
+    specs = json.loads(str(arrays["column_specs"]))
+    ours = score_arrays(arrays, frame_to_matrix(X, specs))
+    theirs = model.predict_proba(X)
+
+    diff = float(np.abs(ours - theirs).max()) if len(X) else 0.0
+    if not np.allclose(ours, theirs, atol=atol):
+        raise AssertionError(f"Exported trees disagree with CatBoost (max abs diff {diff:.3g})")
+    if not np.array_equal(ours.argmax(axis=1), theirs.argmax(axis=1)):
+        raise AssertionError("Exported trees disagree with CatBoost on predicted class")
+    return diff
+
+
+def check_layout(arrays: dict, feature_layout=EXPECTED_FEATURES):
+    """
+    Raise ValueError if the export splits on a column the backend's feature
+    layout doesn't have (e.g. a model trained on the raw CSV's
+    district/location/primary_source columns), since the backend would
+    refuse to bind it.
+    """
+    layout = set(feature_layout)
+    missing = [str(f) for f in arrays["feature_names"] if str(f) not in layout]
+    if missing:
+        raise ValueError(f"Exported columns not in the backend feature layout: {missing}")
+
+
+def export_and_verify(model, X: pd.DataFrame, cat_cols, class_labels=None, out_path: str = TREES_PATH,
+                      feature_layout=EXPECTED_FEATURES):
+    arrays = export_trees(model, X, cat_cols, class_labels)
+    check_layout(arrays, feature_layout)
+    diff = verify(model, arrays, X)
+    np.savez_compressed(out_path, **arrays)
+    print(f"Verified {len(X)} rows against CatBoost (max abs prob diff {diff:.3g})")
+    print(f"Saved flat tree arrays to: {out_path}")
+    return arrays
+
+
+def main():
+    # the serving model (train_model.train_serving), trained on the backend's feature layout
+    from train_model import load_serving_data
+
+    print("Loading model from:", SERVING_MODEL_PATH)
+    model = joblib.load(SERVING_MODEL_PATH)
+    X, _ = load_serving_data()
+
+    class_labels = None
+    if os.path.exists(SERVING_LABEL_ENCODER_PATH):
+        le = joblib.load(SERVING_LABEL_ENCODER_PATH)
+        class_labels = le.inverse_transform(np.asarray(model.classes_).astype(int))
+
+    try:
+        export_and_verify(model, X, [], class_labels)
+    except (ValueError, AssertionError) as e:
+        print("Export failed:", e)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,12 @@ os.makedirs(MODELS_DIR, exist_ok=True)
 MODEL_PATH = os.path.join(MODELS_DIR, "disease_prediction_model.joblib")
 LABEL_ENCODER_PATH = os.path.join(MODELS_DIR, "label_encoder.joblib")
 
+# Serving model: same CatBoost setup, trained on the preprocessed dataset whose
+# columns are the backend's feature layout, then exported to flat tree arrays
+SERVING_DATA_PATH = os.path.join(BASE_DIR, "dataset", "processed_dataset.csv")
+SERVING_MODEL_PATH = os.path.join(MODELS_DIR, "disease_prediction_serving.joblib")
+SERVING_LABEL_ENCODER_PATH = os.path.join(MODELS_DIR, "serving_label_encoder.joblib")
+
 def load_data():
     df = pd.read_csv(DATA_PATH)
 
@@ -118,5 +124,61 @@ def train():
     print(f"\nSaved model to: {MODEL_PATH}")
     print(f"Saved label encoder + metadata to: {LABEL_ENCODER_PATH}")
 
+def load_serving_data():
+    # processed_dataset.csv columns are EXPECTED_FEATURES (symptom_* flags,
+    # district_* / primary_water_source_* one-hots) plus disease_label
+    from export_tree_model import EXPECTED_FEATURES
+
+    df = pd.read_csv(SERVING_DATA_PATH)
+    X = df[EXPECTED_FEATURES].astype(float)
+    y = df["disease_label"].astype(str)
+    return X, y
+
+def train_serving():
+    print("Loading serving data from:", SERVING_DATA_PATH)
+    X, y = load_serving_data()
+
+    le = LabelEncoder()
+    y_encoded = le.fit_transform(y)
+
+    X_train, X_val, y_train, y_val = train_test_split(
+        X,
+        y_encoded,
+        test_size=0.2,
+        random_state=42,
+        stratify=y_encoded,
+    )
+
+    # all columns are numeric, so every split is a float split the exporter can flatten
+    model = CatBoostClassifier(
+        iterations=400,
+        depth=6,
+        learning_rate=0.1,
+        loss_function="MultiClass",
+        eval_metric="Accuracy",
+        verbose=100,
+        random_seed=42,
+    )
+
+    print("Training serving CatBoost model...")
+    model.fit(X_train, y_train, eval_set=(X_val, y_val), use_best_model=True)
+
+    y_pred = model.predict(X_val).reshape(-1).astype(int)
+    print(f"\nServing model validation accuracy: {accuracy_score(y_val, y_pred):.4f}\n")
+
+    joblib.dump(model, SERVING_MODEL_PATH)
+    joblib.dump(le, SERVING_LABEL_ENCODER_PATH)
+    print(f"Saved serving model to: {SERVING_MODEL_PATH}")
+
+    # Flat NumPy tree arrays for the backend scorer, verified on the full CSV
+    from export_tree_model import export_and_verify
+    export_and_verify(
+        model,
+        X,
+        [],
+        class_labels=le.inverse_transform(model.classes_.astype(int)),
+    )
+
 if __name__ == "__main__":
     train()
+    train_serving()
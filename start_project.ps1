@@ -48,6 +48,10 @@ Write-Host "`n[3/4] Starting Servers..." -ForegroundColor Yellow
 Write-Host "Launching Backend (FastAPI)..."
 Start-Process powershell -ArgumentList "-NoExit", "-Command", "cd '$root'; & '$backend\venv\Scripts\activate.ps1'; python -m uvicorn backend.app:app --reload --port 8000"
 
+# Start outbound email consumer (OTP + alert emails)
+Write-Host "Launching Outbound Email Consumer..."
+Start-Process powershell -ArgumentList "-NoExit", "-Command", "cd '$root'; & '$backend\venv\Scripts\activate.ps1'; python -m backend.services.outbound_queue"
+
 # Start Frontend
 Write-Host "Launching Frontend (React)..."
 Start-Process powershell -ArgumentList "-NoExit", "-Command", "cd '$root'; npm start"